@@ -0,0 +1,168 @@
+"""Runs a batch of questions through the Financial Analyst agent.
+
+Questions come from a text file (one per line, like test_data/query_examples.txt)
+or JSONL ({"id": ..., "question": ...}; other fields are copied to the output).
+They share one Runner, each in its own session, with at most --concurrency in
+flight. Each result is appended to the output JSONL as soon as it completes. A
+result holds the answer, the tool calls with their timings, the saved
+artifacts and the per-question latency.
+
+    python batch_qa.py test_data/query_examples.txt --concurrency 8 --output answers.jsonl
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import asyncio
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+APP_NAME = "financial_batch_qa"
+USER_ID = "batch"
+
+
+def load_questions(path: str) -> list:
+    """Returns [{"id", "question", ...}] from a .txt or .jsonl file."""
+    questions = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            if path.endswith(".jsonl"):
+                record = json.loads(line)
+                record["question"] = record.get("question") or record.get("query")
+                if not record["question"]:
+                    raise ValueError(f"{path}:{line_no}: missing 'question'")
+                record.setdefault("id", str(line_no))
+            else:
+                record = {"id": str(line_no), "question": line}
+            questions.append(record)
+    return questions
+
+
+async def answer_question(runner, session_service, artifact_service, record: dict, semaphore, batch_started: float) -> dict:
+    from google.genai import types
+
+    queued = time.perf_counter()
+    async with semaphore:
+        started = time.perf_counter()
+        session_id = uuid.uuid4().hex
+        await session_service.create_session(app_name=APP_NAME, user_id=USER_ID, session_id=session_id)
+        answer_parts = []
+        tool_calls = {}
+        first_event_ms = None
+        error = None
+        try:
+            async for event in runner.run_async(
+                user_id=USER_ID,
+                session_id=session_id,
+                new_message=types.Content(role="user", parts=[types.Part.from_text(text=record["question"])])
+            ):
+                now_ms = (time.perf_counter() - started) * 1000
+                if first_event_ms is None:
+                    first_event_ms = now_ms
+                for call in event.get_function_calls():
+                    tool_calls[call.id or f"{call.name}-{len(tool_calls)}"] = {
+                        "name": call.name, "args": call.args, "started_ms": round(now_ms, 1)
+                    }
+                for response in event.get_function_responses():
+                    call = tool_calls.get(response.id) or next(
+                        (c for c in tool_calls.values() if c["name"] == response.name and "duration_ms" not in c), None
+                    )
+                    if call is not None:
+                        call["duration_ms"] = round(now_ms - call["started_ms"], 1)
+                        call["response_chars"] = len(json.dumps(response.response, default=str))
+                if event.is_final_response() and event.content and event.content.parts:
+                    answer_parts.extend(p.text for p in event.content.parts if p.text)
+            artifacts = await artifact_service.list_artifact_keys(
+                app_name=APP_NAME, user_id=USER_ID, session_id=session_id
+            )
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            artifacts = []
+        finally:
+            await session_service.delete_session(app_name=APP_NAME, user_id=USER_ID, session_id=session_id)
+        finished = time.perf_counter()
+
+    result = {k: v for k, v in record.items() if k != "question"}
+    result.update({
+        "question": record["question"],
+        "answer": "\n".join(answer_parts).strip(),
+        "error": error,
+        "tool_calls": list(tool_calls.values()),
+        "artifacts": artifacts,
+        "timings": {
+            "queue_wait_ms": round((started - queued) * 1000, 1),
+            "first_event_ms": round(first_event_ms, 1) if first_event_ms is not None else None,
+            "total_ms": round((finished - started) * 1000, 1),
+            "completed_at_s": round(finished - batch_started, 3),
+        },
+    })
+    return result
+
+
+async def run_batch(questions: list, output_path: str, concurrency: int) -> dict:
+    from google.adk.runners import Runner
+    from google.adk.sessions import InMemorySessionService
+    from google.adk.artifacts.in_memory_artifact_service import InMemoryArtifactService
+    from financial_supervisor.agent import root_agent
+
+    session_service = InMemorySessionService()
+    artifact_service = InMemoryArtifactService()
+    runner = Runner(app_name=APP_NAME, agent=root_agent, session_service=session_service,
+                    artifact_service=artifact_service)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    batch_started = time.perf_counter()
+    tasks = [
+        asyncio.create_task(answer_question(runner, session_service, artifact_service, record, semaphore, batch_started))
+        for record in questions
+    ]
+    latencies = []
+    errors = 0
+    with open(output_path, "a", encoding="utf-8") as out:
+        for done in asyncio.as_completed(tasks):
+            result = await done
+            out.write(json.dumps(result, default=str) + "\n")
+            out.flush()
+            latencies.append(result["timings"]["total_ms"])
+            errors += 1 if result["error"] else 0
+            status = "ERROR" if result["error"] else f"{len(result['tool_calls'])} tool calls"
+            print(f"[{len(latencies)}/{len(tasks)}] {result['timings']['total_ms'] / 1000:.1f}s {status}: {result['question'][:80]}")
+    wall = time.perf_counter() - batch_started
+
+    latencies.sort()
+    return {
+        "questions": len(questions),
+        "errors": errors,
+        "concurrency": concurrency,
+        "wall_s": round(wall, 2),
+        "questions_per_minute": round(60 * len(questions) / wall, 2) if wall else 0.0,
+        "p50_ms": round(statistics.median(latencies), 1) if latencies else 0.0,
+        "p95_ms": latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))] if latencies else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("questions", help="A .txt file (one question per line) or a .jsonl file.")
+    parser.add_argument("--output", default="batch_answers.jsonl", help="Results are appended here as JSONL.")
+    parser.add_argument("--concurrency", type=int, default=int(os.environ.get("BATCH_QA_CONCURRENCY", "4")))
+    parser.add_argument("--no-answer-cache", action="store_true",
+                        help="Always run the full agent loop instead of serving repeated questions from the answer cache.")
+    args = parser.parse_args()
+
+    if args.no_answer_cache:
+        os.environ["ANSWER_CACHE_ENABLED"] = "0"
+    questions = load_questions(args.questions)
+    print(f"Answering {len(questions)} questions with concurrency {args.concurrency} -> {args.output}")
+    summary = asyncio.run(run_batch(questions, args.output, max(1, args.concurrency)))
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Deterministic offline stand-ins for the Gemini client and the calculator sandbox.
+
+Each fake sleeps for a configurable latency so benchmarks exercise the same
+concurrency and batching behaviour as the live services, without network calls.
+"""
+import time
+import asyncio
+import hashlib
+from types import SimpleNamespace
+
+from financial_supervisor.calculator_pool import PooledRunner
+from financial_supervisor.embeddings import FakeEmbeddingClient
+
+
+def _part_bytes(part) -> bytes:
+    inline = getattr(part, "inline_data", None)
+    if inline is not None and getattr(inline, "data", None):
+        return inline.data
+    return str(part).encode("utf-8")
+
+
+class FakeGenAIClient(FakeEmbeddingClient):
+    """google.genai.Client stand-in: hash-derived embeddings and canned chart descriptions.
+
+    `embed_latency` is charged per embed_content request, `generate_latency`
+    per generate_content request (both in seconds).
+    """
+
+    def __init__(self, dimensions: int = 768, embed_latency: float = 0.05, generate_latency: float = 0.8):
+        super().__init__(dimensions)
+        self.embed_latency = embed_latency
+        self.generate_latency = generate_latency
+        self.generate_calls = 0
+        self.models = SimpleNamespace(embed_content=self.embed_content, generate_content=self.generate_content)
+        self.aio = SimpleNamespace(models=SimpleNamespace(embed_content=self.aembed_content,
+                                                          generate_content=self.agenerate_content))
+
+    def embed_content(self, model: str, contents, config=None):
+        time.sleep(self.embed_latency)
+        return super().embed_content(model, contents, config)
+
+    async def aembed_content(self, model: str, contents, config=None):
+        await asyncio.sleep(self.embed_latency)
+        return FakeEmbeddingClient.embed_content(self, model, contents, config)
+
+    def _describe(self, contents) -> SimpleNamespace:
+        self.generate_calls += 1
+        digest = hashlib.sha256(b"".join(_part_bytes(part) for part in contents)).hexdigest()
+        return SimpleNamespace(text=(
+            f"## Chart {digest[:8]}\n"
+            f"Quarterly revenue trend with values {int(digest[8:12], 16)} and {int(digest[12:16], 16)} "
+            f"(USD millions), showing growth year over year."
+        ))
+
+    def generate_content(self, model: str, contents, config=None):
+        time.sleep(self.generate_latency)
+        return self._describe(contents)
+
+    async def agenerate_content(self, model: str, contents, config=None):
+        await asyncio.sleep(self.generate_latency)
+        return self._describe(contents)
+
+
+class FakeCalculatorRunner:
+    """Replaces the ADK Runner of the calculator sub-agent: waits `latency`
+    seconds, then emits one code-execution result event."""
+
+    def __init__(self, latency: float = 1.5):
+        self.latency = latency
+        self.calls = 0
+
+    async def run_async(self, user_id: str, session_id: str, new_message):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        question = "".join(part.text or "" for part in new_message.parts)
+        output = f"{len(question) % 97}.00"
+        yield SimpleNamespace(
+            type="RUN_CODE_CONTENT",
+            content=SimpleNamespace(parts=[SimpleNamespace(code_execution_result=SimpleNamespace(output=output))]),
+        )
+
+
+def fake_calculator_factory(latency: float = 1.5):
+    """Runner factory for CalculatorRunnerPool that never touches the sandbox."""
+    def build() -> PooledRunner:
+        from google.adk.sessions import InMemorySessionService
+        return PooledRunner(runner=FakeCalculatorRunner(latency), session_service=InMemorySessionService())
+    return build
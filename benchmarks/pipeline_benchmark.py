@@ -0,0 +1,324 @@
+"""Offline end-to-end benchmark of ingest and the retrieval tools, with regression gates.
+
+Gemini and the calculator sandbox are replaced by deterministic fakes with
+configurable latency (benchmarks/fakes.py); Docling, Chroma, the caches, BM25
+and the retrieval tools run for real. The script:
+
+  1. ingests test_data/Q1-2025 ... Q4-2025 into a scratch directory through
+     ingest.process_document and reports cumulative time per stage (Docling
+     conversion, chart description, embedding, Chroma writes, ...);
+  2. replays test_data/query_examples.txt through retrieve_narrative and
+     retrieve_financial_tables, plus a few calculate_with_python inputs, and
+     reports p50/p95/p99 latency per tool;
+  3. writes the results as JSON and, given --baseline, fails (exit code 1) when
+     any metric is slower than the baseline beyond --tolerance.
+
+    python benchmarks/pipeline_benchmark.py --output bench.json --save-baseline benchmarks/baseline.json
+    python benchmarks/pipeline_benchmark.py --baseline benchmarks/baseline.json
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import threading
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+TEST_DATA_DIR = os.path.join(BASE_DIR, "test_data")
+QUARTERS = ("Q1-2025", "Q2-2025", "Q3-2025", "Q4-2025")
+CALCULATOR_INPUTS = [
+    # Answered by the local calculator.
+    "Q1 2024 revenue is 80,539 and Q1 2025 revenue is 90,234. What is the growth percentage?",
+    "Operating income is 30,606 and revenue is 90,234. What is the operating margin?",
+    # Falls through to the (fake) sandbox.
+    "Revenue was 90,234 in Q1, 96,428 in Q2 and 102,346 in Q3. Fit a linear trend and project Q4.",
+]
+# Differences below this many milliseconds are never reported as regressions.
+MIN_REGRESSION_MS = 5.0
+
+
+def percentile(values: list, pct: float) -> float:
+    return float(np.percentile(values, pct)) if values else 0.0
+
+
+def latency_summary(latencies_ms: list) -> dict:
+    return {
+        "count": len(latencies_ms),
+        "p50_ms": round(percentile(latencies_ms, 50), 3),
+        "p95_ms": round(percentile(latencies_ms, 95), 3),
+        "p99_ms": round(percentile(latencies_ms, 99), 3),
+    }
+
+
+class StageTimer:
+    """Thread-safe cumulative wall time and call count per pipeline stage.
+
+    Stages overlap (charts are described while the writer embeds), so totals
+    are busy time per stage, not a partition of the ingest wall time.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.totals = {}
+
+    def add(self, stage: str, seconds: float):
+        with self._lock:
+            total, calls = self.totals.get(stage, (0.0, 0))
+            self.totals[stage] = (total + seconds, calls + 1)
+
+    def wrap(self, stage: str, func):
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.add(stage, time.perf_counter() - started)
+        return timed
+
+    def wrap_iterator(self, stage: str, func):
+        """Times each step of a generator, so lazy producers are charged for their own work only."""
+        def timed(*args, **kwargs):
+            iterator = iter(func(*args, **kwargs))
+            while True:
+                started = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    self.add(stage, time.perf_counter() - started)
+                    return
+                self.add(stage, time.perf_counter() - started)
+                yield item
+        return timed
+
+    def report(self) -> dict:
+        return {
+            stage: {"total_ms": round(total * 1000, 3), "calls": calls}
+            for stage, (total, calls) in sorted(self.totals.items())
+        }
+
+
+class TimedCollection:
+    """Proxies a Chroma collection, timing every write."""
+
+    def __init__(self, collection, timer: StageTimer):
+        self._collection = collection
+        self.upsert = timer.wrap("chroma_write", collection.upsert)
+        self.delete = timer.wrap("chroma_write", collection.delete)
+
+    def __getattr__(self, name):
+        return getattr(self._collection, name)
+
+
+def prepare_workdir(workdir: str, quarters: list) -> list:
+    """Lays out earnings/<quarter>/ under the scratch directory (symlinked to
+    test_data) so ingest's relative paths and source keys work unchanged."""
+    pdfs = []
+    for quarter in quarters:
+        source = Path(TEST_DATA_DIR) / quarter
+        if not source.is_dir():
+            sys.exit(f"Missing test data: {source}")
+        target = Path(workdir) / "earnings" / quarter
+        target.parent.mkdir(parents=True, exist_ok=True)
+        if not target.exists():
+            target.symlink_to(source, target_is_directory=True)
+        pdfs.extend(sorted(Path("earnings") / quarter / pdf.name for pdf in source.glob("*.pdf")))
+    return pdfs
+
+
+def run_ingest(ingest, pdfs: list) -> dict:
+    timer = StageTimer()
+    ingest.iter_pdf_elements = timer.wrap_iterator("conversion", ingest.iter_pdf_elements)
+    ingest.describe_chart = timer.wrap("chart_description", ingest.describe_chart)
+    ingest.extract_facts = timer.wrap("fact_extraction", ingest.extract_facts)
+    ingest.build_lexical_index = timer.wrap("lexical_index", ingest.build_lexical_index)
+    ingest.export_shard_vectors = timer.wrap("numpy_export", ingest.export_shard_vectors)
+    embedder = ingest.embedder()
+    embedder.embed = timer.wrap("embedding", embedder.embed)
+    collections = {}
+    get_collection = ingest.get_collection
+
+    def timed_collection(shard: str):
+        if shard not in collections:
+            collections[shard] = TimedCollection(get_collection(shard), timer)
+        return collections[shard]
+    ingest.get_collection = timed_collection
+
+    catalog = ingest.reset_store()  # a reused --workdir starts from an empty store
+    started = time.perf_counter()
+    documents = {}
+    shards = set()
+    for pdf_path in pdfs:
+        doc_started = time.perf_counter()
+        shards.add(ingest.process_document(pdf_path)["shard"])
+        documents[pdf_path.as_posix()] = round((time.perf_counter() - doc_started) * 1000, 3)
+    for shard in sorted(shards):
+        ingest.refresh_shard(catalog, shard)
+    wall_ms = (time.perf_counter() - started) * 1000
+
+    return {
+        "wall_ms": round(wall_ms, 3),
+        "documents": documents,
+        "shards": len(catalog),
+        "chunks": sum(entry["chunks"] for entry in catalog.shards.values()),
+        "embedding_requests": embedder.requests,
+        "stages": timer.report(),
+    }
+
+
+async def replay_queries(tools, queries: list, repeats: int, concurrency: int) -> dict:
+    from financial_supervisor.embeddings import estimate_tokens
+
+    tool_context = SimpleNamespace(save_artifact=_save_artifact)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = {"retrieve_narrative": [], "retrieve_financial_tables": [], "calculate_with_python": []}
+    result_tokens = {name: [] for name in latencies}
+
+    async def timed(name: str, call):
+        async with semaphore:
+            started = time.perf_counter()
+            result = await call
+            latencies[name].append((time.perf_counter() - started) * 1000)
+            result_tokens[name].append(estimate_tokens(result))
+
+    calls = []
+    for _ in range(repeats):
+        for query in queries:
+            calls.append(timed("retrieve_narrative", tools.retrieve_narrative(tool_context, query)))
+            calls.append(timed("retrieve_financial_tables", tools.retrieve_financial_tables(tool_context, query)))
+        for question in CALCULATOR_INPUTS:
+            calls.append(timed("calculate_with_python", tools.calculate_with_python(tool_context, question)))
+    await asyncio.gather(*calls)
+    summary = {name: latency_summary(values) for name, values in latencies.items()}
+    for name, tokens in result_tokens.items():
+        # Estimated prompt tokens each call adds to the supervisor's context.
+        summary[name]["mean_result_tokens"] = round(sum(tokens) / len(tokens), 1) if tokens else 0.0
+    return summary
+
+
+async def _save_artifact(*args, **kwargs) -> int:
+    return 0
+
+
+def flatten_metrics(results: dict) -> dict:
+    """The latency figures that are compared against a baseline, keyed by dotted path."""
+    metrics = {"ingest.wall_ms": results["ingest"]["wall_ms"]}
+    for stage, values in results["ingest"]["stages"].items():
+        metrics[f"ingest.stages.{stage}.total_ms"] = values["total_ms"]
+    for tool, values in results["retrieval"].items():
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            metrics[f"retrieval.{tool}.{key}"] = values[key]
+    return metrics
+
+
+def compare_to_baseline(results: dict, baseline: dict, tolerance: float) -> list:
+    """Returns (metric, baseline, current) for every metric slower than baseline * (1 + tolerance)."""
+    current = flatten_metrics(results)
+    previous = flatten_metrics(baseline)
+    regressions = []
+    for metric, value in current.items():
+        base = previous.get(metric)
+        if base is None:
+            continue
+        if value > base * (1 + tolerance) and value - base > MIN_REGRESSION_MS:
+            regressions.append((metric, base, value))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--quarters", nargs="+", default=list(QUARTERS))
+    parser.add_argument("--workdir", help="Scratch directory for the DB, caches and images (default: a new temp dir).")
+    parser.add_argument("--repeats", type=int, default=5, help="Times each example query is replayed.")
+    parser.add_argument("--concurrency", type=int, default=4, help="Tool calls in flight during the replay.")
+    parser.add_argument("--backend", default="chroma", choices=["chroma", "numpy"])
+    parser.add_argument("--embed-latency-ms", type=float, default=50.0)
+    parser.add_argument("--generate-latency-ms", type=float, default=800.0)
+    parser.add_argument("--executor-latency-ms", type=float, default=1500.0)
+    parser.add_argument("--output", help="Write the results JSON here as well as to stdout.")
+    parser.add_argument("--baseline", help="Results JSON to compare against; regressions exit with status 1.")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown over baseline (0.25 = 25%%).")
+    parser.add_argument("--save-baseline", help="Also write the results to this path for future comparisons.")
+    args = parser.parse_args()
+    # The run happens inside the scratch directory; resolve user paths first.
+    for name in ("output", "baseline", "save_baseline"):
+        if getattr(args, name):
+            setattr(args, name, os.path.abspath(getattr(args, name)))
+
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="pipeline_benchmark_"))
+    os.makedirs(workdir, exist_ok=True)
+    # Caches live in the scratch directory so every run starts cold.
+    os.environ["CACHE_DIR"] = os.path.join(workdir, ".cache")
+    os.environ["RETRIEVER_BACKEND"] = args.backend
+    os.chdir(workdir)
+    pdfs = prepare_workdir(workdir, args.quarters)
+
+    from fakes import FakeGenAIClient, fake_calculator_factory
+    from financial_supervisor.cache import EmbeddingCache
+    from financial_supervisor.embeddings import EmbeddingBatcher, EMBEDDING_MODEL
+    fake_client = FakeGenAIClient(embed_latency=args.embed_latency_ms / 1000,
+                                  generate_latency=args.generate_latency_ms / 1000)
+
+    import ingest
+    ingest.get_client = lambda: fake_client
+    ingest.embedder.set(EmbeddingBatcher(fake_client, EMBEDDING_MODEL, cache=EmbeddingCache()))
+    print(f"Ingesting {len(pdfs)} PDFs into {workdir} ...")
+    ingest_results = run_ingest(ingest, pdfs)
+
+    # The tools open everything lazily, so pointing them at the scratch DB is enough.
+    from financial_supervisor import tools
+    from financial_supervisor.calculator_pool import CalculatorRunnerPool
+    tools.BASE_DIR = workdir
+    tools.DB_PATH = os.path.join(workdir, "chroma_db")
+    tools.embedder.set(EmbeddingBatcher(fake_client, EMBEDDING_MODEL, cache=EmbeddingCache()))
+    tools.calculator_pool = CalculatorRunnerPool(factory=fake_calculator_factory(args.executor_latency_ms / 1000))
+
+    with open(os.path.join(TEST_DATA_DIR, "query_examples.txt"), "r", encoding="utf-8") as f:
+        queries = [line.strip() for line in f if line.strip()]
+    print(f"Replaying {len(queries)} queries x {args.repeats} through the retrieval tools ...")
+    retrieval_results = asyncio.run(replay_queries(tools, queries, args.repeats, args.concurrency))
+
+    results = {
+        "config": {
+            "quarters": args.quarters,
+            "backend": args.backend,
+            "repeats": args.repeats,
+            "concurrency": args.concurrency,
+            "embed_latency_ms": args.embed_latency_ms,
+            "generate_latency_ms": args.generate_latency_ms,
+            "executor_latency_ms": args.executor_latency_ms,
+        },
+        "ingest": ingest_results,
+        "retrieval": retrieval_results,
+        "calls": {"embed_requests": len(fake_client.calls), "generate_requests": fake_client.generate_calls},
+    }
+    output = json.dumps(results, indent=2)
+    print(output)
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(output)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("config") != results["config"]:
+            print("Warning: baseline was recorded with a different configuration.")
+        regressions = compare_to_baseline(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\nPERFORMANCE REGRESSION (tolerance {args.tolerance:.0%}):")
+            for metric, base, value in regressions:
+                print(f"  {metric}: {base:.1f} ms -> {value:.1f} ms ({value / base - 1:+.0%})")
+            sys.exit(1)
+        print(f"\nNo regressions against {args.baseline}.")
+
+
+if __name__ == "__main__":
+    main()
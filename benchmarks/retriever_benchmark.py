@@ -0,0 +1,95 @@
+"""Compares the Chroma and NumPy retrieval backends on one shard of the local chroma_db.
+
+Queries are stored chunk embeddings with a little Gaussian noise, so no API calls
+are needed. Ground truth is exact float32 cosine search; the script reports
+recall@k against it and p50/p95 latency for each backend.
+
+    python benchmarks/retriever_benchmark.py --queries 200 --k 10 [--shard reports_alphabet_q1-2025]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+import numpy as np
+import chromadb
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from financial_supervisor.retrievers import ChromaRetriever, NumpyRetriever, export_numpy_index
+from financial_supervisor.shards import ShardCatalog, CATALOG_FILENAME, LEGACY_COLLECTION
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The filters the retrieval tools actually send.
+FILTERS = [
+    {"Content_Type": "text"},
+    {"$or": [{"Content_Type": {"$eq": "table"}}, {"Content_Type": {"$eq": "chart"}}]},
+]
+
+
+def percentile(values: list, pct: float) -> float:
+    return float(np.percentile(values, pct)) if values else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default=os.path.join(BASE_DIR, "chroma_db"))
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--noise", type=float, default=0.05)
+    parser.add_argument("--shard", help="Shard to benchmark (default: the largest one in the catalog).")
+    args = parser.parse_args()
+
+    shard = args.shard
+    if not shard:
+        try:
+            catalog = ShardCatalog.load(os.path.join(args.db, CATALOG_FILENAME))
+            shard = max(catalog.names(), key=lambda name: catalog.shards[name]["chunks"], default=LEGACY_COLLECTION)
+        except (OSError, ValueError, KeyError):
+            shard = LEGACY_COLLECTION
+    print(f"Benchmarking shard {shard}")
+    collection = chromadb.PersistentClient(path=args.db).get_or_create_collection(name=shard)
+    data = collection.get(include=["embeddings", "metadatas"])
+    if not len(data["ids"]):
+        sys.exit("The collection is empty; run ingest.py first.")
+    ids = data["ids"]
+    matrix = np.asarray(data["embeddings"], dtype=np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+
+    rng = np.random.default_rng(0)
+    sample = rng.choice(len(ids), size=min(args.queries, len(ids)), replace=False)
+    queries = matrix[sample] + rng.normal(0, args.noise, size=(len(sample), matrix.shape[1])).astype(np.float32)
+
+    backends = {"chroma": ChromaRetriever(collection)}
+    tmp = tempfile.mkdtemp(prefix="numpy_index_")
+    for dtype in ("float32", "float16", "int8"):
+        index_dir = os.path.join(tmp, dtype)
+        export_numpy_index(collection, index_dir, dtype=dtype)
+        backends[f"numpy-{dtype}"] = NumpyRetriever(index_dir)
+
+    exact = NumpyRetriever(os.path.join(tmp, "float32"))
+    report = {}
+    for name, backend in backends.items():
+        backend.query(queries[0].tolist(), args.k)  # load the index outside the timed loop
+        latencies, recalls = [], []
+        for where in FILTERS:
+            for query in queries:
+                truth = set(exact.query(query.tolist(), args.k, where)["ids"][0])
+                started = time.perf_counter()
+                result = backend.query(query.tolist(), args.k, where)
+                latencies.append((time.perf_counter() - started) * 1000)
+                if truth:
+                    recalls.append(len(truth & set(result["ids"][0])) / len(truth))
+        report[name] = {
+            "p50_ms": round(percentile(latencies, 50), 3),
+            "p95_ms": round(percentile(latencies, 95), 3),
+            f"recall@{args.k}": round(float(np.mean(recalls)), 4) if recalls else None,
+        }
+    print(json.dumps({"vectors": len(ids), "queries": len(queries) * len(FILTERS), "backends": report}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
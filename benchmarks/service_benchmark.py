@@ -0,0 +1,179 @@
+"""Compares N agent worker processes that each open the indexes (local mode) with
+N thin clients of one shared retrieval service (service mode), on one box.
+
+Run pipeline_benchmark.py with --workdir first so the scratch DB exists. Gemini
+embeddings are replaced by the same fakes, so no credentials are needed. For
+each mode, reports per-worker cold start (first tool result), retrieval latency
+and peak RSS; in service mode the daemon's own RSS is reported separately.
+
+    python benchmarks/pipeline_benchmark.py --workdir /tmp/bench
+    python benchmarks/service_benchmark.py --workdir /tmp/bench --workers 4
+"""
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import resource
+import subprocess
+from types import SimpleNamespace
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.dirname(BENCHMARK_DIR)
+sys.path[:0] = [BENCHMARK_DIR, BASE_DIR]
+TEST_DATA_DIR = os.path.join(BASE_DIR, "test_data")
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS.
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def configure_tools(workdir: str, embed_latency: float):
+    from fakes import FakeGenAIClient
+    from financial_supervisor import tools
+    from financial_supervisor.cache import EmbeddingCache
+    from financial_supervisor.embeddings import EmbeddingBatcher, EMBEDDING_MODEL
+    tools.BASE_DIR = workdir
+    tools.DB_PATH = os.path.join(workdir, "chroma_db")
+    if not tools.RETRIEVAL_SERVICE_URL:
+        tools.embedder.set(EmbeddingBatcher(FakeGenAIClient(embed_latency=embed_latency), EMBEDDING_MODEL,
+                                            cache=EmbeddingCache()))
+    return tools
+
+
+def run_daemon(args):
+    from financial_supervisor import service
+    configure_tools(args.workdir, args.embed_latency_ms / 1000)
+    server = service.serve(port=args.port)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+async def _replay(tools, queries: list) -> list:
+    async def save_artifact(*args, **kwargs):
+        return 0
+    tool_context = SimpleNamespace(save_artifact=save_artifact, state={})
+    latencies = []
+    for query in queries:
+        for tool in (tools.retrieve_narrative, tools.retrieve_financial_tables):
+            started = time.perf_counter()
+            await tool(tool_context, query)
+            latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+def run_worker(args):
+    started = time.perf_counter()
+    tools = configure_tools(args.workdir, args.embed_latency_ms / 1000)
+    with open(os.path.join(TEST_DATA_DIR, "query_examples.txt"), "r", encoding="utf-8") as f:
+        queries = [line.strip() for line in f if line.strip()]
+    first = asyncio.run(_replay(tools, queries[:1]))
+    cold_start_ms = (time.perf_counter() - started) * 1000
+    latencies = sorted(asyncio.run(_replay(tools, queries * args.repeats)))
+    print(json.dumps({
+        "cold_start_ms": round(cold_start_ms, 1),
+        "first_call_ms": round(first[0], 1),
+        "p50_ms": round(latencies[len(latencies) // 2], 3),
+        "p95_ms": round(latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))], 3),
+        "peak_rss_mb": peak_rss_mb(),
+    }))
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_until_ready(url: str, timeout: float = 120.0):
+    from financial_supervisor.service import RetrievalServiceClient, RetrievalServiceError
+    client = RetrievalServiceClient(url, pool_size=1, timeout=5)
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return client.health()
+        except (RetrievalServiceError, OSError):
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Retrieval service at {url} did not start")
+            time.sleep(0.2)
+
+
+def daemon_rss_mb(pid: int) -> float:
+    try:
+        with open(f"/proc/{pid}/status", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def run_mode(mode: str, args) -> dict:
+    env = dict(os.environ, CACHE_DIR=os.path.join(args.workdir, ".cache"), RETRIEVER_BACKEND=args.backend)
+    env.pop("RETRIEVAL_SERVICE_URL", None)
+    common = ["--workdir", args.workdir, "--embed-latency-ms", str(args.embed_latency_ms)]
+    daemon = None
+    result = {}
+    try:
+        if mode == "service":
+            port = free_port()
+            daemon = subprocess.Popen([sys.executable, __file__, "--daemon", "--port", str(port)] + common,
+                                      env=env, stdout=subprocess.DEVNULL)
+            env["RETRIEVAL_SERVICE_URL"] = f"http://127.0.0.1:{port}"
+            wait_until_ready(env["RETRIEVAL_SERVICE_URL"])
+
+        started = time.perf_counter()
+        workers = [subprocess.Popen([sys.executable, __file__, "--worker", "--repeats", str(args.repeats)] + common,
+                                    env=env, stdout=subprocess.PIPE, text=True) for _ in range(args.workers)]
+        reports = [json.loads(w.communicate()[0].strip().splitlines()[-1]) for w in workers]
+        result["wall_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        for key in ("cold_start_ms", "first_call_ms", "p50_ms", "p95_ms", "peak_rss_mb"):
+            values = [r[key] for r in reports]
+            result[f"worker_{key}"] = round(sum(values) / len(values), 1)
+        result["total_worker_rss_mb"] = round(sum(r["peak_rss_mb"] for r in reports), 1)
+        if daemon is not None:
+            result["daemon_rss_mb"] = daemon_rss_mb(daemon.pid)
+    finally:
+        if daemon is not None:
+            daemon.terminate()
+            daemon.wait()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workdir", required=True, help="Scratch directory written by pipeline_benchmark.py.")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--backend", default="chroma", choices=["chroma", "numpy"])
+    parser.add_argument("--embed-latency-ms", type=float, default=50.0)
+    parser.add_argument("--modes", nargs="+", default=["local", "service"], choices=["local", "service"])
+    parser.add_argument("--port", type=int, default=0, help=argparse.SUPPRESS)
+    parser.add_argument("--daemon", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    args.workdir = os.path.abspath(args.workdir)
+
+    if args.daemon:
+        return run_daemon(args)
+    if args.worker:
+        return run_worker(args)
+    if not os.path.isdir(os.path.join(args.workdir, "chroma_db")):
+        sys.exit(f"No chroma_db in {args.workdir}; run pipeline_benchmark.py --workdir {args.workdir} first.")
+    os.chdir(args.workdir)
+    results = {}
+    for mode in args.modes:
+        print(f"{mode}: {args.workers} workers ...")
+        results[mode] = run_mode(mode, args)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Measures cold-start cost: import time of the agent package and ingest.py, and
+the latency of the first retrieval-path work after import (tools.warm_up()).
+
+Every sample runs in a fresh interpreter so nothing is already imported. With
+--baseline, exits with status 1 when a median exceeds the baseline beyond
+--tolerance.
+
+    python benchmarks/startup_benchmark.py --repeats 5 --output startup.json
+    python benchmarks/startup_benchmark.py --baseline startup.json
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# name -> code run in a fresh interpreter; it must print elapsed seconds.
+SCENARIOS = {
+    "import_tools": "import financial_supervisor.tools",
+    "import_agent": "import financial_supervisor.agent",
+    "import_ingest": "import ingest",
+    "import_agent_and_warm_up": "import financial_supervisor.agent as a; a.start_warm_up().join()",
+}
+TIMER = "import time; _t = time.perf_counter(); {code}; print(time.perf_counter() - _t)"
+# Differences below this many milliseconds are never reported as regressions.
+MIN_REGRESSION_MS = 20.0
+
+
+def sample(code: str) -> float:
+    """Runs `code` in a new interpreter and returns its wall time in ms (None on failure)."""
+    result = subprocess.run([sys.executable, "-c", TIMER.format(code=code)], cwd=BASE_DIR,
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        print(f"  failed: {result.stderr.strip().splitlines()[-1] if result.stderr.strip() else result.returncode}")
+        return None
+    return float(result.stdout.strip().splitlines()[-1]) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument("--output", help="Write the results JSON here as well as to stdout.")
+    parser.add_argument("--baseline", help="Results JSON to compare against; regressions exit with status 1.")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    results = {}
+    for name in args.scenarios:
+        print(f"{name} ...")
+        samples = [s for s in (sample(SCENARIOS[name]) for _ in range(args.repeats)) if s is not None]
+        if samples:
+            results[name] = {"median_ms": round(statistics.median(samples), 1),
+                             "min_ms": round(min(samples), 1), "max_ms": round(max(samples), 1)}
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = [
+            (name, baseline[name]["median_ms"], values["median_ms"])
+            for name, values in results.items()
+            if name in baseline
+            and values["median_ms"] > baseline[name]["median_ms"] * (1 + args.tolerance)
+            and values["median_ms"] - baseline[name]["median_ms"] > MIN_REGRESSION_MS
+        ]
+        if regressions:
+            print(f"\nSTARTUP REGRESSION (tolerance {args.tolerance:.0%}):")
+            for name, base, value in regressions:
+                print(f"  {name}: {base:.1f} ms -> {value:.1f} ms ({value / base - 1:+.0%})")
+            sys.exit(1)
+        print(f"\nNo regressions against {args.baseline}.")
+
+
+if __name__ == "__main__":
+    main()
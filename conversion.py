@@ -0,0 +1,106 @@
+"""Docling conversion for ingest.py.
+
+Kept free of GenAI/Chroma imports so that worker processes spawned by
+`ingest.py --workers N` only pay for Docling. Docling itself is imported on
+first use, so importing this module is cheap. Elements are returned as plain
+dicts (with PNG bytes for pictures) so they can be pickled back to the parent.
+"""
+import io
+import hashlib
+from pathlib import Path
+
+from financial_supervisor import clients, tracing
+
+def build_converter():
+    from docling.document_converter import DocumentConverter, PdfFormatOption
+    from docling.datamodel.pipeline_options import PdfPipelineOptions
+    from docling.datamodel.base_models import InputFormat
+
+    pipeline_options = PdfPipelineOptions()
+    pipeline_options.images_scale = 2.0
+    pipeline_options.generate_picture_images = True
+    pipeline_options.generate_page_images = False
+
+    return DocumentConverter(
+        allowed_formats=[InputFormat.PDF],
+        format_options={
+            InputFormat.PDF: PdfFormatOption(pipeline_options=pipeline_options)
+        }
+    )
+
+# One converter per process, built on first use (or by init_worker in pool workers).
+get_converter = clients.Lazy(build_converter)
+
+def init_worker():
+    """ProcessPoolExecutor initializer: load Docling models once per worker."""
+    get_converter()
+
+def image_hash(image_obj) -> str:
+    """Content address of a picture, computed from its decoded pixels rather than
+    the PNG encoding so identical charts hash identically across PDFs."""
+    digest = hashlib.sha256()
+    digest.update(f"{image_obj.mode}:{image_obj.size[0]}x{image_obj.size[1]}:".encode("ascii"))
+    digest.update(image_obj.tobytes())
+    return digest.hexdigest()
+
+def page_number(element):
+    """First page the element appears on (1-based), or None."""
+    prov = getattr(element, "prov", None)
+    return prov[0].page_no if prov else None
+
+def iter_elements(doc):
+    """Yields a Docling document as picklable element records, in reading order.
+
+    Each record has a `kind` ('picture', 'table' or 'text'), the section `heading`
+    it appeared under, the full `heading_path` (e.g. 'Q1 2025 Results > Outlook')
+    and its `page`. Picture PNGs are encoded one at a time.
+    """
+    from docling_core.types.doc.labels import DocItemLabel
+
+    current_heading = "Document Start"
+    headings = []  # (level, text) of the enclosing section headers
+    for element, level in doc.iterate_items():
+        # Track Header Context
+        if element.label == DocItemLabel.SECTION_HEADER or (hasattr(element.label, 'name') and element.label.name.startswith('heading')):
+            if hasattr(element, "text") and element.text:
+                current_heading = element.text
+                header_level = getattr(element, "level", 1) or 1
+                headings = [h for h in headings if h[0] < header_level] + [(header_level, element.text)]
+        heading_path = " > ".join(text for _, text in headings) or current_heading
+        page = page_number(element)
+
+        if element.label == DocItemLabel.PICTURE:
+            image_obj = element.get_image(doc)
+            if image_obj:
+                buf = io.BytesIO()
+                image_obj.save(buf, format="PNG")
+                yield {"kind": "picture", "heading": current_heading, "heading_path": heading_path, "page": page,
+                       "image_bytes": buf.getvalue(), "image_hash": image_hash(image_obj)}
+            continue
+
+        # Specifically parse tables as HTML, others as Markdown
+        if element.label == DocItemLabel.TABLE:
+            try:
+                table_html = element.export_to_html(doc=doc)
+                if table_html:
+                    yield {"kind": "table", "heading": current_heading, "heading_path": heading_path,
+                           "page": page, "html": table_html}
+            except Exception as e:
+                print(f"    -> Warning: Could not export table to HTML: {e}")
+        elif element.label in (DocItemLabel.PAGE_HEADER, DocItemLabel.PAGE_FOOTER):
+            continue  # running headers/footers repeat on every page and split sections
+        elif hasattr(element, "text"):
+            if element.text:
+                yield {"kind": "text", "heading": current_heading, "heading_path": heading_path,
+                       "page": page, "text": element.text}
+
+def iter_pdf_elements(pdf_path):
+    """Converts one PDF in this process and streams its element records."""
+    with tracing.span("docling.convert", source=str(pdf_path)):
+        result = get_converter().convert(str(pdf_path))
+    yield from iter_elements(result.document)
+
+def convert_pdf(pdf_path) -> list:
+    """Converts one PDF and returns all its element records, for pool workers
+    whose results must be pickled back to the parent in one piece."""
+    return list(iter_pdf_elements(pdf_path))
@@ -12,12 +12,26 @@ from google.adk.runners import Runner
 from google.adk.sessions import InMemorySessionService
 from google.genai import types
 
+from . import answer_cache, tracing
 from .prompt import SUPERVISOR_INSTRUCTION
-from .tools import retrieve_narrative, retrieve_financial_tables, calculate_with_python
+from .tools import (retrieve_narrative, retrieve_financial_tables, retrieve_multi_quarter, lookup_financial_metric,
+                    calculate_with_python, start_warm_up)
 
 root_agent = Agent(
     model="gemini-2.5-flash",
     name="Financial_Supervisor",
     instruction=SUPERVISOR_INSTRUCTION,
-    tools=[retrieve_narrative, retrieve_financial_tables, calculate_with_python]
+    tools=[retrieve_narrative, retrieve_financial_tables, retrieve_multi_quarter, lookup_financial_metric,
+           calculate_with_python],
+    # Tracing callbacks are no-ops unless TRACE_FILE is set. The answer cache
+    # runs first so a cache hit never opens an LLM span.
+    before_agent_callback=tracing.before_agent_callback,
+    after_agent_callback=tracing.after_agent_callback,
+    before_model_callback=[answer_cache.before_model_callback, tracing.before_model_callback],
+    after_model_callback=[tracing.after_model_callback, answer_cache.after_model_callback],
 )
+
+# AGENT_WARM_UP=1 opens the indexes and the embedding connection in the background
+# while ADK starts, instead of on the first question.
+if os.environ.get("AGENT_WARM_UP", "0") == "1":
+    start_warm_up()
@@ -0,0 +1,241 @@
+"""Semantic cache of final supervisor answers, consulted before the first LLM call of a turn.
+
+A standalone question (no earlier turns in the session) is embedded and compared
+with the stored questions. On a hit, at or above ANSWER_CACHE_THRESHOLD cosine
+similarity, the stored answer is returned as the model response. The LLM loop,
+retrieval and calculation are all skipped, and the chart images the answer cites
+are re-saved as artifacts of the new session.
+
+Entries are tagged with the ingest version that ingest.py writes next to the DB,
+so a re-ingest invalidates them. Quarters, years and numbers in the two questions
+must also match: "Q1 2025 revenue" and "Q2 2025 revenue" embed almost
+identically but need different answers. So must the companies named, out of
+those in the shard catalog: "Alphabet revenue Q1 2025" is not "Amazon revenue
+Q1 2025".
+"""
+import os
+import re
+import asyncio
+import json
+import time
+import hashlib
+import threading
+from array import array
+
+from . import clients, tools, tracing
+from .cache import CACHE_DIR, normalize_text, open_database
+from .shards import mentioned_companies
+
+ANSWER_CACHE_ENABLED = os.environ.get("ANSWER_CACHE_ENABLED", "1") == "1"
+ANSWER_CACHE_PATH = os.environ.get("ANSWER_CACHE_PATH", os.path.join(CACHE_DIR, "answers.sqlite"))
+ANSWER_CACHE_THRESHOLD = float(os.environ.get("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_TTL_SECONDS = float(os.environ.get("ANSWER_CACHE_TTL_SECONDS", str(24 * 3600)))
+ANSWER_CACHE_MAX_ENTRIES = int(os.environ.get("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+
+QUARTER_PATTERN = re.compile(r"\bq([1-4])\s*[-/ ]?\s*((?:19|20)\d{2})\b")
+NUMBER_PATTERN = re.compile(r"\d+(?:\.\d+)?")
+
+
+def known_companies() -> list:
+    """Companies in the shard catalog; none for a store ingested before sharding."""
+    catalog = tools.shard_catalog().get()
+    return catalog.companies() if catalog is not None else []
+
+
+def query_signature(text: str, companies: list = None) -> str:
+    """Companies, quarters, years and other numbers in a question, order-insensitive,
+    e.g. 'alphabet|q1-2025|2024'. `companies` defaults to known_companies()."""
+    names = mentioned_companies(text, known_companies() if companies is None else companies)
+    text = re.sub(r"(?<=\d),(?=\d{3})", "", text.lower())
+    quarters = {f"q{q}-{year}" for q, year in QUARTER_PATTERN.findall(text)}
+    rest = QUARTER_PATTERN.sub(" ", text)
+    return "|".join(names + sorted(quarters | set(NUMBER_PATTERN.findall(rest))))
+
+
+def current_ingest_version() -> str:
+    """The marker ingest.py rewrites after every run that changes the collection."""
+    try:
+        with open(os.path.join(tools.DB_PATH, "ingest_version"), "r", encoding="utf-8") as f:
+            return f.read().strip() or "none"
+    except OSError:
+        return "none"
+
+
+class SemanticAnswerCache:
+    """SQLite store of (question vector, answer, cited images), looked up by cosine similarity.
+
+    Only entries for the current ingest version and signature are compared, and
+    only those younger than `ttl` seconds. Beyond `max_entries`, the least
+    recently used are evicted.
+    """
+
+    def __init__(self, path: str = ANSWER_CACHE_PATH, threshold: float = ANSWER_CACHE_THRESHOLD,
+                 ttl: float = ANSWER_CACHE_TTL_SECONDS, max_entries: int = ANSWER_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self._lock = threading.Lock()
+        self._conn = open_database(path)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS answers ("
+                " key TEXT PRIMARY KEY, question TEXT NOT NULL, signature TEXT NOT NULL,"
+                " ingest_version TEXT NOT NULL, vector BLOB NOT NULL, answer TEXT NOT NULL,"
+                " artifacts TEXT NOT NULL, created REAL NOT NULL, last_access REAL NOT NULL,"
+                " hit_count INTEGER NOT NULL DEFAULT 0)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS answers_lookup ON answers(ingest_version, signature)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS answers_last_access ON answers(last_access)")
+
+    def lookup(self, question: str, vector: list, ingest_version: str):
+        """Returns {"question", "answer", "artifacts", "similarity"} for the closest entry, or None."""
+        import numpy as np
+
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, question, vector, answer, artifacts FROM answers"
+                " WHERE ingest_version = ? AND signature = ? AND created >= ?",
+                (ingest_version, query_signature(question), now - self.ttl)
+            ).fetchall()
+            best = None
+            if rows:
+                query = np.asarray(vector, dtype=np.float32)
+                query /= np.linalg.norm(query) or 1.0
+                matrix = np.stack([np.frombuffer(row[2], dtype=np.float32) for row in rows])
+                similarities = matrix @ query / np.maximum(np.linalg.norm(matrix, axis=1), 1e-12)
+                i = int(np.argmax(similarities))
+                if similarities[i] >= self.threshold:
+                    best = rows[i], float(similarities[i])
+            if best is None:
+                self.misses += 1
+                return None
+            (key, stored_question, _, answer, artifacts), similarity = best
+            with self._conn:
+                self._conn.execute(
+                    "UPDATE answers SET last_access = ?, hit_count = hit_count + 1 WHERE key = ?", (now, key)
+                )
+            self.hits += 1
+        return {"question": stored_question, "answer": answer, "artifacts": json.loads(artifacts),
+                "similarity": similarity}
+
+    def put(self, question: str, vector: list, answer: str, artifacts: list, ingest_version: str):
+        now = time.time()
+        key = hashlib.sha256(f"{ingest_version}\0{normalize_text(question).lower()}".encode("utf-8")).hexdigest()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO answers (key, question, signature, ingest_version, vector, answer,"
+                " artifacts, created, last_access) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, question, query_signature(question), ingest_version, array("f", vector).tobytes(),
+                 answer, json.dumps(artifacts), now, now)
+            )
+            self.stores += 1
+            self._evict(now, ingest_version)
+
+    def _evict(self, now: float, ingest_version: str):
+        self._conn.execute("DELETE FROM answers WHERE created < ? OR ingest_version != ?",
+                           (now - self.ttl, ingest_version))
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM answers WHERE key IN (SELECT key FROM answers ORDER BY last_access LIMIT ?)",
+                (excess,)
+            )
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM answers")
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self),
+        }
+
+
+answer_cache = clients.Lazy(SemanticAnswerCache)
+
+# Question and vector of every turn that missed, until its final answer arrives.
+_pending = {}
+MAX_PENDING = 1000
+
+
+def _standalone_question(llm_request):
+    """The user's text when the request holds a single user message and nothing else
+    (no history, no tool results), otherwise None. Follow-ups depend on context and
+    are never cached."""
+    contents = getattr(llm_request, "contents", None) or []
+    if len(contents) != 1 or contents[0].role != "user":
+        return None
+    parts = contents[0].parts or []
+    if any(getattr(p, "function_response", None) for p in parts):
+        return None
+    text = " ".join(p.text for p in parts if getattr(p, "text", None)).strip()
+    return text or None
+
+
+async def before_model_callback(callback_context, llm_request):
+    """Answers a repeated standalone question from the cache, skipping the LLM."""
+    if not ANSWER_CACHE_ENABLED:
+        return None
+    question = _standalone_question(llm_request)
+    if question is None:
+        return None
+    from google.adk.models.llm_response import LlmResponse
+    from google.genai import types
+
+    with tracing.span("answer_cache.lookup") as s:
+        vector = await tools.embed_query(question)
+        version = current_ingest_version()
+        cache = answer_cache()
+        hit = await asyncio.to_thread(cache.lookup, question, vector, version)
+        s.set("hit", hit is not None)
+    if hit is None:
+        if len(_pending) >= MAX_PENDING:
+            _pending.clear()  # turns that ended without a final answer
+        _pending[callback_context.invocation_id] = (question, vector, version)
+        return None
+
+    print(f"   [Answer cache] Hit ({hit['similarity']:.3f}) for: {question} ~ {hit['question']}  {cache.stats()}")
+    for artifact in hit["artifacts"]:
+        try:
+            image_bytes = await tools.read_image(artifact["image_path"])
+            await callback_context.save_artifact(
+                filename=artifact["filename"],
+                artifact=types.Part.from_bytes(data=image_bytes, mime_type="image/png")
+            )
+        except Exception as e:
+            print(f"   [Answer cache] Could not restore artifact {artifact['filename']}: {e}")
+    return LlmResponse(content=types.Content(role="model", parts=[types.Part.from_text(text=hit["answer"])]))
+
+
+async def after_model_callback(callback_context, llm_response):
+    """Stores the final answer of a turn that missed the cache."""
+    pending = _pending.get(callback_context.invocation_id)
+    if pending is None or getattr(llm_response, "partial", False) or getattr(llm_response, "error_code", None):
+        return None
+    parts = (llm_response.content.parts if llm_response.content else None) or []
+    if any(getattr(p, "function_call", None) for p in parts):
+        return None  # not the final answer yet
+    answer = "".join(p.text for p in parts if getattr(p, "text", None)).strip()
+    del _pending[callback_context.invocation_id]
+    if not answer:
+        return None
+
+    question, vector, version = pending
+    artifacts = list(callback_context.state.get(tools.CITED_IMAGES_STATE_KEY, []))
+    await asyncio.to_thread(answer_cache().put, question, vector, answer, artifacts, version)
+    return None
@@ -0,0 +1,164 @@
+"""Local on-disk caches shared by ingest.py and the retrieval tools."""
+import os
+import time
+import hashlib
+import sqlite3
+import threading
+import unicodedata
+from array import array
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_DIR = os.environ.get("CACHE_DIR", os.path.join(BASE_DIR, ".cache"))
+EMBEDDING_CACHE_PATH = os.environ.get("EMBEDDING_CACHE_PATH", os.path.join(CACHE_DIR, "embeddings.sqlite"))
+# 768-dim float32 vectors take ~3 KB each, so the default bounds the file at roughly 300 MB.
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.environ.get("EMBEDDING_CACHE_MAX_ENTRIES", "100000"))
+DESCRIPTION_CACHE_PATH = os.environ.get("DESCRIPTION_CACHE_PATH", os.path.join(CACHE_DIR, "descriptions.sqlite"))
+
+
+def normalize_text(text: str) -> str:
+    """Collapses whitespace and Unicode variants that do not change meaning."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def open_database(path: str) -> sqlite3.Connection:
+    """Opens a SQLite file that several threads and processes may share."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class EmbeddingCache:
+    """SQLite cache of embedding vectors keyed by (model, normalized text hash).
+
+    Vectors are stored as packed float32 blobs. Entries beyond `max_entries` are
+    evicted least-recently-used first.
+    """
+
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH, max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = open_database(path)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " key TEXT PRIMARY KEY, model TEXT NOT NULL, vector BLOB NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_access ON embeddings(last_access)")
+
+    @staticmethod
+    def key(model: str, text: str) -> str:
+        return hashlib.sha256(f"{model}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def get_many(self, model: str, texts: list[str]) -> list:
+        """Returns a cached vector or None for each text."""
+        keys = [self.key(model, text) for text in texts]
+        found = {}
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit.
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                for key, blob in self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+                ):
+                    found[key] = array("f", blob).tolist()
+            if found:
+                now = time.time()
+                with self._conn:
+                    self._conn.executemany(
+                        "UPDATE embeddings SET last_access = ? WHERE key = ?",
+                        [(now, key) for key in found]
+                    )
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return [found.get(key) for key in keys]
+
+    def put_many(self, model: str, texts: list[str], vectors: list[list[float]]):
+        now = time.time()
+        rows = [
+            (self.key(model, text), model, array("f", vector).tobytes(), now)
+            for text, vector in zip(texts, vectors)
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, model, vector, last_access) VALUES (?, ?, ?, ?)",
+                rows
+            )
+            self._evict()
+
+    def _evict(self):
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE key IN"
+                " (SELECT key FROM embeddings ORDER BY last_access LIMIT ?)",
+                (excess,)
+            )
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self),
+        }
+
+
+class DescriptionCache:
+    """SQLite memo of chart descriptions keyed by (image hash, prompt, model)."""
+
+    def __init__(self, path: str = DESCRIPTION_CACHE_PATH):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = open_database(path)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS descriptions ("
+                " key TEXT PRIMARY KEY, image_hash TEXT NOT NULL, model TEXT NOT NULL,"
+                " description TEXT NOT NULL, created REAL NOT NULL)"
+            )
+
+    @staticmethod
+    def key(image_hash: str, prompt: str, model: str) -> str:
+        return hashlib.sha256(f"{image_hash}\0{prompt}\0{model}".encode("utf-8")).hexdigest()
+
+    def get(self, image_hash: str, prompt: str, model: str):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT description FROM descriptions WHERE key = ?",
+                (self.key(image_hash, prompt, model),)
+            ).fetchone()
+            if row:
+                self.hits += 1
+                return row[0]
+            self.misses += 1
+            return None
+
+    def put(self, image_hash: str, prompt: str, model: str, description: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO descriptions (key, image_hash, model, description, created)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (self.key(image_hash, prompt, model), image_hash, model, description, time.time())
+            )
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
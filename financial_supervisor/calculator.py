@@ -0,0 +1,351 @@
+"""Deterministic local engine for the arithmetic `calculate_with_python` is usually asked for.
+
+Handles differences, growth %, margins, sums, averages and CAGR over labelled
+numbers ("Q1 2024 revenue is 80,539"), plus plain arithmetic expressions, using
+Decimal precision and an AST-restricted evaluator. `solve` returns None for
+anything it does not fully understand so the caller can fall back to the
+sandboxed calculator sub-agent.
+"""
+import ast
+import re
+import operator
+from decimal import Decimal, InvalidOperation, localcontext
+
+PRECISION = 28
+
+UNIT_SCALES = {
+    "thousand": Decimal(10) ** 3, "k": Decimal(10) ** 3,
+    "million": Decimal(10) ** 6, "mn": Decimal(10) ** 6, "m": Decimal(10) ** 6,
+    "billion": Decimal(10) ** 9, "bn": Decimal(10) ** 9, "b": Decimal(10) ** 9,
+}
+UNIT_NAMES = {
+    Decimal(10) ** 3: "thousand",
+    Decimal(10) ** 6: "million",
+    Decimal(10) ** 9: "billion",
+}
+
+# "<label> is|was|=|: <number> [unit]", e.g. "Q1 2025 revenue is $90,234 million".
+VALUE_PATTERN = re.compile(
+    r"(?P<label>[A-Za-z][^=:;,.?!\n]*?)\s*(?:=|:|\bis\b|\bwas\b|\bwere\b|\bof\b|\bat\b)\s*"
+    r"(?P<open>\()?(?P<sign>[-−])?\s*\$?\s*(?P<number>\d[\d,]*(?:\.\d+)?)\)?"
+    r"\s*(?P<unit>%|percent\b|thousand\b|million\b|billion\b|bn\b|mn\b|[kmb]\b)?",
+    re.IGNORECASE,
+)
+LEADING_FILLER = re.compile(r"^(?:and|while|whereas|vs\.?|versus|then|but|also|the)\s+", re.IGNORECASE)
+EXPRESSION_PATTERN = re.compile(r"[\d.\s()+\-*/^]*\d[\d.\s()]*[+\-*/^][\d.\s()+\-*/^]*\d[\d.\s()]*")
+PERIOD_TOKENS = re.compile(r"\b(?:Q[1-4]|H[12]|FY'?\d{2}|(?:19|20)\d{2})\b", re.IGNORECASE)
+YEARS_PATTERN = re.compile(r"\b(?:over|across|for)\s+(\d+)\s+years?\b|\b(\d+)[- ]year\b", re.IGNORECASE)
+
+INTENT_KEYWORDS = {
+    "cagr": ("cagr", "compound annual growth", "compounded annual growth"),
+    "growth": ("growth", "grew", "% change", "percent change",
+               "percentage change", "change %", "change in %", "yoy", "year-over-year", "year over year",
+               "qoq", "quarter-over-quarter", "quarter over quarter"),
+    "difference": ("difference", "delta", "how much more", "how much less", "minus", "subtract", "change"),
+    "margin": ("margin",),
+    "sum": ("sum", "total", "combined", "add up", "together"),
+    "average": ("average", "mean"),
+}
+# "increase"/"decrease" ask for a growth % only when a percentage or rate is
+# requested ("% increase", "rate of decline"); otherwise for a difference.
+# The same holds for "change" ("change in percent", "by what percentage did it change").
+DIRECTION_KEYWORDS = ("increase", "decrease", "decline")
+PERCENT_REQUEST = re.compile(r"%|\bpercent(?!age points?)|\brate\b")
+# "total" only asks for a sum when nothing else is asked ("total gross margin" is a margin).
+WEAK_KEYWORDS = {"sum": ("total",)}
+# Margin numerators are profit lines; revenue/sales lines are the denominators.
+REVENUE_LABEL = re.compile(r"revenue|sales", re.IGNORECASE)
+PROFIT_LABEL = re.compile(r"income|profit|earnings|ebitda|ebit\b", re.IGNORECASE)
+COST_LABEL = re.compile(r"cost|expense|cogs", re.IGNORECASE)
+# Requests that need more than the formulas above go to the sandbox.
+UNSUPPORTED_KEYWORDS = (
+    "ratio", "median", "variance", "deviation", "forecast", "project", "predict", "per share",
+    "multiply", "divide", "share of", "proportion", "percentage of", "percent of", "weighted",
+    "convert", "interest", "discount", "npv", "irr", "regression", "round to",
+)
+
+_BINARY_OPS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.Pow: operator.pow,
+}
+_UNARY_OPS = {ast.UAdd: operator.pos, ast.USub: operator.neg}
+MAX_EXPONENT = 100
+
+
+def evaluate_expression(expression: str) -> Decimal:
+    """Evaluates +, -, *, /, ** (or ^) and parentheses over Decimal literals.
+    Raises ValueError for anything else."""
+    expression = expression.replace("^", "**").replace(",", "")
+    try:
+        tree = ast.parse(expression.strip(), mode="eval")
+    except SyntaxError as e:
+        raise ValueError(f"Not an arithmetic expression: {expression!r}") from e
+
+    def visit(node):
+        if isinstance(node, ast.Expression):
+            return visit(node.body)
+        if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+            # Go through the source text so 0.1 stays exactly 0.1.
+            return Decimal(ast.get_source_segment(expression.strip(), node) or repr(node.value))
+        if isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPS:
+            left, right = visit(node.left), visit(node.right)
+            if isinstance(node.op, ast.Pow) and abs(right) > MAX_EXPONENT:
+                raise ValueError("Exponent too large")
+            return _BINARY_OPS[type(node.op)](left, right)
+        if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY_OPS:
+            return _UNARY_OPS[type(node.op)](visit(node.operand))
+        raise ValueError(f"Unsupported syntax: {type(node).__name__}")
+
+    with localcontext() as ctx:
+        ctx.prec = PRECISION
+        try:
+            return +visit(tree)
+        except (InvalidOperation, ZeroDivisionError, ArithmeticError) as e:
+            raise ValueError(str(e)) from e
+
+
+def parse_values(question: str) -> list:
+    """Extracts (label, Decimal value, unit) triples from a question."""
+    values = []
+    for match in VALUE_PATTERN.finditer(question):
+        label = LEADING_FILLER.sub("", match.group("label").strip()).strip()
+        if not label or label.lower() in ("what", "it", "that", "this", "which"):
+            continue
+        number = Decimal(match.group("number").replace(",", ""))
+        if match.group("sign") or (match.group("open") and question[match.end("number"):].startswith(")")):
+            number = -number
+        unit = (match.group("unit") or "").lower()
+        if unit == "percent":
+            unit = "%"
+        values.append((label, number, unit))
+    return values
+
+
+def has_unparsed_numbers(question: str) -> bool:
+    """True if a number outside the recognised "<label> is <number>" pairs remains,
+    which means some of the data would be silently ignored. Numbers swallowed by a label
+    ("revenue was 90 with 20% of it from cloud at 12") count too."""
+    for match in VALUE_PATTERN.finditer(question):
+        label = PERIOD_TOKENS.sub(" ", YEARS_PATTERN.sub(" ", match.group("label")))
+        if re.search(r"\d", label):
+            return True
+    rest = VALUE_PATTERN.sub(" ", question)
+    rest = YEARS_PATTERN.sub(" ", rest)
+    rest = PERIOD_TOKENS.sub(" ", rest)
+    return bool(re.search(r"\d", rest))
+
+
+def period_key(label: str):
+    """Sortable (year, quarter) for labels like 'Q1 2025 revenue' or 'FY24'; None if absent."""
+    year_match = re.search(r"\b(?:19|20)(\d{2})\b", label) or re.search(r"\bFY'?(\d{2})\b", label, re.IGNORECASE)
+    quarter_match = re.search(r"\bQ([1-4])\b", label, re.IGNORECASE)
+    if not year_match and not quarter_match:
+        return None
+    year = int(year_match.group(1)) if year_match else -1
+    quarter = int(quarter_match.group(1)) if quarter_match else 0
+    return (year, quarter)
+
+
+def detect_intents(question: str) -> list:
+    # Ignore the data itself so a label like "Operating margin Q1 is 32%" is not an intent.
+    text = VALUE_PATTERN.sub(" ", question).lower()
+    intents = []
+    weak = []
+    for intent, keywords in INTENT_KEYWORDS.items():
+        for keyword in keywords:
+            if re.search(rf"(?<![a-z]){re.escape(keyword)}s?(?![a-z])", text):
+                intents.append(intent)
+                if keyword in WEAK_KEYWORDS.get(intent, ()):
+                    weak.append(intent)
+                # "compound annual growth" is CAGR, not plain growth.
+                if intent == "cagr":
+                    for phrase in keywords:
+                        text = text.replace(phrase, " ")
+                break
+    for keyword in DIRECTION_KEYWORDS + ("change",):
+        if re.search(rf"(?<![a-z]){keyword}[sd]?(?![a-z])", text):
+            intent = "growth" if PERCENT_REQUEST.search(text) else "difference"
+            if intent not in intents:
+                intents.append(intent)
+            break
+    # "% change" implies growth, so do not also report a plain difference for "change".
+    if "growth" in intents and "difference" in intents and not re.search(
+            r"difference|delta|how much (?:more|less)|minus|subtract", text):
+        intents.remove("difference")
+    if len(intents) > 1:
+        intents = [intent for intent in intents if intent not in weak]
+    return intents
+
+
+def _fmt(value: Decimal, places: int = 4) -> str:
+    quantized = value.quantize(Decimal(1).scaleb(-places))
+    text = f"{quantized:,f}"
+    if "." in text:
+        text = text.rstrip("0").rstrip(".")
+    return text
+
+
+def _op(value: Decimal) -> str:
+    """Formats a value used as an operand, parenthesizing negatives."""
+    return f"({_fmt(value)})" if value < 0 else _fmt(value)
+
+
+def _normalize_units(values: list):
+    """Brings all values to a common scale; returns (values, unit suffix) or None."""
+    units = {unit for _, _, unit in values}
+    if units == {"%"}:
+        return [(label, number) for label, number, _ in values], "%"
+    if "%" in units:
+        return None
+    # A bare number next to "90,234 million" has an unknown scale; let the sandbox decide.
+    if "" in units and len(units) > 1:
+        return None
+    scales = {UNIT_SCALES.get(unit, Decimal(1)) for unit in units}
+    base = min(scales)
+    normalized = [(label, number * UNIT_SCALES.get(unit, Decimal(1)) / base) for label, number, unit in values]
+    suffix = f" {UNIT_NAMES[base]}" if base in UNIT_NAMES else ""
+    return normalized, suffix
+
+
+def _chronological(values: list) -> list:
+    keys = [period_key(label) for label, _ in values]
+    if all(key is not None for key in keys) and len(set(keys)) == len(keys):
+        return [value for _, value in sorted(zip(keys, values), key=lambda pair: pair[0])]
+    return list(values)
+
+
+def _growth_lines(values, suffix, question):
+    lines = []
+    ordered = _chronological(values)
+    for (old_label, old), (new_label, new) in zip(ordered, ordered[1:]):
+        if old == 0:
+            return None
+        growth = (new - old) / abs(old) * 100
+        lines.append(f"Growth % ({old_label} -> {new_label}): ({_op(new)} - {_op(old)}) / {_fmt(abs(old))} * 100 = {_fmt(growth, 2)}%")
+    return lines
+
+
+def _difference_lines(values, suffix, question):
+    lines = []
+    ordered = _chronological(values)
+    unit = " percentage points" if suffix == "%" else suffix
+    for (old_label, old), (new_label, new) in zip(ordered, ordered[1:]):
+        lines.append(f"Difference ({new_label} - {old_label}): {_fmt(new)} - {_op(old)} = {_fmt(new - old)}{unit}")
+    return lines
+
+
+def _matching_denominator(label: str, denominators: list):
+    """The revenue figure of the same period as `label`, or None if ambiguous."""
+    if len(denominators) == 1:
+        return denominators[0]
+    matches = [d for d in denominators if period_key(d[0]) == period_key(label) and period_key(label)]
+    return matches[0] if len(matches) == 1 else None
+
+
+def _margin_lines(values, suffix, question):
+    """Profit / revenue; with only a cost given, (revenue - cost) / revenue. Values
+    that are neither (e.g. headcount) are left to the sandbox."""
+    if suffix == "%":
+        return None
+    denominators = [(label, value) for label, value in values
+                    if REVENUE_LABEL.search(label) and not COST_LABEL.search(label)]
+    others = [(label, value) for label, value in values if (label, value) not in denominators]
+    profits = [(label, value) for label, value in others if PROFIT_LABEL.search(label) and not COST_LABEL.search(label)]
+    costs = [(label, value) for label, value in others if COST_LABEL.search(label)]
+    if not denominators or not others or len(profits) + len(costs) != len(others):
+        return None
+    lines = []
+    for num_label, value in profits or costs:
+        denominator = _matching_denominator(num_label, denominators)
+        if denominator is None or denominator[1] == 0:
+            return None
+        den_label, revenue = denominator
+        if profits:
+            margin = value / revenue * 100
+            lines.append(f"Margin ({num_label} / {den_label}): {_op(value)} / {_op(revenue)} * 100 = {_fmt(margin, 2)}%")
+        else:
+            margin = (revenue - value) / revenue * 100
+            lines.append(f"Margin (({den_label} - {num_label}) / {den_label}): ({_op(revenue)} - {_op(value)}) / "
+                         f"{_op(revenue)} * 100 = {_fmt(margin, 2)}%")
+    return lines
+
+
+def _sum_lines(values, suffix, question):
+    total = sum(value for _, value in values)
+    terms = " + ".join(_op(value) for _, value in values)
+    return [f"Sum: {terms} = {_fmt(total)}{suffix}"]
+
+
+def _average_lines(values, suffix, question):
+    total = sum(value for _, value in values)
+    average = total / len(values)
+    terms = " + ".join(_op(value) for _, value in values)
+    return [f"Average: ({terms}) / {len(values)} = {_fmt(average)}{suffix}"]
+
+
+def _cagr_lines(values, suffix, question):
+    ordered = _chronological(values)
+    (old_label, old), (new_label, new) = ordered[0], ordered[-1]
+    years_match = YEARS_PATTERN.search(question)
+    if years_match:
+        years = int(years_match.group(1) or years_match.group(2))
+    else:
+        old_key, new_key = period_key(old_label), period_key(new_label)
+        if not old_key or not new_key or old_key[0] < 0 or new_key[0] < 0:
+            return None
+        years = new_key[0] - old_key[0]
+    if years <= 0 or old <= 0 or new <= 0:
+        return None
+    cagr = ((new / old) ** (Decimal(1) / years) - 1) * 100
+    return [f"CAGR ({old_label} -> {new_label}, {years} years): ({_fmt(new)} / {_fmt(old)})^(1/{years}) - 1 = {_fmt(cagr, 2)}%"]
+
+
+FORMULAS = {
+    "difference": (2, _difference_lines),
+    "growth": (2, _growth_lines),
+    "margin": (2, _margin_lines),
+    "sum": (2, _sum_lines),
+    "average": (1, _average_lines),
+    "cagr": (2, _cagr_lines),
+}
+
+
+def solve(question: str):
+    """Answers a calculation request locally, or returns None if it is out of scope."""
+    lowered = question.lower()
+    if any(re.search(rf"(?<![a-z]){re.escape(keyword)}(?![a-z])", lowered) for keyword in UNSUPPORTED_KEYWORDS):
+        return None
+
+    intents = detect_intents(question)
+    raw_values = parse_values(question)
+    with localcontext() as ctx:
+        ctx.prec = PRECISION
+        if intents and raw_values:
+            if has_unparsed_numbers(question):
+                return None
+            normalized = _normalize_units(raw_values)
+            if normalized is None:
+                return None
+            values, suffix = normalized
+            lines = []
+            for intent in intents:
+                min_values, formula = FORMULAS[intent]
+                if len(values) < min_values:
+                    return None
+                result = formula(values, suffix, question)
+                if not result:
+                    return None
+                lines.extend(result)
+            return "\n".join(lines)
+
+    if not raw_values:
+        for candidate in EXPRESSION_PATTERN.findall(question):
+            try:
+                result = evaluate_expression(candidate)
+            except ValueError:
+                continue
+            return f"{candidate.strip()} = {_fmt(result)}"
+    return None
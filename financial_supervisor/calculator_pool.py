@@ -0,0 +1,113 @@
+"""Pool of pre-built calculator sub-agent runners used by `calculate_with_python`.
+
+Building the Agent, code executor, services and Runner on every call added setup
+latency, and the fixed session id let concurrent calls share a session. Each call
+now borrows a runner exclusively, runs in a fresh session that is deleted
+afterwards, and records how long it waited for a free runner.
+"""
+import os
+import time
+import uuid
+import asyncio
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+
+CALC_APP_NAME = "calc_app"
+CALC_USER_ID = "sys"
+CALCULATOR_POOL_SIZE = int(os.environ.get("CALCULATOR_POOL_SIZE", "4"))
+SANDBOX_RESOURCE_NAME = os.environ.get("SANDBOX_RESOURCE_NAME", "projects/605897091243/locations/us-central1/reasoningEngines/3475832232818507776/sandboxEnvironments/2303281147120975872")
+
+CALCULATOR_INSTRUCTION = """You are a strict code executor. You are given a math question containing raw data.
+You MUST use your built-in python sandbox to write python to calculate the answer.
+Output a markdown block with the python code. Ensure you print() the final output."""
+
+
+@dataclass
+class PooledRunner:
+    runner: object
+    session_service: object
+
+
+def build_calculator_runner() -> PooledRunner:
+    from google.adk.agents import Agent
+    from google.adk.runners import Runner
+    from google.adk.sessions import InMemorySessionService
+    from google.adk.artifacts.in_memory_artifact_service import InMemoryArtifactService
+    from google.adk.code_executors.agent_engine_sandbox_code_executor import AgentEngineSandboxCodeExecutor
+
+    calc_agent = Agent(
+        model="gemini-2.5-flash",
+        name="Calculator_Agent",
+        instruction=CALCULATOR_INSTRUCTION,
+        code_executor=AgentEngineSandboxCodeExecutor(sandbox_resource_name=SANDBOX_RESOURCE_NAME)
+    )
+    service = InMemorySessionService()
+    runner = Runner(app_name=CALC_APP_NAME, agent=calc_agent, session_service=service,
+                    artifact_service=InMemoryArtifactService())
+    return PooledRunner(runner=runner, session_service=service)
+
+
+class CalculatorRunnerPool:
+    """Fixed-size pool of calculator runners shared by all sessions of the process."""
+
+    def __init__(self, size: int = CALCULATOR_POOL_SIZE, factory=build_calculator_runner):
+        self.size = max(1, size)
+        self.factory = factory
+        self._idle = None
+        self._loop = None
+        self.acquisitions = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.in_use = 0
+
+    def _ensure_pool(self):
+        # asyncio queues are bound to one event loop; rebuild if the loop changed
+        # (e.g. successive asyncio.run calls in scripts).
+        loop = asyncio.get_running_loop()
+        if self._idle is None or self._loop is not loop:
+            self._loop = loop
+            self._idle = asyncio.Queue()
+            for _ in range(self.size):
+                self._idle.put_nowait(self.factory())
+
+    @asynccontextmanager
+    async def acquire(self):
+        """Borrows a runner exclusively for the duration of the block."""
+        self._ensure_pool()
+        started = time.perf_counter()
+        pooled = await self._idle.get()
+        waited = time.perf_counter() - started
+        self.acquisitions += 1
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+        self.in_use += 1
+        try:
+            yield pooled
+        finally:
+            self.in_use -= 1
+            self._idle.put_nowait(pooled)
+
+    @asynccontextmanager
+    async def session(self):
+        """Borrows a runner and opens a fresh session on it; the session is
+        deleted when the block exits, even on error or cancellation."""
+        async with self.acquire() as pooled:
+            session_id = uuid.uuid4().hex
+            await pooled.session_service.create_session(
+                app_name=CALC_APP_NAME, user_id=CALC_USER_ID, session_id=session_id
+            )
+            try:
+                yield pooled.runner, session_id
+            finally:
+                await pooled.session_service.delete_session(
+                    app_name=CALC_APP_NAME, user_id=CALC_USER_ID, session_id=session_id
+                )
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size,
+            "in_use": self.in_use,
+            "acquisitions": self.acquisitions,
+            "avg_wait_ms": 1000 * self.total_wait / self.acquisitions if self.acquisitions else 0.0,
+            "max_wait_ms": 1000 * self.max_wait,
+        }
@@ -0,0 +1,139 @@
+"""Lazily created, process-wide clients shared by the tools and ingest.py.
+
+Nothing here imports google.genai or chromadb, or opens a connection, until
+first use. Importing the agent package (`adk run .`, `adk web .`, scripts) is
+then cheap and has no side effects. Every getter is thread-safe: concurrent
+first calls build the object exactly once.
+"""
+import os
+import threading
+
+_UNSET = object()
+
+
+class Lazy:
+    """A value built by `factory` on the first call, then returned as-is.
+
+        embedder = Lazy(lambda: EmbeddingBatcher(get_genai_client()))
+        embedder().embed(texts)
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._value = _UNSET
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        value = self._value
+        if value is _UNSET:
+            with self._lock:
+                if self._value is _UNSET:
+                    self._value = self._factory()
+                value = self._value
+        return value
+
+    def is_ready(self) -> bool:
+        return self._value is not _UNSET
+
+    def set(self, value):
+        """Replaces the value, e.g. with a fake client in benchmarks."""
+        with self._lock:
+            self._value = value
+
+    def reset(self):
+        """Forgets the value; the next call builds a new one."""
+        with self._lock:
+            self._value = _UNSET
+
+
+class LazyMap:
+    """A Lazy per key: `factory(key)` builds each value on its first use.
+
+        retrievers = LazyMap(lambda shard: make_retriever(get_collection(DB_PATH, shard), ...))
+        retrievers("reports_alphabet_q1-2025").query(...)
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, key):
+        value = self._values.get(key)
+        if value is None:
+            with self._lock:
+                value = self._values.get(key)
+                if value is None:
+                    value = self._values[key] = Lazy(lambda: self._factory(key))
+        return value()
+
+    def reset(self):
+        """Forgets every value; the next calls build new ones."""
+        with self._lock:
+            self._values = {}
+
+
+_lock = threading.RLock()
+_genai_clients = {}
+_chroma_clients = {}
+_collections = {}
+
+
+def get_genai_client(vertexai: bool = True, project: str = None, location: str = None):
+    """Project and location default to the environment at call time (after .env is loaded)."""
+    project = project or os.environ.get("GOOGLE_CLOUD_PROJECT", "gcpsaptesting")
+    location = location or os.environ.get("GOOGLE_CLOUD_LOCATION", "us-central1")
+    key = (vertexai, project, location)
+    client = _genai_clients.get(key)
+    if client is None:
+        with _lock:
+            client = _genai_clients.get(key)
+            if client is None:
+                from google.genai import Client
+                client = _genai_clients[key] = Client(vertexai=vertexai, project=project, location=location)
+    return client
+
+
+def get_chroma_client(path: str):
+    key = os.path.abspath(path)
+    client = _chroma_clients.get(key)
+    if client is None:
+        with _lock:
+            client = _chroma_clients.get(key)
+            if client is None:
+                import chromadb
+                client = _chroma_clients[key] = chromadb.PersistentClient(path=key)
+    return client
+
+
+def get_collection(path: str, name: str):
+    key = (os.path.abspath(path), name)
+    collection = _collections.get(key)
+    if collection is None:
+        with _lock:
+            collection = _collections.get(key)
+            if collection is None:
+                collection = _collections[key] = get_chroma_client(path).get_or_create_collection(name=name)
+    return collection
+
+
+def list_collections(path: str) -> list:
+    # Chroma >= 0.6 returns names, older versions Collection objects.
+    return [getattr(c, "name", c) for c in get_chroma_client(path).list_collections()]
+
+
+def drop_collection(path: str, name: str):
+    """Deletes the collection, if it exists."""
+    with _lock:
+        try:
+            get_chroma_client(path).delete_collection(name)
+        except Exception as e:
+            print(f"Skipping deletion: {e}")
+        _collections.pop((os.path.abspath(path), name), None)
+
+
+def recreate_collection(path: str, name: str):
+    """Drops the collection (if any) and returns a fresh, empty one."""
+    with _lock:
+        drop_collection(path, name)
+        return get_collection(path, name)
@@ -0,0 +1,166 @@
+"""Batched access to the embedding model, shared by ingest.py and the retrieval tools."""
+import asyncio
+import hashlib
+import math
+import struct
+from types import SimpleNamespace
+
+from . import tracing
+
+EMBEDDING_MODEL = "text-embedding-005"
+
+# Vertex AI request limits for text-embedding-005: 250 inputs and 20k tokens per call.
+MAX_BATCH_SIZE = 250
+MAX_BATCH_TOKENS = 20000
+# Deliberately pessimistic: number-heavy HTML tables tokenize far denser than prose.
+CHARS_PER_TOKEN = 3
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, math.ceil(len(text) / CHARS_PER_TOKEN))
+
+
+class EmbeddingBatcher:
+    """Groups texts into size- and token-limited batches, one embed_content call per batch.
+
+    When a `cache` (an EmbeddingCache) is given, cached texts are served from it and
+    only the misses are sent to the API.
+    """
+
+    def __init__(self, client, model: str = EMBEDDING_MODEL,
+                 max_batch_size: int = MAX_BATCH_SIZE, max_batch_tokens: int = MAX_BATCH_TOKENS,
+                 cache=None):
+        self.client = client
+        self.model = model
+        self.cache = cache
+        self.max_batch_size = max_batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.requests = 0
+        self.texts_embedded = 0
+
+    def batches(self, texts: list[str]):
+        """Yields lists of indices into `texts`. Oversized texts get a batch of their own."""
+        batch, batch_tokens = [], 0
+        for i, text in enumerate(texts):
+            tokens = estimate_tokens(text)
+            if batch and (len(batch) >= self.max_batch_size or batch_tokens + tokens > self.max_batch_tokens):
+                yield batch
+                batch, batch_tokens = [], 0
+            batch.append(i)
+            batch_tokens += tokens
+        if batch:
+            yield batch
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        """Returns one vector per input text, in input order."""
+        if self.cache is not None:
+            vectors = self.cache.get_many(self.model, texts)
+        else:
+            vectors = [None] * len(texts)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            fresh = self._embed_uncached([texts[i] for i in missing])
+            for i, vector in zip(missing, fresh):
+                vectors[i] = vector
+            if self.cache is not None:
+                self.cache.put_many(self.model, [texts[i] for i in missing], fresh)
+        return vectors
+
+    def _embed_uncached(self, texts: list[str]) -> list[list[float]]:
+        vectors = [None] * len(texts)
+        for batch in self.batches(texts):
+            contents = [texts[i] for i in batch]
+            with tracing.span("genai.embed_content", model=self.model, texts=len(batch),
+                              est_tokens=sum(estimate_tokens(t) for t in contents)):
+                response = self.client.models.embed_content(
+                    model=self.model,
+                    contents=contents
+                )
+            if len(response.embeddings) != len(batch):
+                raise RuntimeError(
+                    f"Embedding API returned {len(response.embeddings)} vectors for {len(batch)} inputs"
+                )
+            for i, emb in zip(batch, response.embeddings):
+                vectors[i] = list(emb.values)
+            self.requests += 1
+            self.texts_embedded += len(batch)
+        return vectors
+
+    def embed_one(self, text: str) -> list[float]:
+        return self.embed([text])[0]
+
+    async def aembed(self, texts: list[str]) -> list[list[float]]:
+        """Async variant of embed() for the agent's event loop: cache I/O runs in a
+        worker thread and batches go concurrently through the async client (client.aio)."""
+        if self.cache is not None:
+            vectors = await asyncio.to_thread(self.cache.get_many, self.model, texts)
+        else:
+            vectors = [None] * len(texts)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            batches = list(self.batches(missing_texts))
+            responses = await asyncio.gather(*[
+                self._aembed_batch([missing_texts[i] for i in batch])
+                for batch in batches
+            ])
+            fresh = [None] * len(missing_texts)
+            for batch, response in zip(batches, responses):
+                if len(response.embeddings) != len(batch):
+                    raise RuntimeError(
+                        f"Embedding API returned {len(response.embeddings)} vectors for {len(batch)} inputs"
+                    )
+                for i, emb in zip(batch, response.embeddings):
+                    fresh[i] = list(emb.values)
+                self.requests += 1
+                self.texts_embedded += len(batch)
+            for i, vector in zip(missing, fresh):
+                vectors[i] = vector
+            if self.cache is not None:
+                await asyncio.to_thread(self.cache.put_many, self.model, missing_texts, fresh)
+        return vectors
+
+    async def _aembed_batch(self, contents: list[str]):
+        with tracing.span("genai.embed_content", model=self.model, texts=len(contents),
+                          est_tokens=sum(estimate_tokens(t) for t in contents)):
+            return await self.client.aio.models.embed_content(model=self.model, contents=contents)
+
+    async def aembed_one(self, text: str) -> list[float]:
+        return (await self.aembed([text]))[0]
+
+
+class FakeEmbeddingClient:
+    """Offline stand-in for google.genai.Client that only implements
+    models.embed_content and aio.models.embed_content.
+
+    Vectors are derived from a hash of the text, so identical texts always map to
+    identical unit vectors. Every request is recorded in `calls` for assertions.
+    """
+
+    def __init__(self, dimensions: int = 768):
+        self.dimensions = dimensions
+        self.calls = []
+        self.models = SimpleNamespace(embed_content=self.embed_content)
+        self.aio = SimpleNamespace(models=SimpleNamespace(embed_content=self.aembed_content))
+
+    def vector_for(self, text: str) -> list[float]:
+        values = []
+        counter = 0
+        while len(values) < self.dimensions:
+            block = hashlib.sha256(f"{counter}:{text}".encode("utf-8")).digest()
+            values.extend(v / 2**31 for v in struct.unpack("<8i", block))
+            counter += 1
+        values = values[:self.dimensions]
+        norm = math.sqrt(sum(v * v for v in values)) or 1.0
+        return [v / norm for v in values]
+
+    def embed_content(self, model: str, contents, config=None):
+        if isinstance(contents, str):
+            contents = [contents]
+        self.calls.append({"model": model, "count": len(contents)})
+        return SimpleNamespace(
+            embeddings=[SimpleNamespace(values=self.vector_for(text)) for text in contents]
+        )
+
+    async def aembed_content(self, model: str, contents, config=None):
+        return self.embed_content(model, contents, config)
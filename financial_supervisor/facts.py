@@ -0,0 +1,145 @@
+"""SQLite store of numeric facts extracted from financial tables at ingest time."""
+import os
+import re
+import threading
+
+from .cache import open_database
+from .tables import normalize_period
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FACTS_DB_PATH = os.path.join(BASE_DIR, "chroma_db", "financial_facts.sqlite")
+
+
+def normalize_metric(text: str) -> str:
+    """Lowercased words only, so 'Operating income (loss):' matches 'operating income'."""
+    return " ".join(re.findall(r"[a-z0-9]+", text.lower()))
+
+
+def qualified_metric(metric: str, section: str) -> str:
+    """Line item followed by its section, so 'Google Cloud' under 'Revenues:' is
+    found as 'google cloud revenues'."""
+    return normalize_metric(f"{metric} {section}")
+
+
+class FactsStore:
+    """Normalized (company, metric, period, value, unit, source) rows, indexed on metric and period."""
+
+    def __init__(self, path: str = FACTS_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = open_database(path)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS facts ("
+                " id INTEGER PRIMARY KEY,"
+                " company TEXT NOT NULL,"
+                " metric TEXT NOT NULL,"
+                " metric_norm TEXT NOT NULL,"
+                " section TEXT NOT NULL,"
+                " period TEXT NOT NULL,"
+                " column_label TEXT NOT NULL,"
+                " value REAL NOT NULL,"
+                " unit TEXT NOT NULL,"
+                " quarter TEXT NOT NULL,"
+                " document_type TEXT NOT NULL,"
+                " source_file TEXT NOT NULL,"
+                " source_chunk_id TEXT NOT NULL,"
+                " qualified_norm TEXT NOT NULL DEFAULT '')"
+            )
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(facts)")}
+            if "qualified_norm" not in columns:
+                # Stores written before the qualified key existed.
+                self._conn.execute("ALTER TABLE facts ADD COLUMN qualified_norm TEXT NOT NULL DEFAULT ''")
+                rows = self._conn.execute("SELECT id, metric, section FROM facts").fetchall()
+                self._conn.executemany("UPDATE facts SET qualified_norm = ? WHERE id = ?",
+                                       [(qualified_metric(metric, section), row_id) for row_id, metric, section in rows])
+            self._conn.execute("CREATE INDEX IF NOT EXISTS facts_metric ON facts(metric_norm)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS facts_qualified ON facts(qualified_norm)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS facts_period ON facts(period, metric_norm)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS facts_source ON facts(source_file)")
+
+    def add_facts(self, facts: list, company: str, quarter: str, document_type: str,
+                  source_file: str, source_chunk_id: str):
+        rows = [
+            (company, f["metric"], normalize_metric(f["metric"]), qualified_metric(f["metric"], f["section"]),
+             f["section"], f["period"], f["column_label"], f["value"], f["unit"], quarter, document_type,
+             source_file, source_chunk_id)
+            for f in facts
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO facts (company, metric, metric_norm, qualified_norm, section, period, column_label,"
+                " value, unit, quarter, document_type, source_file, source_chunk_id)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+
+    def delete_source(self, source_file: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM facts WHERE source_file = ?", (source_file,))
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM facts")
+
+    def lookup(self, metric: str, periods: list = None, company: str = "", limit: int = 50) -> list:
+        """Finds facts whose line item, alone or followed by its section, is `metric` or
+        starts with it ('operating income' finds 'Operating income (loss)' but not 'Other
+        income (expense)'). Both keys are indexed. Only when nothing matches, falls back
+        to facts whose metric or section contains every word of `metric`.
+
+        `periods` accepts forms like 'Q1 2024', 'Q1-2024' or 'FY 2024'. Identical
+        values reported in several tables are collapsed into one row.
+        """
+        words = normalize_metric(metric).split()
+        if not words:
+            return []
+        phrase = " ".join(words)
+        filters = []
+        filter_params = []
+        if periods:
+            normalized = [normalize_period(p) or p.strip() for p in periods if p.strip()]
+            if normalized:
+                filters.append(f"period IN ({','.join('?' * len(normalized))})")
+                filter_params.extend(normalized)
+        if company:
+            filters.append("company = ?")
+            filter_params.append(company.lower())
+
+        # Equality or a word-boundary prefix: ' ' sorts just below '!'.
+        key_params = [phrase, f"{phrase} ", f"{phrase}!"]
+        keyed = ("(metric_norm = ? OR (metric_norm >= ? AND metric_norm < ?)"
+                 " OR qualified_norm = ? OR (qualified_norm >= ? AND qualified_norm < ?))")
+        # Exact line items first, then longer line items, then section-qualified matches.
+        rank = ("CASE WHEN metric_norm = ? THEN 0 WHEN metric_norm >= ? AND metric_norm < ? THEN 1"
+                " ELSE 2 END")
+        rows = self._query([keyed] + filters, key_params * 2 + filter_params, rank, key_params, limit)
+        if rows:
+            return rows
+
+        clauses = []
+        params = []
+        for word in words:
+            clauses.append("(metric_norm LIKE ? OR lower(section) LIKE ?)")
+            params.extend([f"%{word}%", f"%{word}%"])
+        # Rows whose own line item matches the phrase rank above rows that only
+        # match through their section (e.g. 'Google Services' under 'Operating income').
+        return self._query(clauses + filters, params + filter_params,
+                           "CASE WHEN metric_norm LIKE ? THEN 0 ELSE 1 END", [f"%{phrase}%"], limit)
+
+    def _query(self, clauses: list, params: list, rank: str, rank_params: list, limit: int) -> list:
+        query = (
+            "SELECT company, metric, section, period, value, unit,"
+            " group_concat(DISTINCT source_chunk_id), MIN(length(metric_norm)) AS metric_len"
+            f" FROM facts WHERE {' AND '.join(clauses)}"
+            " GROUP BY company, metric, section, period, value, unit"
+            f" ORDER BY MIN({rank}), metric_len, metric, section, period"
+            " LIMIT ?"
+        )
+        with self._lock:
+            rows = self._conn.execute(query, params + rank_params + [limit]).fetchall()
+        return [
+            {"company": r[0], "metric": r[1], "section": r[2], "period": r[3], "value": r[4],
+             "unit": r[5], "sources": r[6].split(",")}
+            for r in rows
+        ]
@@ -0,0 +1,37 @@
+"""Evaluation of Chroma-style `where` filters against plain metadata dicts.
+
+Used by retrieval backends that keep their own copy of the chunk metadata.
+Supports implicit equality, $eq, $ne, $in, $nin, $and and $or.
+"""
+
+
+def matches_where(metadata: dict, where: dict) -> bool:
+    if not where:
+        return True
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches_where(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_where(metadata, clause) for clause in condition):
+                return False
+        elif not _matches_field(metadata.get(key), condition):
+            return False
+    return True
+
+
+def _matches_field(value, condition) -> bool:
+    if not isinstance(condition, dict):
+        return value == condition
+    for op, operand in condition.items():
+        if op == "$eq" and value != operand:
+            return False
+        if op == "$ne" and value == operand:
+            return False
+        if op == "$in" and value not in operand:
+            return False
+        if op == "$nin" and value in operand:
+            return False
+        if op not in ("$eq", "$ne", "$in", "$nin"):
+            raise ValueError(f"Unsupported filter operator: {op}")
+    return True
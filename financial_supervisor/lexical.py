@@ -0,0 +1,148 @@
+"""BM25 keyword index over the chunk collection, and reciprocal rank fusion.
+
+Embedding similarity alone misses exact tokens such as "Class C", "Other Bets" or
+a specific figure. ingest.py builds this index over the same chunk ids as the
+Chroma collection; the retrieval tools query both and fuse the rankings.
+"""
+import os
+import re
+import json
+import math
+import threading
+from collections import Counter
+
+from .filters import matches_where
+
+# Metadata copied into the index so lexical hits can honour the tools' filters.
+INDEXED_METADATA = ("Content_Type", "Quarter", "Company", "Document_Type", "Source_File", "Header_Path")
+TOKEN_PATTERN = re.compile(r"\d+(?:\.\d+)?|[a-z]+")
+TAG_PATTERN = re.compile(r"<[^>]+>")
+RRF_K = 60
+
+
+def tokenize(text: str) -> list:
+    """Lowercased words and numbers; HTML tags are dropped and thousands
+    separators removed so '$90,234' matches '90234'."""
+    text = TAG_PATTERN.sub(" ", text).lower()
+    text = re.sub(r"(?<=\d),(?=\d{3})", "", text)
+    return TOKEN_PATTERN.findall(text)
+
+
+class BM25Index:
+    def __init__(self, ids=None, metadatas=None, doc_lens=None, postings=None, k1: float = 1.5, b: float = 0.75):
+        self.ids = ids or []
+        self.metadatas = metadatas or []
+        self.doc_lens = doc_lens or []
+        self.postings = postings or {}
+        self.k1 = k1
+        self.b = b
+        self.avgdl = sum(self.doc_lens) / len(self.doc_lens) if self.doc_lens else 0.0
+        self._field_values = {}
+
+    @classmethod
+    def build(cls, ids: list, documents: list, metadatas: list) -> "BM25Index":
+        postings = {}
+        doc_lens = []
+        for doc_idx, document in enumerate(documents):
+            tokens = tokenize(document or "")
+            doc_lens.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                postings.setdefault(term, []).append([doc_idx, tf])
+        kept_metadata = [{k: (m or {}).get(k) for k in INDEXED_METADATA if (m or {}).get(k) is not None}
+                         for m in metadatas]
+        return cls(list(ids), kept_metadata, doc_lens, postings)
+
+    def save(self, path: str):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"ids": self.ids, "metadatas": self.metadatas, "doc_lens": self.doc_lens,
+                       "postings": self.postings, "k1": self.k1, "b": self.b}, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["ids"], data["metadatas"], data["doc_lens"], data["postings"], data["k1"], data["b"])
+
+    def __len__(self):
+        return len(self.ids)
+
+    def field_values(self, field: str) -> list:
+        """Distinct values of an indexed metadata field, e.g. every section heading path."""
+        if field not in self._field_values:
+            self._field_values[field] = sorted({m[field] for m in self.metadatas if m.get(field) is not None})
+        return self._field_values[field]
+
+    def search(self, query: str, n_results: int = 10, where: dict = None) -> list:
+        """Returns up to n_results (chunk id, score) pairs, best first."""
+        n_docs = len(self.ids)
+        if not n_docs:
+            return []
+        scores = Counter()
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (n_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+            for doc_idx, tf in posting:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lens[doc_idx] / (self.avgdl or 1))
+                scores[doc_idx] += idf * tf * (self.k1 + 1) / (tf + norm)
+        hits = []
+        for doc_idx, score in scores.most_common():
+            if where and not matches_where(self.metadatas[doc_idx], where):
+                continue
+            hits.append((self.ids[doc_idx], score))
+            if len(hits) >= n_results:
+                break
+        return hits
+
+
+class IndexFile:
+    """Loads a persisted BM25Index (or whatever `loader` reads) lazily and reloads
+    it when ingest rewrites the file."""
+
+    def __init__(self, path: str, loader=None):
+        self.path = path
+        self.loader = loader or BM25Index.load
+        self._index = None
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return None
+        with self._lock:
+            if self._index is None or mtime != self._mtime:
+                self._index = self.loader(self.path)
+                self._mtime = mtime
+            return self._index
+
+
+def _stem(token: str) -> str:
+    return token[:-1] if len(token) > 3 and token.endswith("s") else token
+
+
+def match_sections(section: str, header_paths: list, min_overlap: float = 0.5) -> list:
+    """Heading paths sharing at least `min_overlap` of the words in `section`
+    ('capital returns' matches 'Financial Results > Capital Return Program')."""
+    wanted = {_stem(t) for t in tokenize(section)}
+    if not wanted:
+        return []
+    matches = []
+    for path in header_paths:
+        overlap = len(wanted & {_stem(t) for t in tokenize(path)}) / len(wanted)
+        if overlap >= min_overlap:
+            matches.append(path)
+    return matches
+
+
+def reciprocal_rank_fusion(rankings: list, k: int = RRF_K) -> list:
+    """Fuses ranked id lists: score(id) = sum over lists of 1 / (k + rank)."""
+    scores = Counter()
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking, start=1):
+            scores[chunk_id] += 1.0 / (k + rank)
+    return [chunk_id for chunk_id, _ in scores.most_common()]
@@ -0,0 +1,147 @@
+"""Packs over-fetched retrieval candidates into the chunks that go into the prompt.
+
+Text is split with a 200-character overlap, so neighbouring chunks of one PDF
+often come back together and repeat each other. A PDF ingested twice under two
+paths returns identical chunks. `pack` takes the fused candidates in rank order,
+with their stored embeddings, and:
+
+1. merges runs of consecutive text chunks from the same source and section into
+   one passage, dropping the overlapping text;
+2. picks passages by maximal marginal relevance: relevance is the fused rank
+   (so keyword-only hits keep their place), and redundancy is the cosine
+   similarity to passages already picked. Near-duplicates are dropped outright;
+3. stops at n_results passages or when the next passage would exceed the token
+   budget (the best passage is always kept).
+"""
+import os
+import re
+
+from .cache import normalize_text
+from .embeddings import estimate_tokens
+
+PACKING_ENABLED = os.environ.get("PACKING_ENABLED", "1") == "1"
+# Tokens of retrieved context per tool call (retrieve_multi_quarter splits it across its groups).
+PACK_TOKEN_BUDGET = int(os.environ.get("PACK_TOKEN_BUDGET", "3000"))
+# Candidates fetched per returned result before packing.
+PACK_OVERFETCH = int(os.environ.get("PACK_OVERFETCH", "3"))
+MMR_LAMBDA = float(os.environ.get("MMR_LAMBDA", "0.7"))
+DUPLICATE_SIMILARITY = float(os.environ.get("DUPLICATE_SIMILARITY", "0.97"))
+MAX_MERGED_CHUNKS = 3
+# Shorter common prefixes/suffixes are treated as coincidence, not chunk overlap.
+MIN_OVERLAP_CHARS = 20
+MAX_OVERLAP_CHARS = 400
+
+# Text chunk ids are "<source key>_text_chunk_<n>", the source key being the PDF's
+# path under earnings/ (e.g. "alphabet/Q1-2025/release.pdf"), so same-named PDFs
+# in different folders never share ids or merge into one passage.
+TEXT_CHUNK_ID = re.compile(r"^(?P<source>.+?\.pdf)_text_chunk_(?P<index>\d+)$", re.IGNORECASE)
+
+
+def join_overlapping(first: str, second: str) -> str:
+    """Concatenates two consecutive chunks, writing their shared overlap once."""
+    for size in range(min(len(first), len(second), MAX_OVERLAP_CHARS), MIN_OVERLAP_CHARS - 1, -1):
+        if first.endswith(second[:size]):
+            return first + second[size:]
+    return f"{first}\n{second}"
+
+
+def _unit_vector(embedding):
+    if embedding is None or len(embedding) == 0:
+        return None
+    import numpy as np
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else None
+
+
+def merge_adjacent(ids: list, documents: list, metadatas: list, embeddings: list) -> list:
+    """Groups candidates into passages, keeping rank order by each passage's best member.
+    Returns [{"ids", "document", "metadata", "vector", "rank"}]."""
+    position = {}
+    for rank, chunk_id in enumerate(ids):
+        match = TEXT_CHUNK_ID.match(chunk_id)
+        if match:
+            position[(match["source"], int(match["index"]))] = rank
+
+    passages = []
+    used = set()
+    for rank, chunk_id in enumerate(ids):
+        if rank in used:
+            continue
+        members = [rank]
+        match = TEXT_CHUNK_ID.match(chunk_id)
+        if match:
+            source, index = match["source"], int(match["index"])
+            # Extend over ranked neighbours on both sides, preferring to keep the run short.
+            for step in (-1, 1):
+                neighbour = index + step
+                while len(members) < MAX_MERGED_CHUNKS and position.get((source, neighbour)) not in (None, *used):
+                    if (metadatas[position[(source, neighbour)]] or {}).get("Header_Path") != \
+                            (metadatas[rank] or {}).get("Header_Path"):
+                        break  # chunks never span sections, so neither do passages
+                    members.append(position[(source, neighbour)])
+                    neighbour += step
+            members.sort(key=lambda r: int(TEXT_CHUNK_ID.match(ids[r])["index"]))
+        used.update(members)
+
+        document = documents[members[0]] or ""
+        for r in members[1:]:
+            document = join_overlapping(document, documents[r] or "")
+        vectors = [v for v in (_unit_vector(embeddings[r]) for r in members) if v is not None]
+        vector = _unit_vector(sum(vectors) / len(vectors)) if vectors else None
+        passages.append({
+            "ids": [ids[r] for r in members],
+            "document": document,
+            "metadata": metadatas[rank],
+            "vector": vector,
+            "rank": rank,
+        })
+    return passages
+
+
+def pack(ids: list, documents: list, metadatas: list, embeddings: list, n_results: int,
+         token_budget: int = PACK_TOKEN_BUDGET, mmr_lambda: float = MMR_LAMBDA,
+         duplicate_similarity: float = DUPLICATE_SIMILARITY) -> dict:
+    """Returns a Chroma-shaped result of at most n_results passages within token_budget.
+    "merged_ids" lists the chunk ids behind each passage."""
+    embeddings = embeddings if embeddings is not None else [None] * len(ids)
+    passages = merge_adjacent(ids, documents, metadatas, embeddings)
+    count = max(1, len(ids))
+
+    selected, seen_texts, used_tokens = [], set(), 0
+    remaining = list(passages)
+    while remaining and len(selected) < n_results:
+        best, best_score = None, None
+        for passage in remaining:
+            redundancy = 0.0
+            if passage["vector"] is not None:
+                similarities = [float(passage["vector"] @ s["vector"]) for s in selected if s["vector"] is not None]
+                redundancy = max(similarities, default=0.0)
+            if redundancy >= duplicate_similarity:
+                passage["duplicate"] = True
+                continue
+            relevance = 1.0 - passage["rank"] / count
+            score = mmr_lambda * relevance - (1.0 - mmr_lambda) * redundancy
+            if best_score is None or score > best_score:
+                best, best_score = passage, score
+        remaining = [p for p in remaining if p is not best and not p.get("duplicate")]
+        if best is None:
+            break
+        text_key = normalize_text(best["document"]).lower()
+        if text_key in seen_texts:
+            continue
+        tokens = estimate_tokens(best["document"])
+        if selected and used_tokens + tokens > token_budget:
+            continue  # a shorter passage further down may still fit
+        seen_texts.add(text_key)
+        used_tokens += tokens
+        selected.append(best)
+
+    return {
+        "ids": [[p["ids"][0] for p in selected]],
+        "documents": [[p["document"] for p in selected]],
+        "metadatas": [[p["metadata"] for p in selected]],
+        "merged_ids": [[p["ids"] for p in selected]],
+        "tokens": used_tokens,
+        "candidates": len(ids),
+    }
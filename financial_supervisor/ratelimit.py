@@ -0,0 +1,206 @@
+"""Client-side rate limiting and retries for bulk Vertex AI calls (used by ingest.py).
+
+Each limited method gets a token bucket (requests per minute, matching how Vertex
+quotas are expressed) and an AIMD limit on requests in flight: +1 after a full
+window of successes, halved on a 429/503. Retryable errors are retried with
+full-jitter exponential backoff, so a quota spike slows ingest down instead of
+losing charts or chunks.
+
+    client = RateLimitedClient(genai_client, {
+        "embed_content": {"requests_per_minute": 600, "max_concurrency": 4},
+        "generate_content": {"requests_per_minute": 300, "max_concurrency": 8},
+    })
+    client.models.generate_content(model=..., contents=...)
+"""
+import os
+import time
+import random
+import threading
+from types import SimpleNamespace
+
+from . import tracing
+
+MAX_RETRIES = int(os.environ.get("INGEST_MAX_RETRIES", "8"))
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 60.0
+# Halve the concurrency limit at most once per this many seconds: the requests
+# already in flight when quota runs out all fail together.
+DECREASE_COOLDOWN_SECONDS = 2.0
+
+THROTTLE_CODES = {429, 503}
+RETRYABLE_CODES = THROTTLE_CODES | {500, 502, 504}
+THROTTLE_STATUSES = {"RESOURCE_EXHAUSTED", "UNAVAILABLE"}
+RETRYABLE_STATUSES = THROTTLE_STATUSES | {"INTERNAL", "DEADLINE_EXCEEDED"}
+
+
+def _error_code(error: BaseException):
+    code = getattr(error, "code", None)
+    if not isinstance(code, int):
+        code = getattr(error, "status_code", None)
+    return code if isinstance(code, int) else None
+
+
+def is_throttle(error: BaseException) -> bool:
+    """True for quota and overload responses (google.genai.errors.APIError 429/503)."""
+    return _error_code(error) in THROTTLE_CODES or getattr(error, "status", None) in THROTTLE_STATUSES
+
+
+def is_retryable(error: BaseException) -> bool:
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    return _error_code(error) in RETRYABLE_CODES or getattr(error, "status", None) in RETRYABLE_STATUSES
+
+
+class TokenBucket:
+    """Allows `rate` requests per second on average, with bursts of up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Blocks until a token is available; returns the seconds waited."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    return waited
+                delay = (1.0 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class AdaptiveConcurrency:
+    """AIMD limit on requests in flight, between `minimum` and `maximum`."""
+
+    def __init__(self, maximum: int, minimum: int = 1):
+        self.maximum = max(1, maximum)
+        self.minimum = max(1, min(minimum, self.maximum))
+        self.limit = float(self.maximum)
+        self.in_flight = 0
+        self._successes = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self, throttled: bool = False):
+        with self._cond:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if throttled:
+                self._successes = 0
+                if now - self._last_decrease >= DECREASE_COOLDOWN_SECONDS:
+                    self.limit = max(self.minimum, self.limit / 2)
+                    self._last_decrease = now
+            else:
+                self._successes += 1
+                if self._successes >= int(self.limit):
+                    self.limit = min(self.maximum, self.limit + 1)
+                    self._successes = 0
+            self._cond.notify_all()
+
+
+class RequestLimiter:
+    """Token bucket + adaptive concurrency + jittered retries around one kind of request."""
+
+    def __init__(self, name: str, requests_per_minute: float, max_concurrency: int, max_retries: int = MAX_RETRIES):
+        self.name = name
+        self.bucket = TokenBucket(requests_per_minute / 60.0)
+        self.concurrency = AdaptiveConcurrency(max_concurrency)
+        self.max_retries = max_retries
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+        self.throttled = 0
+        self.wait_seconds = 0.0
+
+    def call(self, func, *args, **kwargs):
+        attempt = 0
+        while True:
+            waited = self.bucket.acquire()
+            self.concurrency.acquire()
+            throttled = False
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                throttled = is_throttle(e)
+                if not is_retryable(e) or attempt >= self.max_retries:
+                    raise
+                error = e
+            else:
+                return result
+            finally:
+                self.concurrency.release(throttled)
+                with self._lock:
+                    self.requests += 1
+                    self.wait_seconds += waited
+                    self.throttled += 1 if throttled else 0
+
+            delay = random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+            attempt += 1
+            with self._lock:
+                self.retries += 1
+            span = tracing.current_span()
+            if span is not None:
+                span.set("retries", attempt)
+            print(f"    -> {self.name}: {type(error).__name__} ({_error_code(error) or getattr(error, 'status', '')}), "
+                  f"retry {attempt}/{self.max_retries} in {delay:.1f}s "
+                  f"(concurrency limit {int(self.concurrency.limit)})")
+            time.sleep(delay)
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "throttled": self.throttled,
+            "concurrency_limit": int(self.concurrency.limit),
+            "bucket_wait_s": round(self.wait_seconds, 1),
+        }
+
+
+class RateLimitedClient:
+    """google.genai.Client wrapper whose models.<method> calls go through a RequestLimiter.
+
+    `limits` maps a models method name to RequestLimiter arguments. Methods without
+    limits, and every other attribute (e.g. `aio`), pass through unchanged.
+    """
+
+    def __init__(self, client, limits: dict):
+        self.client = client
+        self.limiters = {method: RequestLimiter(method, **config) for method, config in limits.items()}
+        self.models = _LimitedModels(client.models, self.limiters)
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def stats(self) -> dict:
+        return {method: limiter.stats() for method, limiter in self.limiters.items()}
+
+
+class _LimitedModels(SimpleNamespace):
+    def __init__(self, models, limiters: dict):
+        super().__init__()
+        self._models = models
+        for method, limiter in limiters.items():
+            setattr(self, method, self._wrap(getattr(models, method), limiter))
+
+    @staticmethod
+    def _wrap(func, limiter: RequestLimiter):
+        def limited(*args, **kwargs):
+            return limiter.call(func, *args, **kwargs)
+        return limited
+
+    def __getattr__(self, name):
+        return getattr(self._models, name)
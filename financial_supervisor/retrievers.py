@@ -0,0 +1,251 @@
+"""Vector retrieval backends behind one interface used by the retrieval tools.
+
+`ChromaRetriever` wraps the Chroma collection (HNSW + `where` filtering).
+`NumpyRetriever` serves an export of the same collection from a memory-mapped
+matrix with precomputed metadata bitmasks: top-k is a matmul + argpartition,
+optionally restricted to a few IVF partitions once the corpus is large.
+Select the backend with RETRIEVER_BACKEND=chroma|numpy.
+
+Both return Chroma-shaped results: {"ids": [[...]], "documents": [[...]],
+"metadatas": [[...]], "distances": [[...]]} (plus "embeddings" when asked).
+"""
+import os
+import json
+import threading
+
+import numpy as np
+
+RETRIEVER_BACKEND = os.environ.get("RETRIEVER_BACKEND", "chroma")
+NUMPY_INDEX_DTYPE = os.environ.get("NUMPY_INDEX_DTYPE", "float32")
+# Build IVF partitions only once brute force stops being cheap.
+IVF_MIN_VECTORS = int(os.environ.get("IVF_MIN_VECTORS", "50000"))
+IVF_NPROBE = int(os.environ.get("IVF_NPROBE", "8"))
+# Metadata fields whose value bitmasks are built eagerly at load time.
+BITMASK_FIELDS = ("Content_Type", "Quarter", "Company", "Document_Type", "Source_File")
+MATMUL_BLOCK_ROWS = 65536
+
+
+class ChromaRetriever:
+    def __init__(self, collection):
+        self.collection = collection
+
+    def query(self, embedding: list, n_results: int, where: dict = None, include_embeddings: bool = False) -> dict:
+        include = ["documents", "metadatas", "distances"]
+        if include_embeddings:
+            include.append("embeddings")
+        return self.collection.query(query_embeddings=[embedding], n_results=n_results, where=where or None,
+                                     include=include)
+
+    def get(self, ids: list, include_embeddings: bool = False) -> dict:
+        include = ["documents", "metadatas"]
+        if include_embeddings:
+            include.append("embeddings")
+        return self.collection.get(ids=ids, include=include)
+
+
+def _kmeans(vectors: np.ndarray, n_lists: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """Spherical k-means on unit vectors; returns unit-norm centroids."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_lists, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        for c in range(n_lists):
+            members = vectors[assignments == c]
+            if len(members):
+                centroid = members.sum(axis=0)
+                centroids[c] = centroid / (np.linalg.norm(centroid) or 1.0)
+    return centroids
+
+
+def export_numpy_index(collection, index_dir: str, dtype: str = NUMPY_INDEX_DTYPE):
+    """Writes the collection's vectors, documents and metadata for NumpyRetriever."""
+    os.makedirs(index_dir, exist_ok=True)
+    ids, documents, metadatas, embeddings = [], [], [], []
+    page_size = 5000
+    offset = 0
+    while True:
+        page = collection.get(include=["documents", "metadatas", "embeddings"], limit=page_size, offset=offset)
+        ids.extend(page["ids"])
+        documents.extend(page["documents"])
+        metadatas.extend(page["metadatas"])
+        embeddings.extend(page["embeddings"])
+        if len(page["ids"]) < page_size:
+            break
+        offset += page_size
+
+    matrix = np.asarray(embeddings, dtype=np.float32).reshape(len(ids), -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix = matrix / np.where(norms == 0, 1.0, norms)
+
+    if dtype == "int8":
+        scales = np.abs(matrix).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        np.save(os.path.join(index_dir, "scales.npy"), scales.astype(np.float32))
+        stored = np.round(matrix / scales[:, None]).astype(np.int8)
+    else:
+        stored = matrix.astype(np.float16 if dtype == "float16" else np.float32)
+    np.save(os.path.join(index_dir, "vectors.npy"), stored)
+
+    ivf_paths = [os.path.join(index_dir, name) for name in ("ivf_centroids.npy", "ivf_assignments.npy")]
+    if len(ids) >= IVF_MIN_VECTORS:
+        centroids = _kmeans(matrix, int(np.sqrt(len(ids))))
+        np.save(ivf_paths[0], centroids)
+        np.save(ivf_paths[1], np.argmax(matrix @ centroids.T, axis=1).astype(np.int32))
+    else:
+        for path in ivf_paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+    # chunks.json is written last; its mtime tells readers the export is complete.
+    tmp_path = os.path.join(index_dir, "chunks.json.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"ids": ids, "documents": documents, "metadatas": metadatas, "dtype": dtype}, f)
+    os.replace(tmp_path, os.path.join(index_dir, "chunks.json"))
+    return len(ids)
+
+
+class _NumpyIndex:
+    def __init__(self, index_dir: str):
+        with open(os.path.join(index_dir, "chunks.json"), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        self.ids = data["ids"]
+        self.documents = data["documents"]
+        self.metadatas = data["metadatas"]
+        self.row_of = {chunk_id: i for i, chunk_id in enumerate(self.ids)}
+        self.vectors = np.load(os.path.join(index_dir, "vectors.npy"), mmap_mode="r")
+        scales_path = os.path.join(index_dir, "scales.npy")
+        self.scales = np.load(scales_path) if data["dtype"] == "int8" and os.path.exists(scales_path) else None
+        centroids_path = os.path.join(index_dir, "ivf_centroids.npy")
+        if os.path.exists(centroids_path):
+            self.centroids = np.load(centroids_path)
+            self.assignments = np.load(os.path.join(index_dir, "ivf_assignments.npy"))
+        else:
+            self.centroids = None
+            self.assignments = None
+        self.bitmasks = {}
+        for field in BITMASK_FIELDS:
+            for i, meta in enumerate(self.metadatas):
+                value = (meta or {}).get(field)
+                if value is not None:
+                    self.bitmasks.setdefault((field, value), np.zeros(len(self.ids), dtype=bool))[i] = True
+
+    def field_mask(self, field: str, value) -> np.ndarray:
+        key = (field, value)
+        if key not in self.bitmasks:
+            self.bitmasks[key] = np.fromiter(
+                ((meta or {}).get(field) == value for meta in self.metadatas), dtype=bool, count=len(self.ids)
+            )
+        return self.bitmasks[key]
+
+    def where_mask(self, where: dict) -> np.ndarray:
+        mask = np.ones(len(self.ids), dtype=bool)
+        for key, condition in (where or {}).items():
+            if key == "$and":
+                for clause in condition:
+                    mask &= self.where_mask(clause)
+            elif key == "$or":
+                any_mask = np.zeros(len(self.ids), dtype=bool)
+                for clause in condition:
+                    any_mask |= self.where_mask(clause)
+                mask &= any_mask
+            elif not isinstance(condition, dict):
+                mask &= self.field_mask(key, condition)
+            else:
+                for op, operand in condition.items():
+                    if op == "$eq":
+                        mask &= self.field_mask(key, operand)
+                    elif op == "$ne":
+                        mask &= ~self.field_mask(key, operand)
+                    elif op in ("$in", "$nin"):
+                        in_mask = np.zeros(len(self.ids), dtype=bool)
+                        for value in operand:
+                            in_mask |= self.field_mask(key, value)
+                        mask &= in_mask if op == "$in" else ~in_mask
+                    else:
+                        raise ValueError(f"Unsupported filter operator: {op}")
+        return mask
+
+    def scores(self, rows: np.ndarray, query: np.ndarray) -> np.ndarray:
+        out = np.empty(len(rows), dtype=np.float32)
+        for start in range(0, len(rows), MATMUL_BLOCK_ROWS):
+            block_rows = rows[start:start + MATMUL_BLOCK_ROWS]
+            block = np.asarray(self.vectors[block_rows], dtype=np.float32)
+            block_scores = block @ query
+            if self.scales is not None:
+                block_scores *= self.scales[block_rows]
+            out[start:start + MATMUL_BLOCK_ROWS] = block_scores
+        return out
+
+    def vector(self, row: int) -> list:
+        vector = np.asarray(self.vectors[row], dtype=np.float32)
+        if self.scales is not None:
+            vector = vector * self.scales[row]
+        return vector.tolist()
+
+
+class NumpyRetriever:
+    """Brute-force (or IVF-probed) cosine search over an exported, memory-mapped index."""
+
+    def __init__(self, index_dir: str, nprobe: int = IVF_NPROBE):
+        self.index_dir = index_dir
+        self.nprobe = nprobe
+        self._index = None
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def _get_index(self) -> _NumpyIndex:
+        mtime = os.path.getmtime(os.path.join(self.index_dir, "chunks.json"))
+        with self._lock:
+            if self._index is None or mtime != self._mtime:
+                self._index = _NumpyIndex(self.index_dir)
+                self._mtime = mtime
+            return self._index
+
+    def query(self, embedding: list, n_results: int, where: dict = None, include_embeddings: bool = False) -> dict:
+        index = self._get_index()
+        query = np.asarray(embedding, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        mask = index.where_mask(where)
+        if index.centroids is not None:
+            probes = np.argsort(-(index.centroids @ query))[:self.nprobe]
+            mask &= np.isin(index.assignments, probes)
+        rows = np.flatnonzero(mask)
+        if len(rows) == 0:
+            return self._result(index, [], [], include_embeddings)
+        scores = index.scores(rows, query)
+        k = min(n_results, len(rows))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return self._result(index, rows[top].tolist(), (1.0 - scores[top]).tolist(), include_embeddings)
+
+    def get(self, ids: list, include_embeddings: bool = False) -> dict:
+        index = self._get_index()
+        rows = [index.row_of[chunk_id] for chunk_id in ids if chunk_id in index.row_of]
+        result = {
+            "ids": [index.ids[r] for r in rows],
+            "documents": [index.documents[r] for r in rows],
+            "metadatas": [index.metadatas[r] for r in rows],
+        }
+        if include_embeddings:
+            result["embeddings"] = [index.vector(r) for r in rows]
+        return result
+
+    @staticmethod
+    def _result(index: _NumpyIndex, rows: list, distances: list, include_embeddings: bool) -> dict:
+        result = {
+            "ids": [[index.ids[r] for r in rows]],
+            "documents": [[index.documents[r] for r in rows]],
+            "metadatas": [[index.metadatas[r] for r in rows]],
+            "distances": [distances],
+        }
+        if include_embeddings:
+            result["embeddings"] = [[index.vector(r) for r in rows]]
+        return result
+
+
+def make_retriever(collection, index_dir: str, backend: str = RETRIEVER_BACKEND):
+    if backend == "numpy":
+        return NumpyRetriever(index_dir)
+    if backend != "chroma":
+        raise ValueError(f"Unknown RETRIEVER_BACKEND: {backend}")
+    return ChromaRetriever(collection)
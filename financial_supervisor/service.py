@@ -0,0 +1,295 @@
+"""Long-lived local retrieval daemon shared by several agent processes, and its client.
+
+One daemon holds the shard catalog, every shard's vector and BM25 index, the
+facts store, embedding client and cache, and an in-memory LRU of chart image bytes. Agent processes started
+with RETRIEVAL_SERVICE_URL set open none of these; their tools call the daemon
+over keep-alive HTTP connections instead (see tools.py).
+
+    python -m financial_supervisor.service --port 8765
+    RETRIEVAL_SERVICE_URL=http://127.0.0.1:8765 adk web .
+
+Endpoints (JSON in, JSON out unless noted):
+    GET  /health                 -> {"status": "ok", ...stats}
+    GET  /image?path=<path>      -> image bytes (paths must be inside the project)
+    POST /embed                  {"texts": [...]} -> {"embeddings": [...]}
+    POST /hybrid_query           {"requests": [{query, where, n_results, token_budget, company, quarter}, ...]}
+                                 -> {"results": [...]}; queries are embedded in one batch
+    POST /sections               {"section", "company", "quarter"} -> {"paths": [...]}
+    POST /facts                  {"metric", "periods", "company"} -> {"facts": [...]}
+"""
+import os
+import sys
+import json
+import time
+import queue
+import asyncio
+import argparse
+import threading
+import http.client
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs, quote
+
+from . import tracing
+
+RETRIEVAL_SERVICE_HOST = os.environ.get("RETRIEVAL_SERVICE_HOST", "127.0.0.1")
+RETRIEVAL_SERVICE_PORT = int(os.environ.get("RETRIEVAL_SERVICE_PORT", "8765"))
+# Keep-alive connections each client process keeps open to the daemon.
+RETRIEVAL_SERVICE_POOL_SIZE = int(os.environ.get("RETRIEVAL_SERVICE_POOL_SIZE", "8"))
+RETRIEVAL_SERVICE_TIMEOUT = float(os.environ.get("RETRIEVAL_SERVICE_TIMEOUT", "30"))
+IMAGE_CACHE_MAX_BYTES = int(os.environ.get("RETRIEVAL_SERVICE_IMAGE_CACHE_MB", "256")) * 1024 * 1024
+
+
+class RetrievalServiceError(RuntimeError):
+    pass
+
+
+def _json_default(value):
+    # numpy scalars and arrays from the retrievers
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    return str(value)
+
+
+class ImageCache:
+    """LRU of image file contents, bounded by total bytes."""
+
+    def __init__(self, max_bytes: int = IMAGE_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._images = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path: str) -> bytes:
+        with self._lock:
+            data = self._images.get(path)
+            if data is not None:
+                self._images.move_to_end(path)
+                self.hits += 1
+                return data
+            self.misses += 1
+        with open(path, "rb") as f:
+            data = f.read()
+        with self._lock:
+            if path not in self._images and len(data) <= self.max_bytes:
+                self._images[path] = data
+                self.size += len(data)
+                while self.size > self.max_bytes:
+                    _, evicted = self._images.popitem(last=False)
+                    self.size -= len(evicted)
+        return data
+
+    def stats(self) -> dict:
+        return {"images": len(self._images), "bytes": self.size, "hits": self.hits, "misses": self.misses}
+
+
+class RetrievalService:
+    """Runs the tools' local retrieval functions on one event loop thread, for all HTTP threads."""
+
+    def __init__(self):
+        from . import tools
+        # This process IS the service: its calls pass local=True so they always use the
+        # local indexes, whatever RETRIEVAL_SERVICE_URL says.
+        self.tools = tools
+        self.images = ImageCache()
+        self.started = time.time()
+        self.requests = 0
+        self._requests_lock = threading.Lock()
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="retrieval-service-loop", daemon=True)
+        self._thread.start()
+
+    def count_request(self):
+        """Called once per request from the HTTP handler threads."""
+        with self._requests_lock:
+            self.requests += 1
+
+    def run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def embed(self, payload: dict) -> dict:
+        async def embed():
+            async with self.tools.backend_semaphore:
+                return await self.tools.embedder().aembed(payload["texts"])
+        return {"embeddings": self.run(embed())}
+
+    def hybrid_query(self, payload: dict) -> dict:
+        return {"results": self.run(self.tools.hybrid_queries(payload["requests"], local=True))}
+
+    def sections(self, payload: dict) -> dict:
+        return {"paths": self.tools.matching_sections(payload["section"], payload.get("company", ""),
+                                                      payload.get("quarter", ""), local=True)}
+
+    def facts(self, payload: dict) -> dict:
+        return {"facts": self.tools.lookup_facts(payload["metric"], payload.get("periods") or [],
+                                                 payload.get("company", ""), local=True)}
+
+    def image(self, path: str) -> bytes:
+        resolved = os.path.realpath(path if os.path.isabs(path) else os.path.join(self.tools.BASE_DIR, path))
+        if os.path.commonpath([resolved, os.path.realpath(self.tools.BASE_DIR)]) != os.path.realpath(self.tools.BASE_DIR):
+            raise PermissionError(f"Image path outside the project: {path}")
+        return self.images.get(resolved)
+
+    def health(self) -> dict:
+        return {"status": "ok", "uptime_s": round(time.time() - self.started, 1), "requests": self.requests,
+                "shards": len(self.tools.resolve_shards()),
+                "image_cache": self.images.stats(), "embedding_cache": self.tools.embedder().cache.stats()}
+
+
+def make_handler(service: RetrievalService, verbose: bool = False):
+    routes = {"/embed": service.embed, "/hybrid_query": service.hybrid_query,
+              "/sections": service.sections, "/facts": service.facts}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, so clients can pool connections
+
+        def _send(self, status: int, body: bytes, content_type: str = "application/json"):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _send_json(self, status: int, value: dict):
+            self._send(status, json.dumps(value, default=_json_default).encode("utf-8"))
+
+        def _fail(self, error: Exception):
+            status = 404 if isinstance(error, FileNotFoundError) else 400 if isinstance(
+                error, (KeyError, ValueError, PermissionError)) else 500
+            self._send_json(status, {"error": f"{type(error).__name__}: {error}"})
+
+        def do_GET(self):
+            service.count_request()
+            url = urlsplit(self.path)
+            try:
+                if url.path == "/health":
+                    self._send_json(200, service.health())
+                elif url.path == "/image":
+                    self._send(200, service.image(parse_qs(url.query)["path"][0]), "application/octet-stream")
+                else:
+                    self._send_json(404, {"error": f"Unknown endpoint: {url.path}"})
+            except Exception as e:
+                self._fail(e)
+
+        def do_POST(self):
+            service.count_request()
+            route = routes.get(urlsplit(self.path).path)
+            body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            if route is None:
+                self._send_json(404, {"error": f"Unknown endpoint: {self.path}"})
+                return
+            try:
+                with tracing.span(f"service{self.path}", request_bytes=len(body)):
+                    result = route(json.loads(body or b"{}"))
+                self._send_json(200, result)
+            except Exception as e:
+                self._fail(e)
+
+        def log_message(self, format, *args):
+            if verbose:
+                super().log_message(format, *args)
+
+    return Handler
+
+
+def serve(host: str = RETRIEVAL_SERVICE_HOST, port: int = RETRIEVAL_SERVICE_PORT, warm_up: bool = True,
+          verbose: bool = False) -> ThreadingHTTPServer:
+    """Creates the server (port 0 picks a free one); call serve_forever() on it."""
+    service = RetrievalService()
+    if warm_up:
+        service.tools.warm_up(local=True)
+    server = ThreadingHTTPServer((host, port), make_handler(service, verbose))
+    server.daemon_threads = True
+    server.service = service
+    return server
+
+
+class RetrievalServiceClient:
+    """Thin, thread-safe client with a pool of keep-alive connections to the daemon."""
+
+    def __init__(self, url: str, pool_size: int = RETRIEVAL_SERVICE_POOL_SIZE, timeout: float = RETRIEVAL_SERVICE_TIMEOUT):
+        parts = urlsplit(url)
+        if parts.scheme != "http" or not parts.hostname:
+            raise ValueError(f"RETRIEVAL_SERVICE_URL must look like http://127.0.0.1:8765, got: {url}")
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(pool_size)
+
+    def _request(self, method: str, path: str, body: bytes = None) -> bytes:
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        with tracing.span(f"retrieval_service{urlsplit(path).path}", request_bytes=len(body or b"")) as s, self._slots:
+            for attempt in range(2):
+                try:
+                    conn = self._idle.get_nowait()
+                except queue.Empty:
+                    conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+                try:
+                    conn.request(method, path, body=body, headers=headers)
+                    response = conn.getresponse()
+                    data = response.read()
+                except (http.client.HTTPException, ConnectionError) as e:
+                    # A pooled connection the daemon closed (e.g. after a restart): retry once on a new one.
+                    conn.close()
+                    if attempt:
+                        raise RetrievalServiceError(f"Retrieval service unreachable at {self.host}:{self.port}: {e}")
+                    continue
+                except OSError:
+                    conn.close()
+                    raise
+                self._idle.put(conn)
+                s.set("response_bytes", len(data))
+                if response.status != 200:
+                    try:
+                        message = json.loads(data).get("error", "")
+                    except ValueError:
+                        message = data[:200]
+                    raise RetrievalServiceError(f"{method} {path} -> {response.status}: {message}")
+                return data
+
+    def _post(self, path: str, payload: dict) -> dict:
+        return json.loads(self._request("POST", path, json.dumps(payload, default=_json_default).encode("utf-8")))
+
+    def health(self) -> dict:
+        return json.loads(self._request("GET", "/health"))
+
+    def embed(self, texts: list) -> list:
+        return self._post("/embed", {"texts": texts})["embeddings"]
+
+    def hybrid_queries(self, requests: list) -> list:
+        return self._post("/hybrid_query", {"requests": requests})["results"]
+
+    def sections(self, section: str, company: str = "", quarter: str = "") -> list:
+        return self._post("/sections", {"section": section, "company": company, "quarter": quarter})["paths"]
+
+    def facts(self, metric: str, periods: list, company: str) -> list:
+        return self._post("/facts", {"metric": metric, "periods": periods, "company": company})["facts"]
+
+    def image(self, path: str) -> bytes:
+        return self._request("GET", f"/image?path={quote(path)}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the shared retrieval service.")
+    parser.add_argument("--host", default=RETRIEVAL_SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=RETRIEVAL_SERVICE_PORT)
+    parser.add_argument("--no-warm-up", action="store_true", help="Open the indexes on the first request instead.")
+    parser.add_argument("--verbose", action="store_true", help="Log every request.")
+    args = parser.parse_args(argv)
+
+    server = serve(args.host, args.port, warm_up=not args.no_warm_up, verbose=args.verbose)
+    host, port = server.server_address[:2]
+    print(f"Retrieval service listening on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
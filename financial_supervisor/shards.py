@@ -0,0 +1,137 @@
+"""Per-company, per-quarter shards of the chunk store, and the catalog that routes queries to them.
+
+ingest.py writes each PDF into the Chroma collection of its shard and keeps a
+BM25 index and numpy export per shard under chroma_db/shards/<name>/. The
+catalog (chroma_db/shard_catalog.json) lists every shard with the companies and
+quarters it holds. The retrieval tools resolve the company and quarter of a
+call to the matching shards and search only those, so ingesting another
+company's filings neither grows nor reloads the indexes searched for this one.
+
+    catalog.resolve("alphabet", ["Q1-2025"])  -> ["reports_alphabet_q1-2025"]
+
+SHARD_BY=company keeps one shard per company (all quarters) instead.
+"""
+import os
+import re
+import json
+import time
+import hashlib
+
+SHARD_BY = os.environ.get("SHARD_BY", "company_quarter")
+SHARD_PREFIX = "reports"
+CATALOG_FILENAME = "shard_catalog.json"
+SHARDS_DIRNAME = "shards"
+# Databases ingested before sharding keep every chunk in this one collection.
+LEGACY_COLLECTION = "financial_reports"
+MAX_NAME_LENGTH = 63  # Chroma collection name limit
+
+COMPANY_ALIASES = {"google": "alphabet", "goog": "alphabet", "googl": "alphabet"}
+# Legal-form suffixes dropped from company names ("Alphabet Inc." -> "alphabet").
+COMPANY_SUFFIXES = {"inc", "incorporated", "corp", "corporation", "co", "company", "ltd", "limited", "llc",
+                    "plc", "sa", "ag", "nv", "se"}
+# Filename words that name the period or document, never the company
+# ("2025q1-alphabet-earnings-release.pdf").
+GENERIC_FILENAME_WORDS = {
+    "q", "fy", "h", "earnings", "release", "press", "slides", "presentation", "deck", "results", "quarter",
+    "quarterly", "annual", "report", "financial", "financials", "investor", "update", "transcript", "call",
+    "supplement", "supplemental", "statement", "statements", "final", "draft",
+}
+
+
+def _slug(value: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", (value or "").lower()).strip("-")
+
+
+def normalize_company(company: str) -> str:
+    words = _slug(company).split("-")
+    while len(words) > 1 and words[-1] in COMPANY_SUFFIXES:
+        words.pop()
+    slug = "-".join(words)
+    return COMPANY_ALIASES.get(slug, slug)
+
+
+def detect_company(source_file: str) -> str:
+    """Company of a PDF from its path under earnings/: the top folder when PDFs are laid
+    out as <company>/<quarter>/<file>.pdf, else the first non-generic filename word."""
+    parts = source_file.split("/")
+    if len(parts) >= 3:
+        return normalize_company(parts[0]) or "unknown"
+    for word in re.findall(r"[a-z]+", os.path.splitext(parts[-1])[0].lower()):
+        if len(word) > 1 and word not in GENERIC_FILENAME_WORDS:
+            return normalize_company(word)
+    return "unknown"
+
+
+def mentioned_companies(text: str, companies: list = ()) -> list:
+    """Normalized companies named in free text: any of `companies` (e.g. the catalog's)
+    or a known alias ("Google Q1 revenue" -> ["alphabet"])."""
+    padded = f"-{_slug(text)}-"
+    return sorted({normalize_company(name) for name in set(companies) | set(COMPANY_ALIASES)
+                   if _slug(name) and f"-{_slug(name)}-" in padded})
+
+
+def shard_name(company: str, quarter: str = "") -> str:
+    """Chroma collection name of the shard holding `company`'s chunks for `quarter`."""
+    parts = [SHARD_PREFIX, _slug(company) or "unknown"]
+    if SHARD_BY == "company_quarter" and _slug(quarter):
+        parts.append(_slug(quarter))
+    name = "_".join(parts)
+    if len(name) > MAX_NAME_LENGTH:
+        digest = hashlib.sha256(name.encode("utf-8")).hexdigest()[:12]
+        name = f"{name[:MAX_NAME_LENGTH - 13]}_{digest}"
+    return name
+
+
+def shard_paths(db_path: str, name: str) -> tuple:
+    """(BM25 index path, numpy export dir) of a shard."""
+    if name == LEGACY_COLLECTION:
+        return os.path.join(db_path, "bm25_index.json"), os.path.join(db_path, "numpy_index")
+    shard_dir = os.path.join(db_path, SHARDS_DIRNAME, name)
+    return os.path.join(shard_dir, "bm25_index.json"), os.path.join(shard_dir, "numpy_index")
+
+
+class ShardCatalog:
+    """{shard name: {"companies", "quarters", "chunks", "updated"}}, persisted as JSON."""
+
+    def __init__(self, path: str, shards: dict = None):
+        self.path = path
+        self.shards = shards or {}
+
+    @classmethod
+    def load(cls, path: str) -> "ShardCatalog":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(path, json.load(f)["shards"])
+
+    def save(self):
+        """Writes the catalog atomically so readers never see it half-written."""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"shards": self.shards}, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def __len__(self):
+        return len(self.shards)
+
+    def names(self) -> list:
+        return sorted(self.shards)
+
+    def update(self, name: str, companies: list, quarters: list, chunks: int):
+        self.shards[name] = {"companies": sorted(companies), "quarters": sorted(quarters), "chunks": chunks,
+                             "updated": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+    def remove(self, name: str):
+        self.shards.pop(name, None)
+
+    def companies(self) -> list:
+        return sorted({c for entry in self.shards.values() for c in entry["companies"]})
+
+    def resolve(self, company: str = "", quarters: list = ()) -> list:
+        """Shards holding `company` (any when blank) for any of `quarters` (all when empty)."""
+        company = normalize_company(company) if company else ""
+        quarters = {q for q in quarters if q}
+        return [
+            name for name, entry in sorted(self.shards.items())
+            if (not company or company in entry["companies"])
+            and (not quarters or quarters.intersection(entry["quarters"]))
+        ]
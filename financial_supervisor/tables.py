@@ -0,0 +1,292 @@
+"""Parsing of the HTML tables Docling exports: numeric fact extraction and a compact
+pipe-table form that the retrieval tools return instead of the HTML."""
+import re
+from html.parser import HTMLParser
+
+MONTH_TO_QUARTER = {
+    "march": 1, "june": 2, "september": 3, "december": 4,
+}
+SCALE_PATTERN = re.compile(r"in\s+(thousands|millions|billions)", re.IGNORECASE)
+YEAR_PATTERN = re.compile(r"\b((?:19|20)\d{2})\b")
+NUMBER_PATTERN = re.compile(r"^\(?-?\$?\s*\(?\d[\d,]*(?:\.\d+)?\)?\s*%?\)?$")
+EMPTY_VALUES = {"", "$", "—", "-", "–", "n/a", "na", "nm", "*"}
+# Cells Docling splits off from a number ('$ | 1,234 | %'); dropped in the compact form.
+DETACHED_SYMBOLS = {"$", "%", ")", "(", "$ (", "%)"}
+
+
+class _TableParser(HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.rows = []
+        self._row = None
+        self._cell = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "tr":
+            self._row = []
+        elif tag in ("td", "th") and self._row is not None:
+            attrs = dict(attrs)
+            self._cell = {
+                "text": [],
+                "colspan": int(attrs.get("colspan") or 1),
+                "rowspan": int(attrs.get("rowspan") or 1),
+            }
+        elif tag == "br" and self._cell is not None:
+            self._cell["text"].append(" ")
+
+    def handle_endtag(self, tag):
+        if tag in ("td", "th") and self._cell is not None:
+            self._cell["text"] = " ".join("".join(self._cell["text"]).split())
+            self._row.append(self._cell)
+            self._cell = None
+        elif tag == "tr" and self._row is not None:
+            self.rows.append(self._row)
+            self._row = None
+
+    def handle_data(self, data):
+        if self._cell is not None:
+            self._cell["text"].append(data)
+
+
+def parse_html_table(html: str) -> list:
+    """Returns the table as a rectangular grid of cell texts, with colspan and
+    rowspan cells repeated into every position they cover."""
+    parser = _TableParser()
+    parser.feed(html)
+    grid = []
+    pending = {}  # (row, col) -> text carried down by rowspan
+    for r, row in enumerate(parser.rows):
+        out = []
+        cells = iter(row)
+        c = 0
+        while True:
+            if (r, c) in pending:
+                out.append(pending.pop((r, c)))
+                c += 1
+                continue
+            cell = next(cells, None)
+            if cell is None:
+                break
+            for span_c in range(cell["colspan"]):
+                out.append(cell["text"])
+                for span_r in range(1, cell["rowspan"]):
+                    pending[(r + span_r, c + span_c)] = cell["text"]
+            c += cell["colspan"]
+        grid.append(out)
+    width = max((len(row) for row in grid), default=0)
+    return [row + [""] * (width - len(row)) for row in grid]
+
+
+def parse_number(text: str):
+    """Parses '$ 1,234', '(1,234)', '12.5%' or '-3'; returns (value, is_percent) or None."""
+    cleaned = text.strip().replace("−", "-")
+    if cleaned.lower() in EMPTY_VALUES or not NUMBER_PATTERN.match(cleaned):
+        return None
+    negative = "(" in cleaned or cleaned.startswith("-")
+    is_percent = cleaned.endswith("%") or cleaned.endswith("%)")
+    digits = re.sub(r"[^\d.]", "", cleaned)
+    try:
+        value = float(digits)
+    except ValueError:
+        return None
+    return (-value if negative else value), is_percent
+
+
+def is_year(text: str) -> bool:
+    return bool(re.fullmatch(r"(?:19|20)\d{2}", text.strip()))
+
+
+def normalize_period(label: str):
+    """Maps column headers such as 'Three Months Ended March 31, 2024', 'Q1 2024',
+    'Q1-2024', 'FY2024', 'FY24' or 'Year Ended December 31, 2024' to 'Q1 2024' / 'FY 2024'.
+    Returns None when no period can be recognised."""
+    if not label:
+        return None
+    text = label.lower()
+    year_match = YEAR_PATTERN.search(text)
+    quarter_match = re.search(r"\bq([1-4])\b", text)
+    fiscal_match = re.search(r"\bfy\s*'?(\d{4}|\d{2})\b", text)
+    if fiscal_match and not year_match:
+        digits = fiscal_match.group(1)
+        year = digits if len(digits) == 4 else f"20{digits[-2:]}"
+        return f"Q{quarter_match.group(1)} {year}" if quarter_match else f"FY {year}"
+    if quarter_match and year_match:
+        return f"Q{quarter_match.group(1)} {year_match.group(1)}"
+    if not year_match:
+        return None
+    year = year_match.group(1)
+    if fiscal_match or re.search(r"\b(?:year|twelve months|fiscal|full[- ]year)\b", text):
+        return f"FY {year}"
+    if re.search(r"\b(?:three months|quarter)\b", text):
+        for month, quarter in MONTH_TO_QUARTER.items():
+            if month in text:
+                return f"Q{quarter} {year}"
+    if re.search(r"\b(?:six|nine) months\b", text):
+        months = "6M" if "six" in text else "9M"
+        return f"{months} {year}"
+    if re.search(r"\b(?:as of|balance)\b", text) or any(month in text for month in MONTH_TO_QUARTER):
+        for month, quarter in MONTH_TO_QUARTER.items():
+            if month in text:
+                return f"Q{quarter} {year} (end)"
+    return year
+
+
+def table_scale(html: str, context: str = "") -> str:
+    """Monetary unit stated in the table or its heading, e.g. 'USD millions'."""
+    match = SCALE_PATTERN.search(f"{context} {re.sub(r'<[^>]+>', ' ', html)}")
+    return f"USD {match.group(1).lower()}" if match else ""
+
+
+def _header_row_count(grid: list) -> int:
+    """Leading rows whose value columns hold only labels or years."""
+    count = 0
+    for row in grid:
+        values = [cell for cell in row[1:] if cell]
+        if any(parse_number(cell) and not is_year(cell) for cell in values):
+            break
+        count += 1
+    return count
+
+
+def column_labels(grid: list) -> list:
+    header_rows = grid[:_header_row_count(grid)]
+    labels = []
+    for c in range(len(grid[0]) if grid else 0):
+        parts = []
+        for row in header_rows:
+            text = row[c]
+            if text and (not parts or parts[-1] != text):
+                parts.append(text)
+        labels.append(" ".join(parts))
+    return labels
+
+
+def extract_facts(html: str, context: str = "") -> list:
+    """Turns a financial table into rows of {metric, section, period, column_label, value, unit}.
+
+    `section` is the most recent label-only row above the metric (e.g. 'Revenues:'),
+    which disambiguates repeated line items such as 'Google Services'. Headers and
+    detached '%' cells are normalized as in compact_table.
+    """
+    grid = parse_html_table(html)
+    if not grid or len(grid[0]) < 2:
+        return []
+    grid = [_attach_percent_signs(row) for row in grid]
+    header_count = _leading_header_rows(grid)
+    labels = column_labels(grid[:header_count]) if header_count else [""] * len(grid[0])
+    periods = [normalize_period(label) for label in labels]
+    scale = table_scale(html, context)
+    facts = []
+    section = ""
+    for row in grid[header_count:]:
+        metric = row[0].strip().rstrip(":")
+        numbers = []
+        seen_periods = set()
+        for c in range(1, len(row)):
+            parsed = parse_number(row[c])
+            # Skip cells repeated by colspan and empty period columns.
+            if parsed is None or not (periods[c] or labels[c]):
+                continue
+            key = (periods[c] or labels[c], parsed)
+            if key in seen_periods:
+                continue
+            seen_periods.add(key)
+            numbers.append((c, parsed))
+        if not metric:
+            continue
+        if not numbers:
+            section = metric
+            continue
+        for c, (value, is_percent) in numbers:
+            if is_percent or "%" in labels[c]:
+                unit = "%"
+            elif "per share" in metric.lower() and scale:
+                unit = "USD"
+            else:
+                unit = scale
+            facts.append({
+                "metric": metric,
+                "section": section,
+                "period": periods[c] or labels[c],
+                "column_label": labels[c],
+                "value": value,
+                "unit": unit,
+            })
+    return facts
+
+
+def format_number(value: float, is_percent: bool = False) -> str:
+    """Canonical number text: no currency symbol or thousands separators, '-' for negatives."""
+    text = f"{value:.4f}".rstrip("0").rstrip(".") if value != int(value) else str(int(value))
+    return f"{text}%" if is_percent else text
+
+
+def _compact_cell(text: str) -> str:
+    if text.strip() in DETACHED_SYMBOLS:
+        return ""
+    parsed = parse_number(text)
+    if parsed is None:
+        return text.replace("|", "/")
+    return format_number(*parsed)
+
+
+def _attach_percent_signs(row: list) -> list:
+    """Moves a '%' that Docling put in its own cell onto the number to its left."""
+    row = list(row)
+    for c in range(1, len(row)):
+        if row[c].strip() in ("%", "%)") and row[c - 1].strip() and not row[c - 1].strip().endswith("%"):
+            row[c - 1] = row[c - 1].strip() + "%"
+            row[c] = ""
+    return row
+
+
+def _leading_header_rows(grid: list) -> int:
+    """Leading rows that label the value columns. Unlike _header_row_count, a
+    label-only row such as 'Revenues:' ends the header: it is a section row."""
+    count = 0
+    for row in grid:
+        values = [cell for cell in row[1:] if cell]
+        if not values or any(parse_number(cell) and not is_year(cell) for cell in values):
+            break
+        count += 1
+    return count
+
+
+def compact_table(html: str, context: str = "") -> str:
+    """Renders a table as a pipe-delimited Markdown table with normalized numbers.
+
+    Multi-row headers are merged into one header row, spanned cells that repeat
+    across columns are collapsed, and empty or symbol-only columns are dropped.
+    The monetary unit (e.g. 'USD millions') is stated once above the table.
+    Returns "" when the HTML holds no table.
+    """
+    grid = parse_html_table(html)
+    if not grid or not grid[0]:
+        return ""
+    grid = [_attach_percent_signs(row) for row in grid]
+    header_count = _leading_header_rows(grid)
+    labels = column_labels(grid[:header_count]) if header_count else [""] * len(grid[0])
+    body = [[_compact_cell(cell) for cell in row] for row in grid[header_count:]]
+
+    keep = []
+    for c in range(len(labels)):
+        column = [row[c] for row in body]
+        if c > 0 and not any(column):
+            continue
+        # colspan repeats a cell across columns; keep the first copy only.
+        if keep and labels[c] == labels[keep[-1]] and column == [row[keep[-1]] for row in body]:
+            continue
+        keep.append(c)
+
+    header = [labels[c] or ("Item" if i == 0 else "") for i, c in enumerate(keep)]
+    lines = []
+    scale = table_scale(html, context)
+    if scale:
+        lines.append(f"Units: {scale}")
+    lines.append("| " + " | ".join(header) + " |")
+    lines.append("|" + "---|" * len(keep))
+    for row in body:
+        cells = [row[c] for c in keep]
+        if any(cells):
+            lines.append("| " + " | ".join(cells) + " |")
+    return "\n".join(lines)
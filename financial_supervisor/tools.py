@@ -1,171 +1,539 @@
 import os
+import asyncio
+import threading
 import mimetypes
 from google.adk.tools import ToolContext
 import google.genai.types as types
-from google.genai import Client
-import chromadb
 from dotenv import load_dotenv
 
-load_dotenv(os.path.join(os.path.dirname(os.path.dirname(__file__)), ".env"))
+from . import calculator, clients, packing, tracing
+from .cache import EmbeddingCache
+from .calculator_pool import CalculatorRunnerPool, CALC_USER_ID
+from .embeddings import EmbeddingBatcher, EMBEDDING_MODEL
+from .facts import FactsStore
+from .lexical import IndexFile, match_sections, reciprocal_rank_fusion
+from .shards import ShardCatalog, CATALOG_FILENAME, LEGACY_COLLECTION, normalize_company, shard_paths
 
-GCP_PROJECT = os.environ.get("GOOGLE_CLOUD_PROJECT", "gcpsaptesting")
-GCP_LOCATION = os.environ.get("GOOGLE_CLOUD_LOCATION", "us-central1")
-client = Client(vertexai=True, project=GCP_PROJECT, location=GCP_LOCATION)
+load_dotenv(os.path.join(os.path.dirname(os.path.dirname(__file__)), ".env"))
 
-# Initialize ChromaDB using absolute path so adk web finds it
+# Use absolute paths so adk web finds the DB. Nothing below connects or opens a
+# file until the first tool call (or warm_up()); see clients.py.
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DB_PATH = os.path.join(BASE_DIR, "chroma_db")
-chroma_client = chromadb.PersistentClient(path=DB_PATH)
-collection = chroma_client.get_or_create_collection(name="financial_reports")
 
-async def retrieve_narrative(tool_context: ToolContext, query: str, quarter: str = "") -> str:
-    """
-    Retrieves TEXT narratives, executive quotes, risk factors, and strategic commentary.
-    Use this for questions like "What did the CEO say?", "What are the headwinds?", "Summarize the outlook".
-    This tool DOES NOT return financial tables.
-    IMPORTANT: The 'quarter' argument must exactly match the document folder (e.g., 'Q1-2025'). 
-    If you are looking for historical comparisons (like Q1 2024), leave 'quarter' blank, as historical data is usually contained in the current quarter's report.
-    """
-    print(f"   [Tool] Searching Narrative for: {query}")
+# With RETRIEVAL_SERVICE_URL (e.g. http://127.0.0.1:8765) set, embedding, search, fact
+# and image calls go to a shared retrieval daemon (service.py) and this process
+# opens none of the indexes or clients below. The service itself passes local=True
+# to the functions it serves so they always use the local indexes.
+RETRIEVAL_SERVICE_URL = os.environ.get("RETRIEVAL_SERVICE_URL", "")
+
+def get_collection(shard: str):
+    return clients.get_collection(DB_PATH, shard)
+
+def _build_service_client():
+    from .service import RetrievalServiceClient
+    return RetrievalServiceClient(RETRIEVAL_SERVICE_URL)
+
+def _build_retriever(shard: str):
+    # RETRIEVER_BACKEND=numpy serves vectors from the export ingest.py writes for each shard.
+    from .retrievers import make_retriever, RETRIEVER_BACKEND
+    collection = get_collection(shard) if RETRIEVER_BACKEND == "chroma" else None
+    return make_retriever(collection, shard_paths(DB_PATH, shard)[1])
+
+# Repeated queries are answered from the same on-disk cache ingest.py fills.
+embedder = clients.Lazy(lambda: EmbeddingBatcher(clients.get_genai_client(), EMBEDDING_MODEL, cache=EmbeddingCache()))
+facts_store = clients.Lazy(lambda: FactsStore(os.path.join(DB_PATH, "financial_facts.sqlite")))
+# One vector retriever and BM25 index per shard, opened when a query first routes to it.
+retrievers = clients.LazyMap(_build_retriever)
+lexical_indexes = clients.LazyMap(lambda shard: IndexFile(shard_paths(DB_PATH, shard)[0]))
+shard_catalog = clients.Lazy(lambda: IndexFile(os.path.join(DB_PATH, CATALOG_FILENAME), ShardCatalog.load))
+retrieval_service = clients.Lazy(_build_service_client)
+
+# Each ranker contributes this many candidates before reciprocal rank fusion.
+HYBRID_CANDIDATES = int(os.environ.get("HYBRID_CANDIDATES", "20"))
+NARRATIVE_RESULTS = 6
+TABLE_RESULTS = 5
+# Results per (quarter, query) group in retrieve_multi_quarter.
+FANOUT_RESULTS = int(os.environ.get("FANOUT_RESULTS", "3"))
+# Turn-scoped state listing the chart images saved as artifacts, so a cached
+# answer can restore them in another session (see answer_cache.py).
+CITED_IMAGES_STATE_KEY = "temp:cited_images"
+
+calculator_pool = CalculatorRunnerPool()
+
+# Caps in-flight embedding and Chroma calls across all concurrent agent sessions.
+BACKEND_CONCURRENCY = int(os.environ.get("RETRIEVAL_BACKEND_CONCURRENCY", "8"))
+backend_semaphore = asyncio.Semaphore(BACKEND_CONCURRENCY)
+
+@tracing.traced()
+def warm_up(local: bool = False):
+    """Opens the vector and BM25 indexes of every shard and the facts store, and makes one
+    embedding request so credentials are loaded and a connection is open before the first
+    question. In client mode, opens a connection to the retrieval service instead."""
+    if RETRIEVAL_SERVICE_URL and not local:
+        retrieval_service().health()
+        return
+    from .retrievers import NumpyRetriever
+    for shard in resolve_shards():
+        index = retrievers(shard)
+        if isinstance(index, NumpyRetriever):
+            index.get([])  # maps the exported index
+        else:
+            get_collection(shard).count()
+        lexical_indexes(shard).get()
+    facts_store()
+    batcher = embedder()
+    batcher.client.models.embed_content(model=batcher.model, contents=["warm up"])
+
+def start_warm_up() -> threading.Thread:
+    """Runs warm_up() on a daemon thread; failures are reported, never raised."""
+    def run():
+        try:
+            warm_up()
+            print("   [Tools] Warm-up complete.")
+        except Exception as e:
+            print(f"   [Tools] Warm-up failed: {e}")
+    thread = threading.Thread(target=run, name="tools-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+@tracing.traced()
+async def embed_query(query: str, local: bool = False) -> list[float]:
+    if RETRIEVAL_SERVICE_URL and not local:
+        return (await asyncio.to_thread(retrieval_service().embed, [query]))[0]
+    async with backend_semaphore:
+        return await embedder().aembed_one(query)
+
+def resolve_shards(company: str = "", quarter: str = "") -> list:
+    """Shards holding `company` for `quarter` (blank means all). A store ingested before
+    sharding has no catalog and is searched as its single collection."""
+    catalog = shard_catalog().get()
+    if catalog is None:
+        return [LEGACY_COLLECTION]
+    return catalog.resolve(company, [quarter] if quarter else [])
+
+@tracing.traced()
+async def query_collection(shard: str, embedding: list, n_results: int, where: dict,
+                           include_embeddings: bool = False) -> dict:
+    """Runs a blocking vector query against one shard in a worker thread so the event loop stays free."""
+    async with backend_semaphore:
+        return await asyncio.to_thread(lambda: retrievers(shard).query(embedding, n_results, where,
+                                                                       include_embeddings))
+
+async def query_shards(shards: list, embedding: list, n_results: int, where: dict,
+                       include_embeddings: bool = False) -> list:
+    """Queries the shards concurrently and keeps the n_results nearest chunks overall.
+    Returns [(chunk_id, document, metadata, embedding, shard)], nearest first."""
+    results = await asyncio.gather(*[
+        query_collection(shard, embedding, n_results, where, include_embeddings) for shard in shards
+    ])
+    hits = []
+    for shard, result in zip(shards, results):
+        embeddings = result.get('embeddings') if include_embeddings else None
+        embeddings = embeddings[0] if embeddings is not None else [None] * len(result['ids'][0])
+        hits.extend(
+            (distance, chunk_id, doc, meta, chunk_embedding, shard)
+            for chunk_id, doc, meta, chunk_embedding, distance in zip(
+                result['ids'][0], result['documents'][0], result['metadatas'][0], embeddings,
+                result['distances'][0])
+        )
+    hits.sort(key=lambda hit: hit[0])
+    return [hit[1:] for hit in hits[:n_results]]
+
+@tracing.traced()
+def _lexical_search(shards: list, query: str, n_results: int, where: dict) -> list:
+    """BM25 hits of every shard, best score first, as [(chunk_id, shard)]. Term
+    statistics are per shard, so scores are comparable only approximately; RRF
+    only uses the resulting order."""
+    hits = []
+    for shard in shards:
+        index = lexical_indexes(shard).get()
+        if index is not None:
+            hits.extend((score, chunk_id, shard) for chunk_id, score in index.search(query, n_results, where))
+    hits.sort(key=lambda hit: -hit[0])
+    return [(chunk_id, shard) for _, chunk_id, shard in hits[:n_results]]
+
+async def _fetch_missing(missing: dict, include_embeddings: bool) -> list:
+    """Gets chunks found only by BM25, grouped by shard; returns (shard, Chroma-shaped get result) pairs."""
+    async def fetch(shard: str, ids: list):
+        async with backend_semaphore:
+            return shard, await asyncio.to_thread(lambda: retrievers(shard).get(ids, include_embeddings=include_embeddings))
+    return await asyncio.gather(*[fetch(shard, ids) for shard, ids in missing.items()])
+
+@tracing.traced()
+async def hybrid_query(query: str, where: dict, n_results: int, query_embedding: list = None,
+                       token_budget: int = None, company: str = "", quarter: str = "", local: bool = False) -> dict:
+    """Vector and BM25 search over the same chunks, fused by reciprocal rank.
+    Only the shards holding `company` for `quarter` are searched (all when blank),
+    concurrently. Returns a Chroma-shaped result with the top n_results chunks and
+    the "shards" searched. Pass `query_embedding` when the query was already
+    embedded (e.g. in a batch). With a `token_budget`, n_results * PACK_OVERFETCH
+    fused candidates are packed into at most n_results passages instead (see packing.py)."""
+    if RETRIEVAL_SERVICE_URL and not local:
+        request = {"query": query, "where": where, "n_results": n_results, "query_embedding": query_embedding,
+                   "token_budget": token_budget, "company": company, "quarter": quarter}
+        return (await asyncio.to_thread(retrieval_service().hybrid_queries, [request]))[0]
+    shards = await asyncio.to_thread(resolve_shards, company, quarter)
+    if not shards:
+        return {"ids": [[]], "documents": [[]], "metadatas": [[]], "shards": []}
+    pack = token_budget is not None and packing.PACKING_ENABLED
+    n_fused = n_results * packing.PACK_OVERFETCH if pack else n_results
+    n_candidates = max(HYBRID_CANDIDATES, n_fused)
+    if query_embedding is None:
+        query_embedding = await embed_query(query, local)
+    vector_hits, lexical_hits = await asyncio.gather(
+        query_shards(shards, query_embedding, n_candidates, where, include_embeddings=pack),
+        asyncio.to_thread(_lexical_search, shards, query, n_candidates, where),
+    )
+    by_id = {chunk_id: (doc, meta, embedding) for chunk_id, doc, meta, embedding, _ in vector_hits}
+    fused = reciprocal_rank_fusion([[hit[0] for hit in vector_hits], [hit[0] for hit in lexical_hits]])[:n_fused]
+
+    shard_of = dict(lexical_hits)
+    missing = {}
+    for chunk_id in fused:
+        if chunk_id not in by_id:
+            missing.setdefault(shard_of[chunk_id], []).append(chunk_id)
+    for shard, fetched in await _fetch_missing(missing, pack):
+        fetched_embeddings = fetched.get('embeddings') if pack else None
+        if fetched_embeddings is None:
+            fetched_embeddings = [None] * len(fetched['ids'])
+        for chunk_id, doc, meta, embedding in zip(fetched['ids'], fetched['documents'], fetched['metadatas'],
+                                                  fetched_embeddings):
+            by_id[chunk_id] = (doc, meta, embedding)
+
+    fused = [chunk_id for chunk_id in fused if chunk_id in by_id]
+    if pack:
+        with tracing.span("pack", candidates=len(fused), token_budget=token_budget) as s:
+            packed = packing.pack(fused, [by_id[c][0] for c in fused], [by_id[c][1] for c in fused],
+                                  [by_id[c][2] for c in fused], n_results, token_budget)
+            s.set("passages", len(packed['ids'][0]))
+            s.set("tokens", packed['tokens'])
+        packed["shards"] = shards
+        return packed
+    return {
+        "ids": [fused],
+        "documents": [[by_id[chunk_id][0] for chunk_id in fused]],
+        "metadatas": [[by_id[chunk_id][1] for chunk_id in fused]],
+        "shards": shards,
+    }
+
+async def hybrid_queries(requests: list, local: bool = False) -> list:
+    """Runs several hybrid_query calls, given as dicts of its arguments, concurrently.
+    Queries without a query_embedding are embedded in one batched request; in
+    client mode the whole batch is a single call to the retrieval service."""
+    if RETRIEVAL_SERVICE_URL and not local:
+        return await asyncio.to_thread(retrieval_service().hybrid_queries, requests)
+    texts = list(dict.fromkeys(r["query"] for r in requests if r.get("query_embedding") is None))
+    if texts:
+        async with backend_semaphore:
+            vectors = dict(zip(texts, await embedder().aembed(texts)))
+        requests = [r if r.get("query_embedding") is not None else dict(r, query_embedding=vectors[r["query"]])
+                    for r in requests]
+    return await asyncio.gather(*[hybrid_query(**r, local=local) for r in requests])
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as bf:
+        return bf.read()
+
+@tracing.traced()
+async def read_image(path: str) -> bytes:
+    if RETRIEVAL_SERVICE_URL:
+        return await asyncio.to_thread(retrieval_service().image, path)
+    return await asyncio.to_thread(_read_file, path)
+
+def narrative_where(quarter: str = "") -> dict:
     if quarter:
-        where_clause = {
+        return {
             "$and": [
                 {"Content_Type": {"$eq": "text"}},
                 {"Quarter": {"$eq": quarter}}
             ]
         }
-    else:
-        where_clause = {"Content_Type": "text"}
-        
-    emb_res = client.models.embed_content(model="text-embedding-005", contents=query)
-    
-    results = collection.query(
-        query_embeddings=[emb_res.embeddings[0].values],
-        n_results=10, 
-        where=where_clause 
-    )
-
-    if not results['documents'][0]:
-        return "No relevant narrative text found."
-
-    formatted = []
-    for i, doc in enumerate(results['documents'][0]):
-        meta = results['metadatas'][0][i]
-        formatted.append(f"--- TEXT FROM SECTION: {meta.get('Header_Path', 'Unknown')} ---\n{doc}")
-    
-    return "\n\n".join(formatted)
+    return {"Content_Type": "text"}
 
-async def retrieve_financial_tables(tool_context: ToolContext, query: str, quarter: str = "") -> str:
-    """
-    Retrieves HTML/Markdown TABLES and CHARTS containing raw financial numbers.
-    Use this for questions like "What was the revenue?", "Operating margin", "Balance sheet data".
-    This tool is best for extracting raw data before performing calculations.
-    IMPORTANT: The 'quarter' argument must exactly match the document folder (e.g., 'Q1-2025'). 
-    If you are looking for historical comparisons (like Q1 2024), leave 'quarter' blank, as historical data is usually contained in the current quarter's report.
-    """
-    print(f"   [Tool] Searching Tables/Charts for: {query}")
-    
-    where_clause = {
+def tables_where(quarter: str = "") -> dict:
+    tables_or_charts = {
         "$or": [
             {"Content_Type": {"$eq": "table"}},
             {"Content_Type": {"$eq": "chart"}}
         ]
     }
-    
     if quarter:
-        where_clause = {
-            "$and": [
-                {"Quarter": {"$eq": quarter}},
-                {"$or": [
-                    {"Content_Type": {"$eq": "table"}},
-                    {"Content_Type": {"$eq": "chart"}}
-                ]}
-            ]
-        }
+        return {"$and": [{"Quarter": {"$eq": quarter}}, tables_or_charts]}
+    return tables_or_charts
 
-    emb_res = client.models.embed_content(model="text-embedding-005", contents=query)
-    
-    results = collection.query(
-        query_embeddings=[emb_res.embeddings[0].values],
-        n_results=5, 
-        where=where_clause 
-    )
+def company_where(where: dict, company: str = "") -> dict:
+    if not company:
+        return where
+    return {"$and": [where, {"Company": {"$eq": normalize_company(company)}}]}
 
-    if not results['documents'][0]:
-        return "No relevant financial tables or charts found."
+def matching_sections(section: str, company: str = "", quarter: str = "", local: bool = False) -> list:
+    """Heading paths in the shards of `company`/`quarter` that match `section`."""
+    if RETRIEVAL_SERVICE_URL and not local:
+        return retrieval_service().sections(section, company, quarter)
+    header_paths = set()
+    for shard in resolve_shards(company, quarter):
+        index = lexical_indexes(shard).get()
+        if index is not None:
+            header_paths.update(index.field_values("Header_Path"))
+    return match_sections(section, sorted(header_paths))
+
+def section_where(where: dict, section: str, company: str = "", quarter: str = "") -> tuple:
+    """Narrows `where` to the heading paths that match `section` (e.g. 'Outlook').
+    Returns (where, matched paths); with no match, `where` is returned unchanged."""
+    if not section:
+        return where, []
+    paths = matching_sections(section, company, quarter)
+    if not paths:
+        return where, []
+    return {"$and": [where, {"Header_Path": {"$in": paths}}]}, paths
+
+def company_note(company: str, quarter: str, results: dict) -> str:
+    if company and not results.get("shards", True):
+        period = f" for {quarter}" if quarter else ""
+        return f"(No documents of company '{company}'{period} have been ingested.)\n\n"
+    return ""
+
+def section_note(section: str, paths: list) -> str:
+    if not section:
+        return ""
+    if not paths:
+        return f"(No section matches '{section}'; searched all sections.)\n\n"
+    return f"(Searched sections: {'; '.join(paths)})\n\n"
+
+def format_narrative_chunks(documents: list, metadatas: list) -> list:
+    return [
+        f"--- TEXT FROM SECTION: {meta.get('Header_Path', 'Unknown')} ---\n{doc}"
+        for doc, meta in zip(documents, metadatas)
+    ]
+
+async def format_table_chunks(tool_context: ToolContext, documents: list, metadatas: list,
+                              include_html: bool = False) -> list:
+    """Formats table/chart chunks, saving each referenced chart image as an artifact.
+    Tables are stored as compact pipe tables; `include_html` swaps in the original HTML."""
+    # Load every referenced chart image concurrently, off the event loop.
+    image_paths = {}
+    for meta in metadatas:
+        img_path = meta.get("Image_Path")
+        if img_path:
+            image_paths[img_path] = img_path if os.path.isabs(img_path) else os.path.join(BASE_DIR, img_path)
+    loaded = await asyncio.gather(*[read_image(p) for p in image_paths.values()], return_exceptions=True)
+    image_bytes_by_path = dict(zip(image_paths, loaded))
 
     formatted_results = []
-    for i in range(len(results['documents'][0])):
-        doc = results['documents'][0][i]
-        meta = results['metadatas'][0][i]
-        
+    for doc, meta in zip(documents, metadatas):
         chunk_text = f"--- DATA FROM SECTION: {meta.get('Header_Path', 'Unknown')} ---\n"
         
         # Inject explicit image link if present
         if meta.get("Image_Path"):
             img_path = meta['Image_Path']
-            abs_img_path = img_path if os.path.isabs(img_path) else os.path.join(BASE_DIR, img_path)
             try:
-                mime_type, _ = mimetypes.guess_type(abs_img_path)
+                image_bytes = image_bytes_by_path[img_path]
+                if isinstance(image_bytes, Exception):
+                    raise image_bytes
+                mime_type, _ = mimetypes.guess_type(image_paths[img_path])
                 if not mime_type:
                     mime_type = "image/png"
-                with open(abs_img_path, "rb") as bf:
-                    image_bytes = bf.read()
                 image_part = types.Part.from_bytes(data=image_bytes, mime_type=mime_type)
-                artifact_id = await tool_context.save_artifact(image_part, os.path.basename(img_path))
+                with tracing.span("save_artifact", bytes=len(image_bytes)):
+                    artifact_id = await tool_context.save_artifact(image_part, os.path.basename(img_path))
+                cited = tool_context.state.get(CITED_IMAGES_STATE_KEY, [])
+                tool_context.state[CITED_IMAGES_STATE_KEY] = cited + [
+                    {"filename": os.path.basename(img_path), "image_path": image_paths[img_path]}
+                ]
                 chunk_text += f"[Source Image Artifact: '{artifact_id}']\n"
             except Exception as e:
                 chunk_text += f"[Source Image: {img_path}]\n"
                 
+        if include_html and meta.get("Table_HTML"):
+            doc = meta["Table_HTML"]
         chunk_text += f"{doc}\n"
         formatted_results.append(chunk_text)
-        
-    return "\n\n".join(formatted_results)
+    return formatted_results
+
+@tracing.traced()
+async def retrieve_narrative(tool_context: ToolContext, query: str, quarter: str = "", section: str = "",
+                             company: str = "") -> str:
+    """
+    Retrieves TEXT narratives, executive quotes, risk factors, and strategic commentary.
+    Use this for questions like "What did the CEO say?", "What are the headwinds?", "Summarize the outlook".
+    This tool DOES NOT return financial tables.
+    'section' optionally restricts the search to document sections whose headings match it
+    (e.g. 'Outlook', 'CEO quote', 'Capital returns'); leave it blank to search everything.
+    'company' optionally restricts the search to one company's filings (e.g. 'alphabet').
+    IMPORTANT: The 'quarter' argument must exactly match the document folder (e.g., 'Q1-2025'). 
+    If you are looking for historical comparisons (like Q1 2024), leave 'quarter' blank, as historical data is usually contained in the current quarter's report.
+    """
+    print(f"   [Tool] Searching Narrative for: {query}")
+    where, sections = await asyncio.to_thread(section_where, company_where(narrative_where(quarter), company),
+                                              section, company, quarter)
+    results = await hybrid_query(query, where, NARRATIVE_RESULTS, token_budget=packing.PACK_TOKEN_BUDGET,
+                                 company=company, quarter=quarter)
+    notes = company_note(company, quarter, results) + section_note(section, sections)
+
+    if not results['documents'][0]:
+        return notes + "No relevant narrative text found."
+
+    return notes + "\n\n".join(
+        format_narrative_chunks(results['documents'][0], results['metadatas'][0]))
 
+@tracing.traced()
+async def retrieve_financial_tables(tool_context: ToolContext, query: str, quarter: str = "",
+                                    include_html: bool = False, section: str = "", company: str = "") -> str:
+    """
+    Retrieves TABLES and CHARTS containing raw financial numbers.
+    Use this for questions like "What was the revenue?", "Operating margin", "Balance sheet data".
+    This tool is best for extracting raw data before performing calculations.
+    Tables come back as compact pipe tables: numbers without '$' or thousands separators, negatives
+    as '-', and the unit on a 'Units:' line. Set 'include_html' to true only if that layout is ambiguous
+    and you need the original HTML table.
+    'section' optionally restricts the search to sections whose headings match it (e.g. 'Segment results').
+    'company' optionally restricts the search to one company's filings (e.g. 'alphabet').
+    IMPORTANT: The 'quarter' argument must exactly match the document folder (e.g., 'Q1-2025'). 
+    If you are looking for historical comparisons (like Q1 2024), leave 'quarter' blank, as historical data is usually contained in the current quarter's report.
+    """
+    print(f"   [Tool] Searching Tables/Charts for: {query}")
+    where, sections = await asyncio.to_thread(section_where, company_where(tables_where(quarter), company),
+                                              section, company, quarter)
+    results = await hybrid_query(query, where, TABLE_RESULTS, token_budget=packing.PACK_TOKEN_BUDGET,
+                                 company=company, quarter=quarter)
+    notes = company_note(company, quarter, results) + section_note(section, sections)
+
+    if not results['documents'][0]:
+        return notes + "No relevant financial tables or charts found."
+
+    formatted_results = await format_table_chunks(tool_context, results['documents'][0], results['metadatas'][0],
+                                                  include_html)
+    return notes + "\n\n".join(formatted_results)
+
+@tracing.traced()
+async def retrieve_multi_quarter(tool_context: ToolContext, queries: list[str], quarters: str = "",
+                                 content_type: str = "tables", include_html: bool = False, company: str = "") -> str:
+    """
+    Runs several searches in ONE call: every query in 'queries' against every quarter in 'quarters'.
+    Use this instead of calling retrieve_financial_tables / retrieve_narrative once per quarter, e.g. for
+    "revenue for Q1 2024 and Q1 2025" or "operating margin trend Q1-Q4 2025".
+    'queries' is a list of search phrases (e.g. ['total revenues', 'operating income']).
+    'quarters' is an optional comma-separated list of document folders (e.g. 'Q1-2025, Q2-2025');
+    leave it blank to search all quarters.
+    'content_type' is 'tables' (tables and charts, the default) or 'narrative' (text).
+    Tables are compact pipe tables; set 'include_html' to true to get the original HTML instead.
+    'company' optionally restricts every search to one company's filings (e.g. 'alphabet').
+    Results are grouped by quarter and query; a chunk already shown in an earlier group is not repeated.
+    """
+    queries = [q.strip() for q in queries if q and q.strip()]
+    quarter_list = [q.strip() for q in quarters.split(",") if q.strip()] or [""]
+    if not queries:
+        return "No queries given."
+    if content_type not in ("tables", "narrative"):
+        return "content_type must be 'tables' or 'narrative'."
+    print(f"   [Tool] Fan-out search ({content_type}) for {queries} x {quarter_list}")
+
+    # One batched embedding request for all queries, then every (quarter, query) search concurrently.
+    where_for = narrative_where if content_type == "narrative" else tables_where
+    groups = [(quarter, query) for quarter in quarter_list for query in queries]
+    # The token budget is shared by all groups; each group still keeps its best passage.
+    group_budget = packing.PACK_TOKEN_BUDGET // len(groups)
+    results = await hybrid_queries([
+        {"query": query, "where": company_where(where_for(quarter), company), "n_results": FANOUT_RESULTS,
+         "token_budget": group_budget, "company": company, "quarter": quarter}
+        for quarter, query in groups
+    ])
+
+    seen = set()
+    sections = []
+    for (quarter, query), result in zip(groups, results):
+        documents, metadatas, repeated = [], [], 0
+        merged_ids = result.get('merged_ids', [[[chunk_id] for chunk_id in result['ids'][0]]])[0]
+        for chunk_ids, doc, meta in zip(merged_ids, result['documents'][0], result['metadatas'][0]):
+            if seen.intersection(chunk_ids):
+                repeated += 1
+                continue
+            seen.update(chunk_ids)
+            documents.append(doc)
+            metadatas.append(meta)
+        if content_type == "narrative":
+            chunks = format_narrative_chunks(documents, metadatas)
+        else:
+            chunks = await format_table_chunks(tool_context, documents, metadatas, include_html)
+        header = f"=== {quarter or 'ALL QUARTERS'} | {query} ==="
+        if repeated:
+            header += f" ({repeated} result(s) already shown above)"
+        body = company_note(company, quarter, result) + ("\n\n".join(chunks) if chunks else "No new results.")
+        sections.append(f"{header}\n{body}")
+    return "\n\n".join(sections)
+
+def lookup_facts(metric: str, periods: list, company: str = "", local: bool = False) -> list:
+    # Facts are stored under the normalized company, as in company_where.
+    company = normalize_company(company) if company else ""
+    if RETRIEVAL_SERVICE_URL and not local:
+        return retrieval_service().facts(metric, periods, company)
+    return facts_store().lookup(metric, periods, company)
+
+@tracing.traced()
+async def lookup_financial_metric(tool_context: ToolContext, metric: str, periods: str = "", company: str = "") -> str:
+    """
+    Looks up exact reported figures (revenue, operating income, net income, EPS, capital expenditures, segment
+    results, ...) in an index of numbers extracted from the financial tables. Answers in milliseconds.
+    Use this FIRST for questions like "Operating income Q1 2024 vs Q1 2025"; fall back to
+    `retrieve_financial_tables` only if no matching figure is returned or the full table/chart is needed.
+    'metric' is the line item (e.g. 'operating income', 'Google Cloud revenues').
+    'periods' is an optional comma-separated list such as 'Q1 2024, Q1 2025' or 'FY 2024'.
+    'company' is optional (e.g. 'alphabet').
+    """
+    print(f"   [Tool] Looking up metric: {metric} ({periods or 'all periods'})")
+    period_list = [p.strip() for p in periods.split(",") if p.strip()]
+    if RETRIEVAL_SERVICE_URL:
+        facts = await asyncio.to_thread(lookup_facts, metric, period_list, company)
+    else:
+        async with backend_semaphore:
+            facts = await asyncio.to_thread(lookup_facts, metric, period_list, company)
+
+    if not facts:
+        return "No matching financial facts found. Use retrieve_financial_tables instead."
+
+    lines = []
+    for fact in facts:
+        name = f"{fact['section']} - {fact['metric']}" if fact["section"] else fact["metric"]
+        value = f"{fact['value']:,.2f}".rstrip("0").rstrip(".")
+        unit = f" {fact['unit']}" if fact["unit"] else ""
+        lines.append(f"{name} | {fact['period']} | {value}{unit} | {fact['company']} | source: {', '.join(fact['sources'])}")
+    return "\n".join(lines)
+
+@tracing.traced()
 async def calculate_with_python(tool_context: ToolContext, math_question_with_data: str) -> str:
     """Takes a math question along with raw numbers, and writes/executes a python script to answer it.
     Example math_question_with_data: "Q1 revenue is 100, Q2 is 120. What is the growth percentage?"
+    Differences, growth %, margins, sums, averages and CAGR over labelled numbers are answered
+    instantly by a local calculator; anything else runs in the Python sandbox. The first line of
+    the result reports which path was taken.
     """
-    from google.adk.agents import Agent
-    from google.adk.runners import Runner
-    from google.adk.sessions import InMemorySessionService
-    from google.adk.code_executors.agent_engine_sandbox_code_executor import AgentEngineSandboxCodeExecutor
-    
-    from google.adk.artifacts.in_memory_artifact_service import InMemoryArtifactService
-    
+    local_answer = calculator.solve(math_question_with_data)
+    if local_answer is not None:
+        print(f"   [Tool] Local calculator answered: {math_question_with_data}")
+        return f"[Calculation Path: local]\n{local_answer}"
+
     print(f"   [Tool] Passing to Calculator SubAgent: {math_question_with_data}")
     
-    SANDBOX_RESOURCE_NAME = os.environ.get("SANDBOX_RESOURCE_NAME", "projects/605897091243/locations/us-central1/reasoningEngines/3475832232818507776/sandboxEnvironments/2303281147120975872")
-    
-    calc_agent = Agent(
-        model="gemini-2.5-flash",
-        name="Calculator_Agent",
-        instruction="""You are a strict code executor. You are given a math question containing raw data. 
-You MUST use your built-in python sandbox to write python to calculate the answer.
-Output a markdown block with the python code. Ensure you print() the final output.""",
-        code_executor=AgentEngineSandboxCodeExecutor(sandbox_resource_name=SANDBOX_RESOURCE_NAME)
-    )
-    
-    service = InMemorySessionService()
-    await service.create_session(app_name="calc_app", user_id="sys", session_id="calc_sess")
-    artifact_service = InMemoryArtifactService()
-    runner = Runner(app_name="calc_app", agent=calc_agent, session_service=service, artifact_service=artifact_service)
-    
-    events = runner.run_async(
-        user_id="sys",
-        session_id="calc_sess",
-        new_message=types.Content(role="user", parts=[types.Part.from_text(text=math_question_with_data)])
-    )
-    
     final_output = ""
-    async for event in events:
-        e_type = getattr(event, "type", None) or getattr(event, "event_type", None)
-        if e_type == "TEXT_MESSAGE_CONTENT":
-            final_output += getattr(event, "text", "") + "\n"
-        elif e_type == "RUN_CODE_CONTENT":
-            for p in event.content.parts:
-                out = getattr(p, "code_execution_result", None)
-                if out:
-                    final_output += f"\n[Code Result]: {out.output}\n"
-                    
-    return final_output.strip()
+    with tracing.span("calculator.sub_agent", question_chars=len(math_question_with_data)) as calc_span:
+        async with calculator_pool.session() as (runner, session_id):
+            events = runner.run_async(
+                user_id=CALC_USER_ID,
+                session_id=session_id,
+                new_message=types.Content(role="user", parts=[types.Part.from_text(text=math_question_with_data)])
+            )
+
+            async for event in events:
+                e_type = getattr(event, "type", None) or getattr(event, "event_type", None)
+                if e_type == "TEXT_MESSAGE_CONTENT":
+                    final_output += getattr(event, "text", "") + "\n"
+                elif e_type == "RUN_CODE_CONTENT":
+                    for p in event.content.parts:
+                        out = getattr(p, "code_execution_result", None)
+                        if out:
+                            final_output += f"\n[Code Result]: {out.output}\n"
+        calc_span.set("output_chars", len(final_output))
+    
+    print(f"   [Tool] Calculator pool: {calculator_pool.stats()}")
+    return f"[Calculation Path: sandbox]\n{final_output.strip()}"
@@ -0,0 +1,362 @@
+"""Lightweight span tracing for the agent tools, the supervisor LLM and ingest.
+
+Tracing is off unless TRACE_FILE is set (or `configure` is called); disabled
+spans cost one function call. Each finished span is appended to TRACE_FILE as
+one JSON line with its trace/parent ids, duration and attributes (payload sizes,
+result counts, token usage). TRACE_FORMAT=otlp writes OpenTelemetry OTLP/JSON
+lines instead, which the OpenTelemetry Collector's file receiver can ingest.
+
+    with tracing.span("chroma.query", n_results=20) as s:
+        ...
+        s.set("results", len(ids))
+
+    @tracing.traced()
+    async def retrieve_narrative(...): ...
+
+Summarize a trace file, hottest spans (by self time) first:
+
+    python -m financial_supervisor.tracing traces.jsonl --top 15
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import argparse
+import functools
+import threading
+import contextvars
+import inspect
+from contextlib import contextmanager
+
+TRACE_FILE = os.environ.get("TRACE_FILE", "")
+TRACE_FORMAT = os.environ.get("TRACE_FORMAT", "jsonl")
+SERVICE_NAME = os.environ.get("TRACE_SERVICE_NAME", "financial-analyst")
+
+_current = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, name: str, parent=None, attributes: dict = None):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = dict(attributes or {})
+        self.error = None
+
+    def set(self, key: str, value):
+        self.attributes[key] = value
+
+    def record_usage(self, response):
+        """Copies token counts from a GenAI response (or LlmResponse) usage_metadata."""
+        usage = getattr(response, "usage_metadata", None)
+        if usage is None:
+            return
+        for field, key in (("prompt_token_count", "prompt_tokens"), ("candidates_token_count", "output_tokens"),
+                           ("total_token_count", "total_tokens")):
+            value = getattr(usage, field, None)
+            if value is not None:
+                self.attributes[key] = value
+
+    def end(self, error: BaseException = None):
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        if _exporter is not None:
+            _exporter.export(self)
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+    def to_otlp(self) -> dict:
+        def value(v):
+            if isinstance(v, bool):
+                return {"boolValue": v}
+            if isinstance(v, int):
+                return {"intValue": str(v)}
+            if isinstance(v, float):
+                return {"doubleValue": v}
+            return {"stringValue": str(v)}
+
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [{"key": k, "value": value(v)} for k, v in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+            "scopeSpans": [{"scope": {"name": __name__}, "spans": [span]}],
+        }]}
+
+
+class _NoopSpan:
+    def set(self, key, value):
+        pass
+
+    def record_usage(self, response):
+        pass
+
+    def end(self, error=None):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class _Exporter:
+    def __init__(self, path: str, fmt: str):
+        if fmt not in ("jsonl", "otlp"):
+            raise ValueError(f"Unknown TRACE_FORMAT: {fmt}")
+        self.path = path
+        self.fmt = fmt
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8", buffering=1)
+
+    def export(self, span: Span):
+        record = span.to_otlp() if self.fmt == "otlp" else span.to_dict()
+        line = json.dumps(record, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+_exporter = None
+
+
+def configure(path: str = TRACE_FILE, fmt: str = TRACE_FORMAT):
+    """Starts (or, with an empty path, stops) exporting spans."""
+    global _exporter
+    if _exporter is not None:
+        _exporter.close()
+    _exporter = _Exporter(path, fmt) if path else None
+
+
+def enabled() -> bool:
+    return _exporter is not None
+
+
+def current_span():
+    return _current.get()
+
+
+def start_span(name: str, parent=None, **attributes):
+    """Starts a span that is NOT made current; the caller must call end().
+    For work that begins and ends in different callbacks or threads."""
+    if _exporter is None:
+        return NOOP_SPAN
+    return Span(name, parent if parent is not None else _current.get(), attributes)
+
+
+@contextmanager
+def span(name: str, parent=None, **attributes):
+    """Times the block as a child of the current span (or of `parent`)."""
+    if _exporter is None:
+        yield NOOP_SPAN
+        return
+    s = Span(name, parent if parent is not None else _current.get(), attributes)
+    token = _current.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.end(error=e)
+        raise
+    finally:
+        _current.reset(token)
+        s.end()
+
+
+def result_size(value) -> dict:
+    """Size attributes for a return value: characters/bytes, or number of results."""
+    if isinstance(value, (str, bytes)):
+        return {"result_chars" if isinstance(value, str) else "result_bytes": len(value)}
+    if isinstance(value, dict) and "ids" in value:
+        ids = value["ids"]
+        return {"results": len(ids[0]) if ids and isinstance(ids[0], list) else len(ids)}
+    if isinstance(value, (list, tuple)):
+        return {"results": len(value)}
+    return {}
+
+
+def traced(name: str = None):
+    """Decorator wrapping each call of a sync or async function in a span.
+
+    The wrapper keeps the signature and docstring (ADK builds tool declarations
+    from them) and records the size of the return value.
+    """
+    def decorate(func):
+        span_name = name or func.__name__
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if _exporter is None:
+                    return await func(*args, **kwargs)
+                with span(span_name) as s:
+                    result = await func(*args, **kwargs)
+                    s.attributes.update(result_size(result))
+                    return result
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _exporter is None:
+                return func(*args, **kwargs)
+            with span(span_name) as s:
+                result = func(*args, **kwargs)
+                s.attributes.update(result_size(result))
+                return result
+        return wrapper
+    return decorate
+
+
+# ADK callbacks: one span per agent turn, and one per supervisor LLM request with its token usage.
+_agent_spans = {}
+_model_spans = {}
+
+
+def before_agent_callback(callback_context):
+    if _exporter is not None:
+        s = start_span(f"agent.{callback_context.agent_name}", invocation_id=callback_context.invocation_id)
+        _agent_spans[callback_context.invocation_id] = (s, _current.get())
+        _current.set(s)
+    return None
+
+
+def after_agent_callback(callback_context):
+    entry = _agent_spans.pop(callback_context.invocation_id, None)
+    if entry is not None:
+        s, previous = entry
+        _current.set(previous)
+        s.end()
+    return None
+
+
+def before_model_callback(callback_context, llm_request):
+    if _exporter is not None:
+        contents = getattr(llm_request, "contents", None) or []
+        _model_spans[callback_context.invocation_id] = start_span(
+            "llm.generate", model=getattr(llm_request, "model", None) or "", contents=len(contents)
+        )
+    return None
+
+
+def after_model_callback(callback_context, llm_response):
+    s = _model_spans.pop(callback_context.invocation_id, None)
+    if s is not None:
+        s.record_usage(llm_response)
+        s.end()
+    return None
+
+
+def load_spans(path: str) -> list:
+    """Reads a trace file in either export format into span dicts."""
+    spans = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if "resourceSpans" not in record:
+                spans.append(record)
+                continue
+            for resource in record["resourceSpans"]:
+                for scope in resource["scopeSpans"]:
+                    for s in scope["spans"]:
+                        attributes = {a["key"]: next(iter(a["value"].values())) for a in s.get("attributes", [])}
+                        spans.append({
+                            "trace_id": s["traceId"],
+                            "span_id": s["spanId"],
+                            "parent_id": s.get("parentSpanId"),
+                            "name": s["name"],
+                            "duration_ms": (int(s["endTimeUnixNano"]) - int(s["startTimeUnixNano"])) / 1e6,
+                            "attributes": attributes,
+                            "error": s.get("status", {}).get("message"),
+                        })
+    return spans
+
+
+def summarize(spans: list) -> list:
+    """Aggregates spans by name. Self time excludes time spent in child spans
+    (children running concurrently can push it below zero; it is clamped)."""
+    child_time = {}
+    for s in spans:
+        if s.get("parent_id"):
+            child_time[s["parent_id"]] = child_time.get(s["parent_id"], 0.0) + s["duration_ms"]
+    groups = {}
+    for s in spans:
+        g = groups.setdefault(s["name"], {"name": s["name"], "count": 0, "errors": 0, "durations": [],
+                                          "self_ms": 0.0, "tokens": 0})
+        g["count"] += 1
+        g["errors"] += 1 if s.get("error") else 0
+        g["durations"].append(s["duration_ms"])
+        g["self_ms"] += max(0.0, s["duration_ms"] - child_time.get(s["span_id"], 0.0))
+        g["tokens"] += int((s.get("attributes") or {}).get("total_tokens") or 0)
+    rows = []
+    for g in groups.values():
+        durations = sorted(g.pop("durations"))
+        g["total_ms"] = sum(durations)
+        g["mean_ms"] = g["total_ms"] / len(durations)
+        g["p95_ms"] = durations[min(len(durations) - 1, int(0.95 * len(durations)))]
+        g["max_ms"] = durations[-1]
+        rows.append(g)
+    return sorted(rows, key=lambda r: r["self_ms"], reverse=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarize the hottest spans in a trace file.")
+    parser.add_argument("trace_file")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--json", action="store_true", help="Print the summary as JSON.")
+    args = parser.parse_args(argv)
+
+    spans = load_spans(args.trace_file)
+    rows = summarize(spans)[:args.top]
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+    traces = len({s["trace_id"] for s in spans})
+    print(f"{len(spans)} spans in {traces} traces from {args.trace_file}\n")
+    header = f"{'span':<36} {'count':>6} {'self ms':>10} {'total ms':>10} {'mean ms':>9} {'p95 ms':>9} {'max ms':>9} {'tokens':>8} {'err':>4}"
+    print(header)
+    print("-" * len(header))
+    for r in rows:
+        print(f"{r['name'][:36]:<36} {r['count']:>6} {r['self_ms']:>10.1f} {r['total_ms']:>10.1f} "
+              f"{r['mean_ms']:>9.1f} {r['p95_ms']:>9.1f} {r['max_ms']:>9.1f} {r['tokens']:>8} {r['errors']:>4}")
+
+
+if TRACE_FILE:
+    configure(TRACE_FILE, TRACE_FORMAT)
+
+if __name__ == "__main__":
+    sys.exit(main())
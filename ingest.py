@@ -1,18 +1,30 @@
 import os
 import re
+import sys
+import json
+import shutil
+import hashlib
+import argparse
+import contextvars
+import queue
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
 from pathlib import Path
-from docling.document_converter import DocumentConverter, PdfFormatOption
-from docling.datamodel.pipeline_options import PdfPipelineOptions
-from docling.datamodel.base_models import InputFormat
-from docling_core.types.doc.labels import DocItemLabel
-from google.genai import Client
-from google.genai import types
-import chromadb
-import uuid
-from langchain_text_splitters import MarkdownHeaderTextSplitter, RecursiveCharacterTextSplitter
-
 from dotenv import load_dotenv
 
+from conversion import convert_pdf, iter_pdf_elements, init_worker
+from financial_supervisor import clients, tracing
+from financial_supervisor.cache import EmbeddingCache, DescriptionCache
+from financial_supervisor.embeddings import EmbeddingBatcher, EMBEDDING_MODEL, estimate_tokens
+from financial_supervisor.facts import FactsStore
+from financial_supervisor.lexical import BM25Index
+from financial_supervisor.ratelimit import RateLimitedClient, is_retryable
+from financial_supervisor.shards import (ShardCatalog, CATALOG_FILENAME, LEGACY_COLLECTION, SHARD_PREFIX,
+                                         SHARDS_DIRNAME, detect_company, shard_name, shard_paths)
+from financial_supervisor.tables import compact_table, extract_facts
+
 load_dotenv()
 
 # Configuration
@@ -21,198 +33,785 @@ GCP_LOCATION = os.environ.get("GOOGLE_CLOUD_LOCATION", "us-central1")
 GOOGLE_GENAI_USE_VERTEXAI = os.environ.get("GOOGLE_GENAI_USE_VERTEXAI", True)
 EARNINGS_DIR = Path("earnings")
 IMAGE_CACHE_DIR = EARNINGS_DIR / "image_cache"
+CHROMA_DB_DIR = Path("./chroma_db")
+MANIFEST_PATH = CHROMA_DB_DIR / "ingest_manifest.json"
+# Per-document progress of an unfinished ingest, so the next run resumes it.
+CHECKPOINT_DIR = CHROMA_DB_DIR / "ingest_checkpoints"
+FACTS_DB_PATH = CHROMA_DB_DIR / "financial_facts.sqlite"
+# Each (company, quarter) shard has its own collection, BM25 index and numpy
+# export; the catalog lists them for the tools (see financial_supervisor/shards.py).
+SHARD_CATALOG_PATH = CHROMA_DB_DIR / CATALOG_FILENAME
+# Changes whenever the stored corpus changes; the agent's answer cache keys on it.
+INGEST_VERSION_PATH = CHROMA_DB_DIR / "ingest_version"
+
+# Bump PIPELINE_VERSION whenever chunking, metadata or prompts change so that
+# every PDF is re-ingested on the next run.
+PIPELINE_VERSION = "8"
+DESCRIPTION_MODEL = "gemini-2.5-flash"
+DESCRIPTION_PROMPT = (
+    "Describe this financial chart in detail. Extract all axes labels, "
+    "key data points, trends, and the title. Format as Markdown."
+)
 
-# Ensure image cache directory exists
-IMAGE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+# Maximum number of Gemini chart descriptions in flight at once.
+CHART_DESCRIPTION_CONCURRENCY = int(os.environ.get("CHART_DESCRIPTION_CONCURRENCY", "8"))
+
+# Bounded buffers between the streaming stages keep memory flat regardless of
+# document size: chunks waiting to be embedded, chunks per embed+upsert batch,
+# and text characters buffered before splitting.
+WRITE_QUEUE_SIZE = int(os.environ.get("INGEST_WRITE_QUEUE_SIZE", "256"))
+WRITE_BATCH_SIZE = int(os.environ.get("INGEST_WRITE_BATCH_SIZE", "100"))
+TEXT_BUFFER_CHARS = 6000
+# Converted documents (element lists, chart bytes included) waiting in --workers
+# mode, per worker; later PDFs are submitted only as earlier ones are stored.
+CONVERSION_WINDOW_PER_WORKER = 2
+
+# Client-side quota for Vertex AI calls (see financial_supervisor/ratelimit.py). Set these to
+# the project's per-minute quotas; 429/503 responses lower concurrency and are retried.
+EMBED_REQUESTS_PER_MINUTE = float(os.environ.get("INGEST_EMBED_RPM", "600"))
+GENERATE_REQUESTS_PER_MINUTE = float(os.environ.get("INGEST_GENERATE_RPM", "300"))
+EMBED_CONCURRENCY = int(os.environ.get("INGEST_EMBED_CONCURRENCY", "4"))
+
+# Clients, caches and the collection are opened on first use (see financial_supervisor/clients.py),
+# so importing this module (e.g. from spawned workers or benchmarks) has no side effects.
+rate_limited_client = clients.Lazy(lambda: RateLimitedClient(
+    clients.get_genai_client(vertexai=bool(GOOGLE_GENAI_USE_VERTEXAI), project=GCP_PROJECT, location=GCP_LOCATION),
+    {
+        "embed_content": {"requests_per_minute": EMBED_REQUESTS_PER_MINUTE, "max_concurrency": EMBED_CONCURRENCY},
+        "generate_content": {"requests_per_minute": GENERATE_REQUESTS_PER_MINUTE,
+                             "max_concurrency": CHART_DESCRIPTION_CONCURRENCY},
+    }
+))
 
-# Initialize GenAI Client
-client = Client(vertexai=bool(GOOGLE_GENAI_USE_VERTEXAI), project=GCP_PROJECT, location=GCP_LOCATION)
+def get_client():
+    return rate_limited_client()
 
-# Initialize ChromaDB
-chroma_client = chromadb.PersistentClient(path="./chroma_db")
+def get_collection(shard: str):
+    return clients.get_collection(str(CHROMA_DB_DIR), shard)
 
-# Clear the old collection to prevent duplicates with wrong metadata
-try:
-    chroma_client.delete_collection("financial_reports")
-except Exception as e:
-    print(f"Skipping deletion: {e}")
+embedder = clients.Lazy(lambda: EmbeddingBatcher(get_client(), EMBEDDING_MODEL, cache=EmbeddingCache()))
+description_cache = clients.Lazy(DescriptionCache)
+facts_store = clients.Lazy(lambda: FactsStore(str(FACTS_DB_PATH)))
 
-collection = chroma_client.get_or_create_collection(name="financial_reports")
+def source_key(pdf_path: Path) -> str:
+    """Stable manifest key for a PDF, relative to the earnings directory."""
+    return pdf_path.relative_to(EARNINGS_DIR).as_posix()
 
-# Configure Docling
-pipeline_options = PdfPipelineOptions()
-pipeline_options.images_scale = 2.0
-pipeline_options.generate_picture_images = True
-pipeline_options.generate_page_images = False
+def file_sha256(path: Path) -> str:
+    """Hashes file contents so renamed or touched PDFs are not re-ingested."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
 
-doc_converter = DocumentConverter(
-    allowed_formats=[InputFormat.PDF],
-    format_options={
-        InputFormat.PDF: PdfFormatOption(pipeline_options=pipeline_options)
+def document_quarter(source_file: str) -> str:
+    return (EARNINGS_DIR / source_file).parent.name
+
+def document_shard(source_file: str) -> str:
+    """Shard a PDF's chunks are routed to, from its company and quarter folder."""
+    return shard_name(detect_company(source_file), document_quarter(source_file))
+
+def document_fingerprint(pdf_path: Path) -> dict:
+    """Everything that, when changed, invalidates the stored chunks of a PDF."""
+    return {
+        "sha256": file_sha256(pdf_path),
+        "pipeline_version": PIPELINE_VERSION,
+        "embedding_model": EMBEDDING_MODEL,
+        "description_model": DESCRIPTION_MODEL,
+        "shard": document_shard(source_key(pdf_path)),
     }
-)
+
+def load_manifest() -> dict:
+    if not MANIFEST_PATH.exists():
+        return {}
+    try:
+        with open(MANIFEST_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable manifest {MANIFEST_PATH}: {e}")
+        return {}
+
+def save_manifest(manifest: dict):
+    """Writes the manifest atomically so a crash never leaves it half-written."""
+    MANIFEST_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = MANIFEST_PATH.with_suffix(".json.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, MANIFEST_PATH)
+
+class DocumentCheckpoint:
+    """Chunk ids of one document already upserted, saved after every write batch.
+
+    Chunk ids are deterministic for a given fingerprint, so a run that resumes the
+    same PDF skips describing, embedding and writing everything listed here.
+    """
+
+    def __init__(self, source_file: str, fingerprint: dict):
+        self.path = CHECKPOINT_DIR / f"{hashlib.sha256(source_file.encode('utf-8')).hexdigest()[:16]}.json"
+        self.source_file = source_file
+        self.fingerprint = fingerprint
+        self.done = set()
+        self._lock = threading.Lock()
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+            if saved.get("source_file") == source_file and saved.get("fingerprint") == fingerprint:
+                self.done = set(saved["chunk_ids"])
+        except (OSError, ValueError, KeyError):
+            pass
+
+    @property
+    def resumed(self) -> bool:
+        return bool(self.done)
+
+    def __contains__(self, chunk_id: str) -> bool:
+        return chunk_id in self.done
+
+    def add(self, chunk_ids: list):
+        with self._lock:
+            self.done.update(chunk_ids)
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(".json.tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"source_file": self.source_file, "fingerprint": self.fingerprint,
+                           "chunk_ids": sorted(self.done)}, f)
+            os.replace(tmp_path, self.path)
+
+    def clear(self):
+        self.path.unlink(missing_ok=True)
+
+def checkpointed_sources() -> dict:
+    """Source key -> checkpoint file of every unfinished document."""
+    sources = {}
+    for path in CHECKPOINT_DIR.glob("*.json"):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                sources[json.load(f)["source_file"]] = path
+        except (OSError, ValueError, KeyError):
+            path.unlink(missing_ok=True)
+    return sources
+
+def delete_document_chunks(source_file: str, shard: str):
+    """Removes every text, table and chart chunk (and extracted fact) previously stored for a PDF."""
+    with tracing.span("chroma.delete", source=source_file, shard=shard):
+        get_collection(shard).delete(where={"Source_File": source_file})
+    facts_store().delete_source(source_file)
+
+def load_shard_catalog():
+    """The shard catalog, or None for a store written before sharding (or never)."""
+    try:
+        return ShardCatalog.load(str(SHARD_CATALOG_PATH))
+    except (OSError, ValueError, KeyError):
+        return None
+
+def stored_collections() -> list:
+    """Shard collections, plus the collection of a pre-sharding store."""
+    return [name for name in clients.list_collections(str(CHROMA_DB_DIR))
+            if name == LEGACY_COLLECTION or name.startswith(f"{SHARD_PREFIX}_")]
+
+def drop_shard(shard: str):
+    clients.drop_collection(str(CHROMA_DB_DIR), shard)
+    if shard != LEGACY_COLLECTION:
+        shutil.rmtree(CHROMA_DB_DIR / SHARDS_DIRNAME / shard, ignore_errors=True)
+
+def reset_store() -> ShardCatalog:
+    """Drops every shard (and a pre-sharding collection); used for --rebuild and legacy
+    databases. Returns the new, empty catalog."""
+    for shard in stored_collections():
+        drop_shard(shard)
+    shutil.rmtree(CHROMA_DB_DIR / SHARDS_DIRNAME, ignore_errors=True)
+    for legacy_path in (CHROMA_DB_DIR / "bm25_index.json", CHROMA_DB_DIR / "numpy_index"):
+        if legacy_path.is_dir():
+            shutil.rmtree(legacy_path, ignore_errors=True)
+        else:
+            legacy_path.unlink(missing_ok=True)
+    facts_store().clear()
+    for path in checkpointed_sources().values():
+        path.unlink(missing_ok=True)
+    catalog = ShardCatalog(str(SHARD_CATALOG_PATH))
+    catalog.save()
+    return catalog
+
+def write_ingest_version(manifest: dict):
+    """Records a digest of the manifest so answers cached against older data are discarded."""
+    version = hashlib.sha256(json.dumps(manifest, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+    tmp_path = INGEST_VERSION_PATH.with_suffix(".tmp")
+    tmp_path.write_text(version, encoding="utf-8")
+    os.replace(tmp_path, INGEST_VERSION_PATH)
+
+def image_cache_path(image_hash: str) -> Path:
+    """Content-addressed location of a chart image."""
+    return IMAGE_CACHE_DIR / image_hash[:2] / f"{image_hash}.png"
+
+def store_image(image_hash: str, image_bytes: bytes) -> Path:
+    """Writes a chart image once; identical charts share a single file."""
+    img_path = image_cache_path(image_hash)
+    if not img_path.exists():
+        img_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = img_path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(image_bytes)
+        os.replace(tmp_path, img_path)
+    return img_path
+
+def stored_image_paths() -> set:
+    """Image paths of every chart chunk still in the store, including the charts
+    already stored for checkpointed or failed documents."""
+    paths = set()
+    for shard in stored_collections():
+        charts = get_collection(shard).get(where={"Content_Type": "chart"}, include=["metadatas"])
+        paths.update(Path(meta["Image_Path"]).as_posix() for meta in charts["metadatas"]
+                     if meta and meta.get("Image_Path"))
+    return paths
+
+def collect_image_garbage(manifest: dict):
+    """Deletes cached images that neither an ingested document nor a stored chart chunk
+    references any more, including the uuid-named files written by earlier pipeline versions."""
+    referenced = {path for entry in manifest.values() for path in entry.get("images", [])}
+    referenced |= stored_image_paths()
+    removed = 0
+    for img_path in IMAGE_CACHE_DIR.rglob("*"):
+        if img_path.is_file() and img_path.as_posix() not in referenced:
+            img_path.unlink()
+            removed += 1
+    for directory in sorted(IMAGE_CACHE_DIR.rglob("*"), reverse=True):
+        if directory.is_dir() and not any(directory.iterdir()):
+            directory.rmdir()
+    if removed:
+        print(f"Removed {removed} unreferenced cached images.")
+
+@tracing.traced("ingest.build_lexical_index")
+def build_lexical_index(shard: str) -> BM25Index:
+    """Rebuilds the BM25 index over every chunk currently in the shard."""
+    ids, documents, metadatas = [], [], []
+    page_size = 5000
+    offset = 0
+    while True:
+        page = get_collection(shard).get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+        ids.extend(page["ids"])
+        documents.extend(page["documents"])
+        metadatas.extend(page["metadatas"])
+        if len(page["ids"]) < page_size:
+            break
+        offset += page_size
+    index = BM25Index.build(ids, documents, metadatas)
+    if len(index):
+        index_path = Path(shard_paths(str(CHROMA_DB_DIR), shard)[0])
+        index_path.parent.mkdir(parents=True, exist_ok=True)
+        index.save(str(index_path))
+        print(f"Built BM25 index over {len(index)} chunks of {shard}.")
+    return index
+
+@tracing.traced("ingest.export_numpy_index")
+def export_shard_vectors(shard: str) -> int:
+    """Exports the shard's vectors for the numpy retriever."""
+    from financial_supervisor.retrievers import export_numpy_index
+    exported = export_numpy_index(get_collection(shard), shard_paths(str(CHROMA_DB_DIR), shard)[1])
+    print(f"Exported {exported} vectors of {shard} for the numpy retriever.")
+    return exported
+
+def refresh_shard(catalog: ShardCatalog, shard: str):
+    """Rebuilds a changed shard's BM25 index, numpy export and catalog entry; an emptied
+    shard is dropped. Other shards, and the indexes the tools hold for them, are untouched."""
+    index = build_lexical_index(shard)
+    if not len(index):
+        print(f"Dropping empty shard {shard}.")
+        drop_shard(shard)
+        catalog.remove(shard)
+    else:
+        export_shard_vectors(shard)
+        catalog.update(shard, index.field_values("Company"), index.field_values("Quarter"), len(index))
+    catalog.save()
+
+def shard_indexes_exist(shard: str) -> bool:
+    lexical_path, numpy_dir = shard_paths(str(CHROMA_DB_DIR), shard)
+    return os.path.exists(lexical_path) and os.path.exists(os.path.join(numpy_dir, "chunks.json"))
 
 def describe_image(image_bytes: bytes) -> str:
     """Uses Gemini to describe a chart."""
-    prompt = (
-        "Describe this financial chart in detail. Extract all axes labels, "
-        "key data points, trends, and the title. Format as Markdown."
-    )
-    response = client.models.generate_content(
-        model='gemini-2.5-flash',
-        contents=[
-            types.Part.from_bytes(data=image_bytes, mime_type='image/png'),
-            prompt
-        ]
-    )
+    from google.genai import types
+    with tracing.span("genai.generate_content", model=DESCRIPTION_MODEL, image_bytes=len(image_bytes)) as s:
+        response = get_client().models.generate_content(
+            model=DESCRIPTION_MODEL,
+            contents=[
+                types.Part.from_bytes(data=image_bytes, mime_type='image/png'),
+                DESCRIPTION_PROMPT
+            ]
+        )
+        s.record_usage(response)
     return response.text
 
-def process_document(pdf_path: Path):
+def describe_chart(chart: dict) -> str:
+    """Describes a chart, reusing the memoized description of identical pixels."""
+    description = description_cache().get(chart["image_hash"], DESCRIPTION_PROMPT, DESCRIPTION_MODEL)
+    if description is None:
+        description = describe_image(chart["image_bytes"])
+        description_cache().put(chart["image_hash"], DESCRIPTION_PROMPT, DESCRIPTION_MODEL, description)
+    return description
+
+def _describe_chart_safely(chart: dict):
+    """Describes one chart. A permanent failure (e.g. a rejected image) only drops that
+    chart; quota or availability errors that outlast the retries fail the document,
+    which the next run resumes from its checkpoint."""
+    try:
+        return describe_chart(chart)
+    except Exception as e:
+        if is_retryable(e):
+            raise
+        print(f"    -> Failed to describe image under heading '{chart['heading']}': {e}")
+        return None
+
+class OrderedChartStage:
+    """Describes charts on a thread pool while the document is still being read.
+
+    At most `limit` descriptions are in flight; submitting beyond that blocks on
+    the oldest one, which applies backpressure to the element stream. Results
+    come out in submission order; dropped charts yield a None description.
+    """
+
+    def __init__(self, limit: int = CHART_DESCRIPTION_CONCURRENCY):
+        self.limit = max(1, limit)
+        self.executor = ThreadPoolExecutor(max_workers=self.limit)
+        self.in_flight = deque()
+
+    def submit(self, chart: dict):
+        """Queues a chart; yields (chart, description) for any charts that must be drained first."""
+        # Run in a copy of the caller's context so description spans nest under the document.
+        future = self.executor.submit(contextvars.copy_context().run, _describe_chart_safely, chart)
+        self.in_flight.append((chart, future))
+        while len(self.in_flight) > self.limit:
+            yield self._pop()
+
+    def drain(self):
+        while self.in_flight:
+            yield self._pop()
+
+    def _pop(self):
+        chart, future = self.in_flight.popleft()
+        return chart, future.result()
+
+    def close(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+class StreamingChunker:
+    """Splits a stream of text elements into chunks without holding the whole document.
+
+    Chunks never cross a section boundary: text from a new heading path flushes the
+    buffer first. Within a section, text is buffered until TEXT_BUFFER_CHARS, split,
+    and every chunk but the last is emitted; the last one is carried over so chunks
+    still cross element boundaries. Chunks are yielded as (text, heading_path,
+    first_page, last_page).
+    """
+
+    def __init__(self, chunk_size: int = 1500, chunk_overlap: int = 200, buffer_chars: int = TEXT_BUFFER_CHARS):
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+        self.splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        self.buffer_chars = buffer_chars
+        self.buffer = ""
+        self.pages = []  # (offset in buffer, page) where each buffered element starts
+        self.section = None
+
+    def _page_at(self, offset: int):
+        page = None
+        for start, element_page in self.pages:
+            if start > offset:
+                break
+            page = element_page if element_page is not None else page
+        return page
+
+    def _split(self) -> list:
+        """(chunk, start, end) for each chunk of the buffer, located by offset."""
+        located = []
+        search_from = 0
+        for chunk in self.splitter.split_text(self.buffer):
+            start = self.buffer.find(chunk, search_from)
+            if start < 0:
+                start = search_from
+            located.append((chunk, start, start + len(chunk)))
+            search_from = start + 1
+        return located
+
+    def _emit(self, located: list):
+        for chunk, start, end in located:
+            yield chunk, self.section, self._page_at(start), self._page_at(max(start, end - 1))
+
+    def feed(self, text: str, section: str = "", page: int = None):
+        if section != self.section:
+            yield from self.flush()
+            self.section = section
+        if self.buffer:
+            self.buffer += "\n\n"
+        self.pages.append((len(self.buffer), page))
+        self.buffer += text
+        if len(self.buffer) >= self.buffer_chars:
+            located = self._split()
+            if not located:
+                return
+            yield from self._emit(located[:-1])
+            _, start, _ = located[-1]
+            self.pages = [(0, self._page_at(start))] + [(o - start, p) for o, p in self.pages if o > start]
+            self.buffer = self.buffer[start:]
+
+    def flush(self):
+        if self.buffer:
+            yield from self._emit(self._split())
+        self.buffer = ""
+        self.pages = []
+
+class ChunkWriter:
+    """Embeds and upserts chunks in batches on a background thread.
+
+    put() blocks while WRITE_QUEUE_SIZE chunks are waiting, so producers never run
+    ahead of the embedding API. Errors are re-raised on the producer side. Every
+    written batch is recorded in the document's checkpoint.
+    """
+
+    def __init__(self, shard: str, batch_size: int = WRITE_BATCH_SIZE, queue_size: int = WRITE_QUEUE_SIZE,
+                 checkpoint: DocumentCheckpoint = None):
+        self.shard = shard
+        self.batch_size = batch_size
+        self.checkpoint = checkpoint
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.error = None
+        self.written = 0
+        self.requests_before = embedder().requests
+        self.parent_span = tracing.current_span()
+        self.thread = threading.Thread(target=self._run, name="chunk-writer", daemon=True)
+        self.thread.start()
+
+    def put(self, chunk_id: str, document: str, metadata: dict):
+        if self.error:
+            raise self.error
+        self.queue.put((chunk_id, document, metadata))
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+        if self.error:
+            raise self.error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.queue.put(None)
+            self.thread.join()
+
+    def _run(self):
+        batch = []
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            if self.error:
+                continue  # keep draining so producers never block forever
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                self._write(batch)
+                batch = []
+        if batch and not self.error:
+            self._write(batch)
+
+    def _write(self, batch: list):
+        try:
+            ids, documents, metadatas = (list(column) for column in zip(*batch))
+            with tracing.span("ingest.write_batch", parent=self.parent_span, chunks=len(batch),
+                              chars=sum(len(d) for d in documents)):
+                embeddings = embedder().embed(documents)
+                with tracing.span("chroma.upsert", chunks=len(batch), shard=self.shard):
+                    get_collection(self.shard).upsert(
+                        embeddings=embeddings,
+                        documents=documents,
+                        metadatas=metadatas,
+                        ids=ids
+                    )
+            self.written += len(batch)
+            if self.checkpoint is not None:
+                self.checkpoint.add(ids)
+        except Exception as e:
+            self.error = e
+
+def page_metadata(first_page: int, last_page: int) -> dict:
+    """Page_Start/Page_End metadata; Chroma rejects None values, so unknown pages are omitted."""
+    if first_page is None:
+        return {}
+    return {"Page_Start": first_page, "Page_End": last_page if last_page is not None else first_page}
+
+@tracing.traced("ingest.document")
+def process_document(pdf_path: Path, elements: list = None, checkpoint: DocumentCheckpoint = None) -> dict:
+    """Describes, embeds and stores one PDF as a streaming pipeline:
+    convert -> classify -> chunk / describe -> embed -> write.
+
+    `elements` are the records from conversion.convert_pdf; when omitted the PDF
+    is converted in-process and its elements are streamed. Chart images stay in
+    memory (they are written once to the content-addressed cache, never read back).
+    Chunks listed in `checkpoint` were stored by an interrupted run and are skipped.
+    Chunks go to the collection of the document's (company, quarter) shard.
+    Returns the shard and the cached image paths the stored chunks reference.
+    """
     print(f"\nProcessing: {pdf_path}")
     
     # Extract structural metadata
     quarter = pdf_path.parent.name
     filename = pdf_path.name
+    source_file = source_key(pdf_path)
     doc_type = "earnings-release" if "release" in filename.lower() else "earnings-slides"
-    company = "alphabet" if "alphabet" in filename.lower() else "unknown"
-    
-    result = doc_converter.convert(str(pdf_path))
-    doc = result.document
+    company = detect_company(source_file)
+    shard = document_shard(source_file)
     
-    markdown_lines = []
-    current_heading = "Document Start"
+    if elements is None:
+        elements = iter_pdf_elements(pdf_path)
     
-    print("  Extracting elements and contextualizing images...")
-    for element, level in doc.iterate_items():
-        # Track Header Context
-        if element.label == DocItemLabel.SECTION_HEADER or (hasattr(element.label, 'name') and element.label.name.startswith('heading')):
-            if hasattr(element, "text") and element.text:
-                current_heading = element.text
-                
-        if element.label == DocItemLabel.PICTURE:
-            image_obj = element.get_image(doc)
-            if image_obj:
-                img_path = IMAGE_CACHE_DIR / quarter / f"{uuid.uuid4().hex}.png"
-                img_path.parent.mkdir(parents=True, exist_ok=True)
-                image_obj.save(img_path)
-                
-                with open(img_path, "rb") as f:
-                    img_bytes = f.read()
-                
-                print(f"    -> Found chart under heading '{current_heading}', fetching Gemini description...")
-                try:
-                    description = describe_image(img_bytes)
-                    
-                    # Store chart as a standalone chunk in ChromaDB
-                    chart_id = f"{filename}_chart_{uuid.uuid4().hex}"
-                    chart_meta = {
-                        "Quarter": quarter,
-                        "Content_Type": "chart", # Explicitly label as a chart
-                        "Company": company,
-                        "Image_Path": str(img_path),
-                        "Header_Path": current_heading,
-                        "Chart_Type": "Financial Visual"
-                    }
-                    
-                    chart_emb_res = client.models.embed_content(
-                        model="text-embedding-005",
-                        contents=description
-                    )
-                    
-                    collection.add(
-                        embeddings=[chart_emb_res.embeddings[0].values],
-                        documents=[description],
-                        metadatas=[chart_meta],
-                        ids=[chart_id]
-                    )
-                    print(f"    -> Stored chart as atomic chunk.")
-                except Exception as e:
-                    print(f"    -> Failed to describe image: {e}")
-            continue
-            
-        # Specifically parse tables as HTML, others as Markdown
-        if element.label == DocItemLabel.TABLE:
-            try:
-                table_html = element.export_to_html(doc=doc)
-                if table_html:
-                    # NEW REQUIREMENT: Store table directly into the collection as atomic chunk
-                    table_id = f"{filename}_table_{uuid.uuid4().hex}"
-                    table_meta = {
-                        "Quarter": quarter,
-                        "Document_Type": doc_type,
-                        "Content_Type": "table",
-                        "Company": company,
-                        "Header_Path": current_heading
-                    }
-                    table_emb_res = client.models.embed_content(
-                        model="text-embedding-005",
-                        contents=table_html
-                    )
-                    collection.add(
-                        embeddings=[table_emb_res.embeddings[0].values],
-                        documents=[table_html],
-                        metadatas=[table_meta],
-                        ids=[table_id]
-                    )
-                    print(f"    -> Stored table as atomic chunk.")
-            except Exception as e:
-                print(f"    -> Warning: Could not export table to HTML: {e}")
-        elif hasattr(element, "text"):
-            md_text = element.text
-            if md_text:
-                markdown_lines.append(md_text)
+    images = []
+    counts = {"chart": 0, "table": 0, "text": 0, "facts": 0, "html_tokens": 0, "compact_tokens": 0, "resumed": 0}
+    done = checkpoint if checkpoint is not None else ()
 
-    full_markdown = "\n\n".join(markdown_lines)
-    
-    print("  Chunking Markdown textual semantics...")
-    
-    splitter = RecursiveCharacterTextSplitter(chunk_size=1500, chunk_overlap=200)
-    text_chunks = splitter.split_text(full_markdown)
-    
-    texts = []
-    metadatas = []
-    ids = []
-    
-    for i, text in enumerate(text_chunks):
+    def put(writer: ChunkWriter, chunk_id: str, document: str, metadata: dict):
+        if chunk_id in done:
+            counts["resumed"] += 1
+        else:
+            writer.put(chunk_id, document, metadata)
+
+    def store_chart(writer: ChunkWriter, chart: dict, description):
+        if description is None:
+            return
+        images.append(chart["image_path"].as_posix())
+        # Store chart as a standalone chunk in ChromaDB
+        chart_meta = {
+            "Quarter": quarter,
+            "Content_Type": "chart", # Explicitly label as a chart
+            "Company": company,
+            "Source_File": source_file,
+            "Image_Path": str(chart["image_path"]),
+            "Header_Path": chart["heading_path"],
+            "Chart_Type": "Financial Visual"
+        }
+        chart_meta.update(page_metadata(chart["page"], chart["page"]))
+        put(writer, f"{source_file}_chart_{chart['index']}", description, chart_meta)
+
+    def store_text(writer: ChunkWriter, text: str, heading_path: str, first_page: int, last_page: int):
         meta = {
             "Quarter": quarter,
             "Document_Type": doc_type,
             "Content_Type": "text",
             "Company": company,
-            "Header_Path": "Text_Chunk"
+            "Source_File": source_file,
+            "Header_Path": heading_path or "Document Start"
         }
-            
-        texts.append(text)
-        metadatas.append(meta)
-        ids.append(f"{filename}_text_chunk_{i}")
+        meta.update(page_metadata(first_page, last_page))
+        put(writer, f"{source_file}_text_chunk_{counts['text']}", text, meta)
+        counts["text"] += 1
 
-    print(f"  Generated {len(texts)} text chunks. Vectorizing...")
-    
-    if texts:
-        embeddings = []
-        for text in texts:
-            emb_res = client.models.embed_content(
-                model="text-embedding-005",
-                contents=text
-            )
-            embeddings.append(emb_res.embeddings[0].values)
-            
-        collection.add(
-            embeddings=embeddings,
-            documents=texts,
-            metadatas=metadatas,
-            ids=ids
-        )
-        print("  Successfully stored in ChromaDB.")
+    print("  Streaming elements through describe/chunk/embed/write stages...")
+    charts = OrderedChartStage()
+    chunker = StreamingChunker()
+    try:
+        with ChunkWriter(shard, checkpoint=checkpoint) as writer:
+            for element in elements:
+                if element["kind"] == "picture":
+                    img_path = store_image(element["image_hash"], element["image_bytes"])
+                    chart = {"index": counts["chart"], "image_bytes": element["image_bytes"],
+                             "image_hash": element["image_hash"], "image_path": img_path,
+                             "heading": element["heading"], "heading_path": element["heading_path"],
+                             "page": element["page"]}
+                    counts["chart"] += 1
+                    if f"{source_file}_chart_{chart['index']}" in done:
+                        # Described and stored before the interruption.
+                        images.append(img_path.as_posix())
+                        counts["resumed"] += 1
+                        continue
+                    for done_chart, description in charts.submit(chart):
+                        store_chart(writer, done_chart, description)
+                elif element["kind"] == "table":
+                    # Store table directly into the collection as atomic chunk: the compact
+                    # pipe table is embedded and returned by the tools, the HTML kept alongside.
+                    table_id = f"{source_file}_table_{counts['table']}"
+                    counts["table"] += 1
+                    compact = compact_table(element["html"], context=element["heading"]) or element["html"]
+                    counts["html_tokens"] += estimate_tokens(element["html"])
+                    counts["compact_tokens"] += estimate_tokens(compact)
+                    table_meta = {
+                        "Quarter": quarter,
+                        "Document_Type": doc_type,
+                        "Content_Type": "table",
+                        "Company": company,
+                        "Source_File": source_file,
+                        "Header_Path": element["heading_path"],
+                        "Table_HTML": element["html"]
+                    }
+                    table_meta.update(page_metadata(element["page"], element["page"]))
+                    put(writer, table_id, compact, table_meta)
+                    # Also index its numbers for lookup_financial_metric.
+                    facts = extract_facts(element["html"], context=element["heading"])
+                    facts_store().add_facts(facts, company=company, quarter=quarter, document_type=doc_type,
+                                          source_file=source_file, source_chunk_id=table_id)
+                    counts["facts"] += len(facts)
+                else:
+                    for chunk in chunker.feed(element["text"], element["heading_path"], element["page"]):
+                        store_text(writer, *chunk)
+
+            for chunk in chunker.flush():
+                store_text(writer, *chunk)
+            for done_chart, description in charts.drain():
+                store_chart(writer, done_chart, description)
+    finally:
+        charts.close()
+
+    print(f"  Extracted {counts['facts']} financial facts from {counts['table']} tables.")
+    if counts["table"]:
+        print(f"  Compact tables: ~{counts['compact_tokens']} tokens vs ~{counts['html_tokens']} as HTML "
+              f"({1 - counts['compact_tokens'] / max(1, counts['html_tokens']):.0%} smaller).")
+    print(f"  Stored {writer.written} chunks ({counts['text']} text, {counts['table']} tables, "
+          f"{len(images)}/{counts['chart']} charts) in {embedder().requests - writer.requests_before} embedding requests "
+          f"to shard {shard}.")
+    if counts["resumed"]:
+        print(f"  Resumed from checkpoint: {counts['resumed']} chunks were already stored.")
+    return {"shard": shard, "images": sorted(set(images))}
 
 def main():
-    pdf_files = list(EARNINGS_DIR.rglob("*.pdf"))
+    parser = argparse.ArgumentParser(description="Ingest earnings PDFs into ChromaDB.")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="Drop every shard and re-ingest every PDF from scratch.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of processes converting PDFs with Docling in parallel.")
+    args = parser.parse_args()
+
+    manifest = load_manifest()
+    catalog = load_shard_catalog()
+    # Chunks written before the manifest existed carry no Source_File metadata
+    # and cannot be deleted selectively, and chunks written before sharding all
+    # sit in one collection; either way start from a clean store. Chunks of an
+    # interrupted first run are tracked by their checkpoints instead.
+    IMAGE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    untracked = not manifest and not checkpointed_sources()
+    if args.rebuild or untracked or catalog is None:
+        if stored_collections():
+            print("Resetting store (--rebuild)." if args.rebuild
+                  else "Resetting store: no shard catalog found." if catalog is None
+                  else "Resetting store: no usable ingest manifest found.")
+        catalog = reset_store()
+        manifest = {}
+        save_manifest(manifest)
+
+    pdf_files = sorted(p for p in EARNINGS_DIR.rglob("*.pdf") if IMAGE_CACHE_DIR not in p.parents)
     print(f"Found {len(pdf_files)} PDFs.")
+
+    current_keys = {source_key(p) for p in pdf_files}
+    # Shards whose chunks change in this run; only their indexes are rebuilt.
+    touched = set()
+    removed_keys = sorted(set(manifest) - current_keys)
+    for removed in removed_keys:
+        print(f"Purging chunks of removed file: {removed}")
+        shard = manifest[removed]["fingerprint"].get("shard", document_shard(removed))
+        delete_document_chunks(removed, shard)
+        touched.add(shard)
+        del manifest[removed]
+        save_manifest(manifest)
+    for unfinished, checkpoint_path in checkpointed_sources().items():
+        if unfinished not in current_keys:
+            print(f"Purging chunks of removed, unfinished file: {unfinished}")
+            delete_document_chunks(unfinished, document_shard(unfinished))
+            touched.add(document_shard(unfinished))
+            checkpoint_path.unlink(missing_ok=True)
+
+    to_process = []
+    skipped = 0
     for pdf_path in pdf_files:
+        key = source_key(pdf_path)
         try:
-            process_document(pdf_path)
-        except Exception as e:
-            print(f"Failed to process {pdf_path}: {e}")
+            fingerprint = document_fingerprint(pdf_path)
+        except OSError as e:
+            print(f"Failed to read {pdf_path}: {e}")
+            continue
+        if manifest.get(key, {}).get("fingerprint") == fingerprint:
+            skipped += 1
+        else:
+            to_process.append((pdf_path, fingerprint))
+
+    failed = []
+
+    def store(pdf_path: Path, fingerprint: dict, elements: list = None):
+        key = source_key(pdf_path)
+        shard = fingerprint["shard"]
+        checkpoint = DocumentCheckpoint(key, fingerprint)
+        touched.add(shard)
+        if checkpoint.resumed:
+            # Chunks of the interrupted run stay; facts are cheap to re-extract.
+            print(f"Resuming {key} from its checkpoint ({len(checkpoint.done)} chunks stored).")
+            facts_store().delete_source(key)
+        else:
+            # Drop stale (or partially written) chunks before re-ingesting.
+            delete_document_chunks(key, shard)
+        previous_shard = manifest.get(key, {}).get("fingerprint", {}).get("shard")
+        if previous_shard and previous_shard != shard and previous_shard in catalog.shards:
+            # Routed to another shard before (e.g. SHARD_BY changed).
+            delete_document_chunks(key, previous_shard)
+            touched.add(previous_shard)
+        manifest.pop(key, None)
+        stored = process_document(pdf_path, elements, checkpoint)
+        manifest[key] = {"fingerprint": fingerprint, "images": stored["images"]}
+        save_manifest(manifest)
+        checkpoint.clear()
+
+    if args.workers > 1 and len(to_process) > 1:
+        # Conversion is CPU-bound and runs in worker processes; description,
+        # embedding and storage stay in this process as results arrive.
+        # "spawn" keeps workers from inheriting this process's API clients.
+        print(f"Converting {len(to_process)} PDFs with {args.workers} worker processes...")
+        with ProcessPoolExecutor(max_workers=args.workers,
+                                 mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=init_worker) as executor:
+            queued = iter(to_process)
+            futures = {}
+
+            def submit_next():
+                item = next(queued, None)
+                if item is not None:
+                    futures[executor.submit(convert_pdf, str(item[0]))] = item
+
+            for _ in range(args.workers * CONVERSION_WINDOW_PER_WORKER):
+                submit_next()
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    # Forget the future once stored so its elements can be freed.
+                    pdf_path, fingerprint = futures.pop(future)
+                    try:
+                        store(pdf_path, fingerprint, future.result())
+                    except Exception as e:
+                        print(f"Failed to process {pdf_path}: {e}")
+                        failed.append(pdf_path)
+                    submit_next()
+    else:
+        for pdf_path, fingerprint in to_process:
+            try:
+                store(pdf_path, fingerprint)
+            except Exception as e:
+                print(f"Failed to process {pdf_path}: {e}")
+                failed.append(pdf_path)
+
+    collect_image_garbage(manifest)
+    touched.update(shard for shard in catalog.names() if not shard_indexes_exist(shard))
+    for shard in sorted(touched):
+        refresh_shard(catalog, shard)
+    if touched or not INGEST_VERSION_PATH.exists():
+        write_ingest_version(manifest)
+
+    print(f"\nSkipped {skipped} unchanged PDFs.")
+    print(f"Shards: {len(catalog)} ({sum(e['chunks'] for e in catalog.shards.values())} chunks), "
+          f"{len(touched)} rebuilt.")
+    print(f"Embedding cache: {embedder().cache.stats()}")
+    print(f"Chart description cache: {description_cache().stats()}")
+    if rate_limited_client.is_ready():
+        print(f"Vertex AI requests: {rate_limited_client().stats()}")
+    if failed:
+        print(f"\n{len(failed)} PDFs did not finish: {', '.join(str(p) for p in failed)}")
+        print("Run ingest.py again to resume them from their checkpoints.")
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
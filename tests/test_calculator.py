@@ -0,0 +1,64 @@
+import pytest
+
+from financial_supervisor.calculator import detect_intents, solve
+
+
+@pytest.mark.parametrize("question, expected", [
+    ("Revenue is 100. Cost is 60. What is the gross margin?",
+     "Margin ((Revenue - Cost) / Revenue): (100 - 60) / 100 * 100 = 40%"),
+    ("Revenue is 100. Gross profit is 40. What is the gross margin?",
+     "Margin (Gross profit / Revenue): 40 / 100 * 100 = 40%"),
+    ("Revenue is 100, cost of revenues is 60, operating income is 25. What is the operating margin?",
+     "Margin (operating income / Revenue): 25 / 100 * 100 = 25%"),
+    ("Q1 2025 revenue is 200. Q1 2025 net income is 50. What is the net margin?",
+     "Margin (Q1 2025 net income / Q1 2025 revenue): 50 / 200 * 100 = 25%"),
+])
+def test_margin_uses_profit_or_revenue_minus_cost(question, expected):
+    assert solve(question) == expected
+
+
+def test_margin_with_unknown_numerator_goes_to_sandbox():
+    assert solve("Revenue is 100. Headcount is 60. What is the margin?") is None
+
+
+@pytest.mark.parametrize("question, intent", [
+    ("What was the increase in dollars?", "difference"),
+    ("How much did it decrease?", "difference"),
+    ("What was the % increase?", "growth"),
+    ("What was the percent decrease?", "growth"),
+    ("What was the rate of decline?", "growth"),
+    ("What was the increase in percentage points?", "difference"),
+])
+def test_increase_and_decrease_intents(question, intent):
+    assert detect_intents(question) == [intent]
+
+
+def test_increase_in_dollars_is_a_difference():
+    question = "Q1 2024 revenue is 80. Q1 2025 revenue is 90. What was the increase in dollars?"
+    assert solve(question) == "Difference (Q1 2025 revenue - Q1 2024 revenue): 90 - 80 = 10"
+
+
+def test_percent_increase_is_growth():
+    question = "Q1 2024 revenue is 80. Q1 2025 revenue is 90. What was the % increase?"
+    assert solve(question) == "Growth % (Q1 2024 revenue -> Q1 2025 revenue): (90 - 80) / 80 * 100 = 12.5%"
+
+
+@pytest.mark.parametrize("question", [
+    "Q1 2024 revenue is 80,539. Q1 2025 revenue is 90,234. What is the revenue change in percent?",
+    "Q1 2024 revenue is 80,539. Q1 2025 revenue is 90,234. By what percentage did revenue change?",
+])
+def test_percent_change_is_growth(question):
+    assert solve(question) == ("Growth % (Q1 2024 revenue -> Q1 2025 revenue): "
+                               "(90,234 - 80,539) / 80,539 * 100 = 12.04%")
+
+
+def test_total_does_not_add_a_sum_to_other_intents():
+    assert solve("Revenue is 100. Gross profit is 40. What is the total gross margin?") == \
+        "Margin (Gross profit / Revenue): 40 / 100 * 100 = 40%"
+    assert solve("Q1 revenue is 100. Q3 revenue is 121. What is the total growth from Q1 to Q3?") == \
+        "Growth % (Q1 revenue -> Q3 revenue): (121 - 100) / 100 * 100 = 21%"
+    assert solve("Q1 revenue is 100. Q2 revenue is 110. What is the total?") == "Sum: 100 + 110 = 210"
+
+
+def test_numbers_inside_labels_go_to_sandbox():
+    assert solve("Q1 2025 revenue was 90,234 with 20% of it from cloud at 12,260. What is the growth?") is None
@@ -0,0 +1,88 @@
+import sqlite3
+
+import pytest
+
+from financial_supervisor.facts import FactsStore
+from financial_supervisor.tables import normalize_period
+
+FACTS = [
+    {"metric": "Operating income (loss)", "section": "", "period": "Q1 2025", "column_label": "", "value": 30.0,
+     "unit": "USD millions"},
+    {"metric": "Other income (expense), net", "section": "", "period": "Q1 2025", "column_label": "",
+     "value": 5.0, "unit": "USD millions"},
+    {"metric": "Google Cloud", "section": "Revenues", "period": "Q1 2025", "column_label": "", "value": 12.0,
+     "unit": "USD millions"},
+    {"metric": "Google Cloud", "section": "Operating income (loss)", "period": "Q1 2025", "column_label": "",
+     "value": 2.0, "unit": "USD millions"},
+]
+
+
+def make_store(tmp_path):
+    store = FactsStore(str(tmp_path / "facts.sqlite"))
+    store.add_facts(FACTS, company="alphabet", quarter="Q1-2025", document_type="earnings-release",
+                    source_file="Q1-2025/release.pdf", source_chunk_id="Q1-2025/release.pdf_table_0")
+    return store
+
+
+def test_metric_prefix_does_not_match_other_line_items(tmp_path):
+    facts = make_store(tmp_path).lookup("operating income", ["Q1 2025"], "alphabet")
+    assert [f["metric"] for f in facts] == ["Operating income (loss)"]
+
+
+def test_section_qualified_line_item(tmp_path):
+    facts = make_store(tmp_path).lookup("Google Cloud revenues")
+    assert [(f["metric"], f["value"]) for f in facts] == [("Google Cloud", 12.0)]
+
+
+def test_falls_back_to_word_match(tmp_path):
+    facts = make_store(tmp_path).lookup("other expense")
+    assert [f["metric"] for f in facts] == ["Other income (expense), net"]
+
+
+def test_existing_store_gets_qualified_key(tmp_path):
+    path = str(tmp_path / "old.sqlite")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE facts (id INTEGER PRIMARY KEY, company TEXT NOT NULL, metric TEXT NOT NULL,"
+                 " metric_norm TEXT NOT NULL, section TEXT NOT NULL, period TEXT NOT NULL, column_label TEXT NOT NULL,"
+                 " value REAL NOT NULL, unit TEXT NOT NULL, quarter TEXT NOT NULL, document_type TEXT NOT NULL,"
+                 " source_file TEXT NOT NULL, source_chunk_id TEXT NOT NULL)")
+    conn.execute("INSERT INTO facts VALUES (1, 'alphabet', 'Google Cloud', 'google cloud', 'Revenues', 'Q1 2025',"
+                 " '', 12.0, 'USD millions', 'Q1-2025', 'earnings-release', 'a.pdf', 'a.pdf_table_0')")
+    conn.commit()
+    conn.close()
+    assert [f["value"] for f in FactsStore(path).lookup("google cloud revenues")] == [12.0]
+
+
+class RecordingConnection:
+    def __init__(self, conn):
+        self.conn = conn
+        self.queries = []
+
+    def execute(self, query, params=()):
+        self.queries.append((query, params))
+        return self.conn.execute(query, params)
+
+
+def test_keyed_lookup_uses_metric_indexes(tmp_path):
+    store = make_store(tmp_path)
+    store._conn = recorder = RecordingConnection(store._conn)
+    assert store.lookup("operating income")
+    assert store.lookup("operating income", ["Q1 2025"])
+    plans = [" ".join(str(row) for row in recorder.conn.execute(f"EXPLAIN QUERY PLAN {query}", params))
+             for query, params in recorder.queries]
+    assert "facts_metric" in plans[0] and "facts_qualified" in plans[0]
+    assert "SCAN facts" not in plans[1]
+
+
+@pytest.mark.parametrize("label", ["FY 2024", "FY2024", "fy24", "FY'24", "Year Ended December 31, 2024"])
+def test_fiscal_year_periods(label):
+    assert normalize_period(label) == "FY 2024"
+
+
+def test_fiscal_year_lookup_round_trips(tmp_path):
+    store = make_store(tmp_path)
+    store.add_facts([dict(FACTS[0], period=normalize_period("Year Ended December 31, 2024"), value=112.0)],
+                    company="alphabet", quarter="Q4-2024", document_type="earnings-release",
+                    source_file="Q4-2024/release.pdf", source_chunk_id="Q4-2024/release.pdf_table_0")
+    for periods in (["FY 2024"], ["FY2024"]):
+        assert [(f["period"], f["value"]) for f in store.lookup("operating income", periods)] == [("FY 2024", 112.0)]
@@ -0,0 +1,13 @@
+from financial_supervisor.packing import merge_adjacent
+
+
+def test_same_named_pdfs_in_different_folders_are_not_merged():
+    ids = ["alphabet/Q1-2025/release.pdf_text_chunk_0", "acme/Q1-2025/release.pdf_text_chunk_1",
+           "alphabet/Q1-2025/release.pdf_text_chunk_1"]
+    documents = ["alphabet intro", "acme results", "alphabet results"]
+    metadatas = [{"Header_Path": "Results"}] * 3
+    passages = merge_adjacent(ids, documents, metadatas, [None] * 3)
+    assert [p["ids"] for p in passages] == [
+        ["alphabet/Q1-2025/release.pdf_text_chunk_0", "alphabet/Q1-2025/release.pdf_text_chunk_1"],
+        ["acme/Q1-2025/release.pdf_text_chunk_1"],
+    ]
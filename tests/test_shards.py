@@ -0,0 +1,29 @@
+import pytest
+
+from financial_supervisor.shards import detect_company, mentioned_companies, normalize_company
+
+
+@pytest.mark.parametrize("name", ["alphabet", "Alphabet Inc.", "ALPHABET INC", "Google", "GOOGL", "Google LLC"])
+def test_normalize_company_aliases_and_legal_suffixes(name):
+    assert normalize_company(name) == "alphabet"
+
+
+def test_normalize_company_keeps_a_bare_suffix_word():
+    assert normalize_company("Co") == "co"
+
+
+@pytest.mark.parametrize("source_file, company", [
+    ("Q1-2025/2025q1-alphabet-earnings-release.pdf", "alphabet"),
+    ("Alphabet Inc/Q1-2025/release.pdf", "alphabet"),
+    ("acme/Q1-2025/release.pdf", "acme"),
+])
+def test_detect_company(source_file, company):
+    assert detect_company(source_file) == company
+
+
+def test_mentioned_companies():
+    companies = ["alphabet", "amazon", "meta-platforms"]
+    assert mentioned_companies("What was Alphabet's revenue in Q1 2025?", companies) == ["alphabet"]
+    assert mentioned_companies("Amazon revenue Q1 2025", companies) == ["amazon"]
+    assert mentioned_companies("Google vs Meta Platforms capex", companies) == ["alphabet", "meta-platforms"]
+    assert mentioned_companies("Total revenue Q1 2025", companies) == []
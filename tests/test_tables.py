@@ -0,0 +1,36 @@
+from financial_supervisor.tables import extract_facts
+
+# Shaped like Docling's export of an earnings-release table: '$' and '%' in
+# cells of their own, and a section row straight after the header.
+DOCLING_TABLE = """
+<table>
+<tr><td></td><td colspan="4">Three Months Ended March 31,</td></tr>
+<tr><td></td><td colspan="2">2024</td><td colspan="2">2025</td></tr>
+<tr><td>Revenues:</td><td></td><td></td><td></td><td></td></tr>
+<tr><td>Google Services</td><td>$</td><td>70,398</td><td>$</td><td>77,264</td></tr>
+<tr><td>Google Cloud</td><td></td><td>9,574</td><td></td><td>12,260</td></tr>
+<tr><td>Operating margin</td><td>32</td><td>%</td><td>34</td><td>%</td></tr>
+</table>
+"""
+
+
+def facts_by_metric():
+    facts = extract_facts(DOCLING_TABLE, context="(in millions)")
+    return {(f["metric"], f["period"]): f for f in facts}
+
+
+def test_section_row_after_header_is_not_header():
+    facts = facts_by_metric()
+    services = facts[("Google Services", "Q1 2025")]
+    assert services["section"] == "Revenues"
+    assert services["value"] == 77264
+    assert services["unit"] == "USD millions"
+    assert facts[("Google Cloud", "Q1 2024")]["section"] == "Revenues"
+
+
+def test_detached_percent_sign_marks_percentage_rows():
+    facts = facts_by_metric()
+    assert facts[("Operating margin", "Q1 2024")]["value"] == 32
+    assert facts[("Operating margin", "Q1 2024")]["unit"] == "%"
+    assert facts[("Operating margin", "Q1 2025")]["unit"] == "%"
+